@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the part of tweepy.API which is used by the message handler. Direct messages,
+tweets and users are generated deterministically from their index, so large backlogs do not need
+to be held in memory. Latency, rate limits and the ratio of deleted tweets can be configured.
+"""
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import tweepy
+
+API_URL = "https://api.twitter.com/1.1/"
+FIRST_MESSAGE_ID = 1_500_000_000_000_000_000
+FIRST_TWEET_ID = 1_400_000_000_000_000_000
+COMMENTS = ["hetze", "bodyshaming", "account", "liberalismus", "hetze ?wort?"]
+
+
+class FakeResponse:  # pylint: disable=too-few-public-methods
+    """Minimal response object for the rate limit hooks and the tweepy exceptions"""
+
+    def __init__(self, path: str, status_code: int = 200, headers: dict = None):
+        self.url = API_URL + path
+        self.status_code = status_code
+        self.reason = "Too Many Requests" if status_code == 429 else "Not Found"
+        self.headers = headers or {}
+
+    def json(self) -> dict:
+        """Error payload like the twitter api sends it"""
+        return {"errors": [{"code": self.status_code, "message": self.reason}]}
+
+
+class FakeTwitterAPI:  # pylint: disable=too-many-instance-attributes
+    """
+    Fake of tweepy.API with get_direct_messages, lookup_statuses, get_status,
+    delete_direct_message and verify_credentials.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        message_count: int,
+        latency: float = 0.0,
+        deleted_ratio: float = 0.1,
+        duplicate_ratio: float = 0.0,
+        user_count: int = 1000,
+        rate_limits: dict = None,
+        rate_limit_window: float = 15 * 60,
+    ):
+        self.message_count = message_count
+        self.latency = latency
+        self.deleted_ratio = deleted_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.user_count = user_count
+        self.rate_limits = rate_limits or {}
+        self.rate_limit_window = rate_limit_window
+        self.session = SimpleNamespace(hooks={"response": []})
+        self.deleted_messages = set()
+        self.call_counts = {}
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def _call(self, endpoint: str, path: str) -> None:
+        """
+        Count the call, apply the rate limit and the latency of the endpoint.
+        :param endpoint: Name of the api method
+        :param path: Path of the endpoint for the rate limit hooks
+        :return: None
+        """
+        with self.lock:
+            self.call_counts[endpoint] = self.call_counts.get(endpoint, 0) + 1
+            headers = {}
+            used = 0
+            limit = self.rate_limits.get(endpoint)
+            if limit is not None:
+                now = time.time()
+                reset, used = self.windows.get(endpoint, (now + self.rate_limit_window, 0))
+                if now >= reset:
+                    reset, used = now + self.rate_limit_window, 0
+                used += 1
+                self.windows[endpoint] = (reset, used)
+                headers = {
+                    "x-rate-limit-limit": str(limit),
+                    "x-rate-limit-remaining": str(max(limit - used, 0)),
+                    "x-rate-limit-reset": str(reset),
+                }
+        if self.latency:
+            time.sleep(self.latency)
+        response = FakeResponse(path, 429 if limit and used > limit else 200, headers)
+        for hook in self.session.hooks["response"]:
+            hook(response)
+        if response.status_code == 429:
+            raise tweepy.TooManyRequests(response)
+
+    def _tweet_index(self, message_index: int) -> int:
+        rng = random.Random(message_index)
+        if message_index and rng.random() < self.duplicate_ratio:
+            return rng.randrange(message_index)
+        return message_index
+
+    def _is_deleted(self, tweet_index: int) -> bool:
+        return random.Random(-tweet_index - 1).random() < self.deleted_ratio
+
+    def _direct_message(self, message_index: int) -> SimpleNamespace:
+        tweet_index = self._tweet_index(message_index)
+        user_index = tweet_index % self.user_count
+        url = (
+            f"https://twitter.com/user{user_index}/status/{FIRST_TWEET_ID + tweet_index}"
+        )
+        text = f"#bot {COMMENTS[message_index % len(COMMENTS)]} https://t.co/{message_index}"
+        created = datetime(2022, 1, 1, tzinfo=timezone.utc) + timedelta(
+            seconds=message_index
+        )
+        return SimpleNamespace(
+            id=str(FIRST_MESSAGE_ID + message_index),
+            created_timestamp=str(int(created.timestamp() * 1000)),
+            message_create={
+                "sender_id": "4711",
+                "message_data": {
+                    "text": text,
+                    "entities": {
+                        "hashtags": [{"text": "bot", "indices": [0, 4]}],
+                        "urls": [
+                            {
+                                "url": f"https://t.co/{message_index}",
+                                "expanded_url": url,
+                                "display_url": url[8:30],
+                                "indices": [len(text) - 20, len(text)],
+                            }
+                        ],
+                    },
+                },
+            },
+        )
+
+    def _status(self, tweet_id: int) -> SimpleNamespace:
+        tweet_index = tweet_id - FIRST_TWEET_ID
+        user_index = tweet_index % self.user_count
+        return SimpleNamespace(
+            id=tweet_id,
+            text=f"Text von Tweet {tweet_index} mit hetze und wort",
+            created_at=datetime(2021, 1, 1, tzinfo=timezone.utc)
+            + timedelta(seconds=tweet_index),
+            user=SimpleNamespace(
+                id=10_000 + user_index,
+                name=f"User {user_index}",
+                screen_name=f"user{user_index}",
+            ),
+        )
+
+    def verify_credentials(self, **_) -> SimpleNamespace:
+        """Always valid credentials"""
+        self._call("verify_credentials", "account/verify_credentials.json")
+        return SimpleNamespace(id=4711, screen_name="TTueftler")
+
+    def get_direct_messages(self, *, count: int = 20, cursor=None, **kwargs):
+        """Newest messages first, the cursor is the index of the next message"""
+        self._call("get_direct_messages", "direct_messages/events/list.json")
+        position = self.message_count - 1 if cursor in (None, -1) else int(cursor)
+        page = []
+        while position >= 0 and len(page) < count:
+            if FIRST_MESSAGE_ID + position not in self.deleted_messages:
+                page.append(self._direct_message(position))
+            position -= 1
+        next_cursor = str(position) if position >= 0 else -1
+        if kwargs.get("return_cursors") or kwargs.get("return_cursor"):
+            return page, next_cursor
+        return page
+
+    get_direct_messages.pagination_mode = "dm_cursor"
+
+    def lookup_statuses(self, tweet_ids: list, **_) -> list:
+        """Statuses of all tweets which are not deleted"""
+        self._call("lookup_statuses", "statuses/lookup.json")
+        return [
+            self._status(int(tweet_id))
+            for tweet_id in tweet_ids
+            if not self._is_deleted(int(tweet_id) - FIRST_TWEET_ID)
+        ]
+
+    def get_status(self, tweet_id, **_) -> SimpleNamespace:
+        """Status of one tweet or NotFound if deleted"""
+        self._call("get_status", "statuses/show.json")
+        if self._is_deleted(int(tweet_id) - FIRST_TWEET_ID):
+            raise tweepy.NotFound(FakeResponse("statuses/show.json", 404))
+        return self._status(int(tweet_id))
+
+    def delete_direct_message(self, message_id) -> None:
+        """Remove the message from later pages"""
+        self._call("delete_direct_message", "direct_messages/events/destroy.json")
+        with self.lock:
+            self.deleted_messages.add(int(message_id))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline benchmark of the message handler against the local twitter api stand-in. Runs complete
+handler passes for different backlog sizes and reports messages per second, database round
+trips per message and peak memory. Example from the repository root:
+
+    python -m benchmarks.run_benchmark --messages 100 1000 10000 --latency 0.005
+    python -m benchmarks.run_benchmark --db mariadb+mariadbconnector://user:pw@localhost/bench
+
+The tables of the benchmark database are dropped before each pass, so a database given with --db
+must be empty. Its tables are only dropped with --drop.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import sqlalchemy
+from sqlalchemy_utils import database_exists
+from source import db, message_handler, rate_limit
+from benchmarks.fake_twitter_api import FakeTwitterAPI
+
+UNLIMITED_REQUESTS = 10**12
+
+
+class RoundTripCounter:
+    """Count all statements which are sent to the database"""
+
+    def __init__(self, engine: sqlalchemy.engine.Engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *_):
+        self.count += 1
+
+    def __enter__(self):
+        sqlalchemy.event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        sqlalchemy.event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+def database_is_empty(engine: sqlalchemy.engine.Engine) -> bool:
+    """
+    Check that none of the tables of the archive holds a row.
+    :param engine: Engine of the database
+    :return: True if the database is missing or all tables are empty
+    """
+    if not database_exists(engine.url):
+        return True
+    inspector = sqlalchemy.inspect(engine)
+    with engine.connect() as connection:
+        return all(
+            connection.execute(sqlalchemy.select(table).limit(1)).first() is None
+            for table in db.Base.metadata.sorted_tables
+            if inspector.has_table(table.name)
+        )
+
+
+def prepare_database(connector: str, drop: bool = False) -> None:
+    """
+    Point the db module to the benchmark database and start with empty tables. A database which
+    already holds data is refused unless drop is set, so a wrong connector can not wipe an
+    archive.
+    :param connector: Connection string of the benchmark database
+    :param drop: Drop the tables even if they hold data
+    :return: None
+    """
+    db.dispose_engine(db.CONNECTOR)
+    db.CONNECTOR = connector
+    if not drop and not database_is_empty(db.get_engine()):
+        raise SystemExit(
+            f"Benchmark-Datenbank {connector} ist nicht leer, zum Leeren --drop angeben."
+        )
+    db.init()
+    if not db.DB_CONNECTION_VALID:
+        raise SystemExit(f"Keine Verbindung zur Benchmark-Datenbank {connector}")
+    db.Base.metadata.drop_all(db.get_engine())
+    db.Base.metadata.create_all(db.get_engine())
+    db.KNOWN_TWEET_IDS.clear()
+
+
+def run_once(
+    arguments: argparse.Namespace,
+    message_count: int,
+    connector: str,
+    queue_path: str,
+    drop: bool = False,
+) -> dict:
+    """
+    Run one handler pass for a backlog of message_count direct messages.
+    :param arguments: Parsed command line arguments
+    :param message_count: Size of the backlog
+    :param connector: Connection string of the benchmark database
+    :param queue_path: Path of the work queue file
+    :param drop: Drop the tables of the database even if they hold data
+    :return: Dictionary with the measured values
+    """
+    prepare_database(connector, drop)
+    rate_limits = (
+        rate_limit.ENDPOINT_RATE_LIMITS
+        if arguments.rate_limits
+        else dict.fromkeys(rate_limit.ENDPOINT_RATE_LIMITS, UNLIMITED_REQUESTS)
+    )
+    api = rate_limit.RateLimitedAPI(
+        FakeTwitterAPI(
+            message_count,
+            latency=arguments.latency,
+            deleted_ratio=arguments.deleted_ratio,
+            duplicate_ratio=arguments.duplicate_ratio,
+            rate_limits=rate_limits if arguments.rate_limits else None,
+            rate_limit_window=arguments.rate_limit_window,
+        ),
+        rate_limits,
+        arguments.rate_limit_window,
+    )
+    max_pages = message_handler.MAX_PAGES
+    message_handler.MAX_PAGES = message_count // message_handler.MAX_TWEETS_PER_PAGE + 1
+    tracemalloc.start()
+    try:
+        with RoundTripCounter(db.get_engine()) as counter:
+            start = time.perf_counter()
+            message_handler.handle_messages(api, arguments.workers, queue_path)
+            duration = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        message_handler.MAX_PAGES = max_pages
+    return {
+        "messages": message_count,
+        "seconds": duration,
+        "messages_per_second": message_count / duration,
+        "round_trips_per_message": counter.count / message_count,
+        "api_calls": sum(api.api.call_counts.values()),
+        "peak_memory_mb": peak_memory / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    """
+    Parse the arguments, run all backlog sizes and print the results as table.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument(
+        "--messages", type=int, nargs="+", default=[100, 1000, 10000, 100000]
+    )
+    parser.add_argument("--db", help="Connection string, default is a temporary SQLite")
+    parser.add_argument(
+        "--drop", action="store_true", help="Drop the tables of --db even if they hold data"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per call")
+    parser.add_argument("--deleted-ratio", type=float, default=0.1)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rate-limits", action="store_true")
+    parser.add_argument("--rate-limit-window", type=float, default=15 * 60)
+    arguments = parser.parse_args()
+
+    print(
+        f"{'Nachrichten':>12} {'Sekunden':>10} {'Nachr./s':>10} "
+        f"{'DB-Trips/Nachr.':>16} {'API-Calls':>10} {'Peak MB':>9}"
+    )
+    drop = arguments.drop
+    with tempfile.TemporaryDirectory() as directory:
+        for message_count in arguments.messages:
+            connector = arguments.db or "sqlite:///" + os.path.join(
+                directory, f"benchmark_{message_count}.db"
+            )
+            result = run_once(
+                arguments,
+                message_count,
+                connector,
+                os.path.join(directory, f"work_queue_{message_count}.db"),
+                drop,
+            )
+            # the database now only holds the data of the previous pass
+            drop = True
+            print(
+                f"{result['messages']:>12} {result['seconds']:>10.2f} "
+                f"{result['messages_per_second']:>10.1f} "
+                f"{result['round_trips_per_message']:>16.3f} "
+                f"{result['api_calls']:>10} {result['peak_memory_mb']:>9.1f}"
+            )
+        db.dispose_engine()
+
+
+if __name__ == "__main__":
+    main()
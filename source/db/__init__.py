@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Collection of functions for handling with database. The package holds the connection, the
+caches and the checkpoints. The models, the write and read functions and the migration live in
+their own modules and are available here as well.
+"""
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Iterable
+from heapq import merge
+from itertools import islice
+from datetime import datetime
+from dataclasses import dataclass
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy_utils import database_exists, create_database
+from source import metrics, resilience
+from source.db.models import (
+    AnalysisResult,
+    Base,
+    Comment,
+    DeletedTweet,
+    HandlerCheckpoint,
+    RejectedMessage,
+    Tag,
+    Term,
+    Tweet,
+    TweetTermMatch,
+    TwitterUser,
+    UserNameAtTime,
+    UserScreenNameAtTime,
+    tweets_link_comments,
+    tweets_link_tags,
+)
+
+CONNECTOR = os.getenv("DB_CONNECTOR")
+DB_CONNECTION_VALID = False
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+IN_CLAUSE_CHUNK_SIZE = 500
+IDENTITY_CACHE_SIZE = int(os.getenv("DB_IDENTITY_CACHE_SIZE", "10000"))
+EXPORT_CHUNK_SIZE = 1000
+KNOWN_TWEET_IDS_MERGE_THRESHOLD = 4096
+KNOWN_TWEET_IDS_LOAD_CHUNK_SIZE = 100000
+CHECKPOINT_COLUMNS = (
+    "last_message_id",
+    "last_message_timestamp",
+    "watermark",
+    "watermark_timestamp",
+)
+
+_ENGINES: dict[str, sqlalchemy.engine.Engine] = {}
+_SESSION_FACTORIES: dict[str, scoped_session] = {}
+_ENGINE_LOCK = threading.Lock()
+TRANSIENT_ERRORS = (sqlalchemy.exc.OperationalError, sqlalchemy.exc.DisconnectionError)
+DB_BREAKER = resilience.CircuitBreaker("database")
+
+
+class IdentityCache:
+    """
+    Bounded LRU cache for lookups which repeat during a handler run: twitter user id to user
+    primary key, comment text to comment primary key, user primary key to the current
+    name and screen name and the automaton of the known terms. Every namespace holds at most
+    max_size entries. Entries found during a transaction are only added after its commit, see
+    _cache_after_commit.
+    """
+
+    def __init__(self, max_size: int = IDENTITY_CACHE_SIZE):
+        self.max_size = max_size
+        self.namespaces = {}
+        self.lock = threading.Lock()
+
+    def get_many(self, namespace: str, keys) -> dict:
+        """
+        Return all cached entries of the keys and mark them as recently used.
+        :param namespace: Name of the cache, e.g. users, comments or user_names
+        :param keys: Keys to look up
+        :return: Dictionary with the found entries
+        """
+        with self.lock:
+            entries = self.namespaces.setdefault(namespace, OrderedDict())
+            found = {}
+            for key in keys:
+                if key in entries:
+                    entries.move_to_end(key)
+                    found[key] = entries[key]
+            return found
+
+    def put_many(self, namespace: str, mapping: dict) -> None:
+        """
+        Store entries and drop the least recently used ones above max_size.
+        :param namespace: Name of the cache
+        :param mapping: Dictionary with the new entries
+        :return: None
+        """
+        with self.lock:
+            entries = self.namespaces.setdefault(namespace, OrderedDict())
+            for key, value in mapping.items():
+                entries[key] = value
+                entries.move_to_end(key)
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Drop all entries, e.g. at the start of a run.
+        :return: None
+        """
+        with self.lock:
+            self.namespaces.clear()
+
+
+IDENTITY_CACHE = IdentityCache()
+
+
+def _cache_after_commit(session, namespace: str, mapping: dict) -> None:
+    """
+    Collect entries for the identity cache until the transaction of the session is committed,
+    so no thread reads keys of a transaction which is rolled back later.
+    :param session: Active session
+    :param namespace: Name of the cache
+    :param mapping: Dictionary with the new entries
+    :return: None
+    """
+    session.info.setdefault("identity_cache_updates", []).append((namespace, mapping))
+
+
+def _apply_cache_updates(session) -> None:
+    """
+    Session hook after a commit: add the collected entries to the identity cache.
+    :param session: Committed session
+    :return: None
+    """
+    for namespace, mapping in session.info.pop("identity_cache_updates", []):
+        IDENTITY_CACHE.put_many(namespace, mapping)
+
+
+def _drop_cache_updates(session) -> None:
+    """
+    Session hook after a rollback: forget the collected entries.
+    :param session: Rolled back session
+    :return: None
+    """
+    session.info.pop("identity_cache_updates", None)
+
+
+class KnownTweetIds:
+    """
+    Membership set of all stored tweet ids and deleted tweet ids. The loaded ids are kept as
+    sorted int64 array with 8 bytes per id and are searched with bisect, ids stored later are
+    collected in a small set which is merged into the array from time to time.
+    """
+
+    def __init__(self, merge_threshold: int = KNOWN_TWEET_IDS_MERGE_THRESHOLD):
+        self.merge_threshold = merge_threshold
+        self.sorted_ids = array("q")
+        self.pending_ids = set()
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def __contains__(self, tweet_id: int) -> bool:
+        with self.lock:
+            if tweet_id in self.pending_ids:
+                return True
+            index = bisect_left(self.sorted_ids, tweet_id)
+            return index < len(self.sorted_ids) and self.sorted_ids[index] == tweet_id
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sorted_ids) + len(self.pending_ids)
+
+    def load(
+        self, tweet_ids: Iterable[int], chunk_size: int = KNOWN_TWEET_IDS_LOAD_CHUNK_SIZE
+    ) -> None:
+        """
+        Replace all ids with the ids from the database. The stream is sorted in chunks which are
+        kept as arrays and merged into the final array, so at most one chunk is held as Python
+        integers.
+        :param tweet_ids: All stored tweet ids in any order
+        :param chunk_size: Number of ids sorted at once
+        :return: None
+        """
+        sorted_chunks = []
+        tweet_ids = iter(tweet_ids)
+        while chunk := list(islice(tweet_ids, chunk_size)):
+            chunk.sort()
+            sorted_chunks.append(array("q", chunk))
+        sorted_ids = array("q", merge(*sorted_chunks))
+        with self.lock:
+            self.sorted_ids = sorted_ids
+            self.pending_ids = set()
+            self.loaded = True
+
+    def add_many(self, tweet_ids: Iterable[int]) -> None:
+        """
+        Add ids of committed tweets. Nothing is collected before the ids are loaded, the load
+        reads them from the database anyway.
+        :param tweet_ids: Stored tweet ids
+        :return: None
+        """
+        with self.lock:
+            if not self.loaded:
+                return
+            self.pending_ids.update(tweet_ids)
+            if len(self.pending_ids) >= self.merge_threshold:
+                self.sorted_ids = array(
+                    "q", merge(self.sorted_ids, sorted(self.pending_ids))
+                )
+                self.pending_ids = set()
+
+    def clear(self) -> None:
+        """
+        Forget all ids, e.g. when the tables are dropped.
+        :return: None
+        """
+        with self.lock:
+            self.sorted_ids = array("q")
+            self.pending_ids = set()
+            self.loaded = False
+
+
+KNOWN_TWEET_IDS = KnownTweetIds()
+
+
+def reset_identity_cache() -> None:
+    """
+    Start a new run with an empty identity cache.
+    :return: None
+    """
+    IDENTITY_CACHE.clear()
+
+
+def _pool_arguments(connector: str) -> dict:
+    """
+    Build the pool configuration for the engine. SQLite does not use a queue pool, so size and
+    overflow are only passed to server databases like MariaDB.
+    :param connector: Connection string of the database
+    :return: Dictionary with keyword arguments for create_engine
+    """
+    arguments = {"pool_recycle": POOL_RECYCLE, "pool_pre_ping": POOL_PRE_PING}
+    if sqlalchemy.engine.make_url(connector).get_backend_name() != "sqlite":
+        arguments["pool_size"] = POOL_SIZE
+        arguments["max_overflow"] = POOL_MAX_OVERFLOW
+    return arguments
+
+
+def get_engine(connector: str = None) -> sqlalchemy.engine.Engine:
+    """
+    Return the process wide engine for the connector. The engine and its connection pool are
+    created lazily with the first call and reused afterwards.
+    :param connector: Connection string of the database, default is DB_CONNECTOR
+    :return: Engine with connection pool
+    """
+    connector = connector or CONNECTOR
+    engine = _ENGINES.get(connector)
+    if engine is not None:
+        return engine
+    with _ENGINE_LOCK:
+        if connector not in _ENGINES:
+            engine = create_engine(connector, **_pool_arguments(connector))
+            metrics.instrument_engine(engine)
+            session_maker = sessionmaker(bind=engine)
+            sqlalchemy.event.listen(session_maker, "after_commit", _apply_cache_updates)
+            sqlalchemy.event.listen(session_maker, "after_rollback", _drop_cache_updates)
+            _SESSION_FACTORIES[connector] = scoped_session(session_maker)
+            _ENGINES[connector] = engine
+        return _ENGINES[connector]
+
+
+def get_session_factory(connector: str = None) -> scoped_session:
+    """
+    Return the scoped session factory shared by all database functions. Sessions are thread local
+    and take their connections from the pool of the process wide engine.
+    :param connector: Connection string of the database, default is DB_CONNECTOR
+    :return: Scoped session factory
+    """
+    connector = connector or CONNECTOR
+    get_engine(connector)
+    return _SESSION_FACTORIES[connector]
+
+
+def dispose_engine(connector: str = None) -> None:
+    """
+    Close all pooled connections and forget the engine, e.g. at shutdown or after a fork.
+    :param connector: Connection string of the database, default is DB_CONNECTOR
+    :return: None
+    """
+    connector = connector or CONNECTOR
+    with _ENGINE_LOCK:
+        session_factory = _SESSION_FACTORIES.pop(connector, None)
+        if session_factory is not None:
+            session_factory.remove()
+        engine = _ENGINES.pop(connector, None)
+        if engine is not None:
+            engine.dispose()
+
+
+@dataclass
+class SQLAlchemyConnectionManager:
+    """
+    Class to handle data writes with context manager for SQLAlchemy. The session is taken from
+    the shared scoped session factory, so the connection goes back to the pool on exit. Without
+    connector the current DB_CONNECTOR is used.
+    """
+
+    connector: str = None
+    engine: sqlalchemy.engine.Engine = None
+    session_make: scoped_session = None
+    session: sqlalchemy.orm.session.Session = None
+
+    def __enter__(self):
+        self.engine = get_engine(self.connector)
+        self.session_make = get_session_factory(self.connector)
+        self.session = self.session_make()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.session_make.remove()
+
+    def add(
+        self,
+        data: Tweet
+        | TwitterUser
+        | UserScreenNameAtTime
+        | UserNameAtTime
+        | DeletedTweet,
+    ):
+        """
+        Write and commit data to database
+        :param data: Table class to save
+        :return:
+        """
+        try:
+            self.session.add(data)
+            self.session.commit()
+        except sqlalchemy.exc.OperationalError as err:
+            self.session.rollback()
+            print(f"Fehler beim speichern {data} mit dem Fehler: {err}")
+            raise
+
+
+def _insert_ignore(session, table, rows: list, conflict_column: str | tuple) -> None:
+    """
+    Insert rows and skip all rows which already exist with the same unique value. The dialect
+    native upsert is used for MariaDB/MySQL and SQLite, so concurrent writers do not collide.
+    :param session: Active session
+    :param table: Table or table class to insert into
+    :param rows: List with insert parameters as dictionaries
+    :param conflict_column: Name of the unique column or tuple with the names of the columns
+    of a unique index
+    :return: None
+    """
+    if not rows:
+        return
+    table = getattr(table, "__table__", table)
+    conflict_columns = (
+        (conflict_column,) if isinstance(conflict_column, str) else conflict_column
+    )
+    dialect = session.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update(
+            {conflict_columns[0]: statement.inserted[conflict_columns[0]]}
+        )
+    elif dialect == "sqlite":
+        statement = sqlite.insert(table).on_conflict_do_nothing(
+            index_elements=list(conflict_columns)
+        )
+    else:
+        existing = {
+            tuple(row)
+            for row in _select_in(
+                session,
+                tuple(table.c[column] for column in conflict_columns),
+                table.c[conflict_columns[0]],
+                {row[conflict_columns[0]] for row in rows},
+            )
+        }
+        rows = [
+            row
+            for row in rows
+            if tuple(row[column] for column in conflict_columns) not in existing
+        ]
+        if not rows:
+            return
+        statement = sqlalchemy.insert(table)
+    session.execute(statement, rows)
+
+
+def _read_checkpoint(session, name: str) -> dict:
+    """
+    Read the positions of a job in an active session, without retry.
+    :param session: Active session
+    :param name: Name of the job
+    :return: Dictionary with last_message_id, last_message_timestamp, watermark and
+    watermark_timestamp, all None if the job never finished a run
+    """
+    checkpoint = (
+        session.query(HandlerCheckpoint).filter(HandlerCheckpoint.name == name).first()
+    )
+    return {column: getattr(checkpoint, column, None) for column in CHECKPOINT_COLUMNS}
+
+
+def _write_checkpoint(session, name: str, **positions) -> None:
+    """
+    Create or update the positions of a job in an active session, without retry and commit.
+    :param session: Active session
+    :param name: Name of the job
+    :param positions: Columns of HandlerCheckpoint with their new values
+    :return: None
+    """
+    checkpoint = (
+        session.query(HandlerCheckpoint).filter(HandlerCheckpoint.name == name).first()
+    )
+    if checkpoint is None:
+        checkpoint = HandlerCheckpoint(name=name)
+        session.add(checkpoint)
+    for column, value in positions.items():
+        setattr(checkpoint, column, value)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_checkpoint(name: str) -> dict:
+    """
+    Read the last processed position of a job.
+    :param name: Name of the job
+    :return: Dictionary with last_message_id, last_message_timestamp, watermark and
+    watermark_timestamp, all None if the job never finished a run
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        return _read_checkpoint(conn.session, name)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def set_checkpoint(
+    name: str, last_message_id: int, last_message_timestamp: datetime
+) -> None:
+    """
+    Persist the last processed direct message of a job.
+    :param name: Name of the job
+    :param last_message_id: ID of the newest processed message
+    :param last_message_timestamp: Timestamp of the newest processed message
+    :return: None
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        _write_checkpoint(
+            conn.session,
+            name,
+            last_message_id=last_message_id,
+            last_message_timestamp=last_message_timestamp,
+        )
+        conn.session.commit()
+
+
+def _select_in(session, columns: tuple, column, values, lock: bool = False) -> list:
+    """
+    Run one SELECT with an IN clause for all values. Very large value lists are split into chunks
+    to stay below the parameter limit of the database.
+    :param session: Active session
+    :param columns: Columns to select
+    :param column: Column to filter with IN
+    :param values: Values to look up
+    :param lock: Read with a shared lock, so rows which concurrent writers committed after the
+    snapshot of the transaction are found as well, e.g. after an upsert on MariaDB
+    :return: List with all found rows
+    """
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+        query = session.query(*columns).filter(
+            column.in_(values[start : start + IN_CLAUSE_CHUNK_SIZE])
+        )
+        if lock:
+            query = query.with_for_update(read=True)
+        rows.extend(query.all())
+    return rows
+
+
+def init() -> None:
+    """
+    Initialization function to create the database if not exists
+    :return: None
+    """
+    global DB_CONNECTION_VALID  # pylint: disable=global-statement
+    DB_CONNECTION_VALID = False
+    try:
+        engine = get_engine()
+        if not database_exists(engine.url):
+            create_database(engine.url)
+        Base.metadata.create_all(engine)
+        migrate(engine)
+        DB_CONNECTION_VALID = True
+
+    except sqlalchemy.exc.OperationalError as err:
+        print(
+            f"ERROR: No connection to the database is possible. Aborted with error: [{err}]. "
+            f"Please check DB_CONNECTOR."
+        )
+        dispose_engine()
+
+    except sqlalchemy.exc.IntegrityError as err:
+        print(f"ERROR: Migration of the database failed. Aborted with error: [{err}].")
+        dispose_engine()
+
+    except sqlalchemy.exc.ProgrammingError as err:
+        print(f"ERROR: unexpected error: [{err}].")
+
+
+def main() -> None:
+    """
+    Main function to run db for tests
+    :return: None
+    """
+
+
+# The write, read and migration modules build on the definitions above, so they are imported
+# last and their functions are part of the interface of the package.
+# pylint: disable=wrong-import-position
+from source.db.write import (
+    add_analysis_results_bulk,
+    add_deleted_tweet,
+    add_rejected_messages_bulk,
+    add_tweet,
+    add_tweets_bulk,
+    add_users_bulk,
+    check_and_update_user_names,
+    load_known_tweet_ids,
+    scan_archive_for_new_terms,
+)
+from source.db.read import (
+    SETTLE_SECONDS,
+    Page,
+    Watermark,
+    get_deleted_tweets_by_screen_name,
+    get_tweets_after,
+    get_tweets_by_comment,
+    get_tweets_by_create_date,
+    get_tweets_by_tag,
+    get_tweets_by_user,
+    get_user_name_history,
+    get_watermark,
+    iter_tweets_for_export,
+    search_tweets,
+    set_watermark,
+    settled_until,
+)
+from source.db.migration import migrate
+# pylint: enable=wrong-import-position
+
+
+if __name__ == "__main__":
+    init()
+    main()
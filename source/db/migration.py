@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migration of existing databases: missing columns, back-fills, unique and full-text indexes.
+"""
+# imported back by the db package, which re-exports its functions
+# pylint: disable=cyclic-import
+from datetime import datetime
+import sqlalchemy
+from source.db import (
+    IN_CLAUSE_CHUNK_SIZE,
+    _insert_ignore,
+)
+from source.db.models import (
+    Base,
+    Comment,
+    HandlerCheckpoint,
+    Tag,
+    Term,
+    TweetTermMatch,
+    TwitterUser,
+    UserNameAtTime,
+    UserScreenNameAtTime,
+    tweets_link_comments,
+    tweets_link_tags,
+)
+from source.db.read import Watermark, get_watermark, set_watermark
+from source.db.write import scan_archive_for_new_terms
+from source.terms import extract_marked_terms, tokenize_comment
+
+TERM_FILL_CHECKPOINT_NAME = "term_fill"
+# CHECKPOINT_NAME of the message handler, the only job over the direct messages
+MESSAGE_CHECKPOINT_NAME = "message_handler"
+TAG_FILL_BATCH_SIZE = 5000
+FULLTEXT_INDEX_NAME = "ix_tweets_tweet_text_fulltext"
+SQLITE_FULLTEXT_STATEMENTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts "
+    "USING fts5(tweet_text, content='tweets', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS tweets_fts_insert AFTER INSERT ON tweets BEGIN "
+    "INSERT INTO tweets_fts(rowid, tweet_text) VALUES (new.id, new.tweet_text); END",
+    "CREATE TRIGGER IF NOT EXISTS tweets_fts_delete AFTER DELETE ON tweets BEGIN "
+    "INSERT INTO tweets_fts(tweets_fts, rowid, tweet_text) "
+    "VALUES ('delete', old.id, old.tweet_text); END",
+    "CREATE TRIGGER IF NOT EXISTS tweets_fts_update AFTER UPDATE OF tweet_text ON tweets BEGIN "
+    "INSERT INTO tweets_fts(tweets_fts, rowid, tweet_text) "
+    "VALUES ('delete', old.id, old.tweet_text); "
+    "INSERT INTO tweets_fts(rowid, tweet_text) VALUES (new.id, new.tweet_text); END",
+    "INSERT INTO tweets_fts(tweets_fts) VALUES ('rebuild')",
+)
+
+
+def _add_missing_columns(engine: sqlalchemy.engine.Engine, inspector) -> set:
+    """
+    Add columns which are defined in the table classes but missing in the database.
+    :param engine: Engine of the database
+    :param inspector: Inspector of the database
+    :return: Set with the added columns as "table.column"
+    """
+    added_columns = set()
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_definition = sqlalchemy.schema.CreateColumn(column).compile(
+                dialect=engine.dialect
+            )
+            with engine.begin() as connection:
+                connection.execute(
+                    sqlalchemy.text(
+                        f"ALTER TABLE {engine.dialect.identifier_preparer.quote(table.name)}"
+                        f" ADD COLUMN {column_definition}"
+                    )
+                )
+            added_columns.add(f"{table.name}.{column.name}")
+            print(f"Migration: Spalte {column.name} für {table.name} angelegt.")
+    return added_columns
+
+
+def _fill_current_user_names(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Set the current names of all users to the latest entries of their name histories.
+    :param engine: Engine of the database
+    :return: None
+    """
+    latest_name = (
+        sqlalchemy.select(UserNameAtTime.twitter_user_name)
+        .where(UserNameAtTime.user_id == TwitterUser.id)
+        .order_by(UserNameAtTime.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    latest_screen_name = (
+        sqlalchemy.select(UserScreenNameAtTime.twitter_user_screen_name)
+        .where(UserScreenNameAtTime.user_id == TwitterUser.id)
+        .order_by(UserScreenNameAtTime.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    with engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.update(TwitterUser.__table__).values(
+                current_user_name=latest_name,
+                current_user_screen_name=latest_screen_name,
+            )
+        )
+    print("Migration: Aktuelle Namen der Twitter User übernommen.")
+
+
+def _move_job_watermarks(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Move the positions of the jobs over the tables of the archive from the direct message
+    columns into the watermark columns. Only the message handler keeps its direct message.
+    :param engine: Engine of the database
+    :return: None
+    """
+    checkpoints = HandlerCheckpoint.__table__
+    other_jobs = checkpoints.c.name != MESSAGE_CHECKPOINT_NAME
+    with engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.update(checkpoints)
+            .where(other_jobs)
+            .values(
+                watermark=checkpoints.c.last_message_id,
+                watermark_timestamp=checkpoints.c.last_message_timestamp,
+            )
+        )
+        connection.execute(
+            sqlalchemy.update(checkpoints)
+            .where(other_jobs)
+            .values(last_message_id=None, last_message_timestamp=None)
+        )
+    print("Migration: Positionen der Jobs in die Watermark übernommen.")
+
+
+def _fill_tags(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Tokenize the comments of all stored tweets into tags and link the tags to the tweets.
+    :param engine: Engine of the database
+    :return: None
+    """
+    session = sqlalchemy.orm.Session(bind=engine)
+    try:
+        comment_tags = {
+            comment_key: tokenize_comment(comment)
+            for comment_key, comment in session.query(Comment.id, Comment.comment)
+        }
+        _insert_ignore(
+            session,
+            Tag,
+            [
+                {"tag": tag}
+                for tag in {tag for tags in comment_tags.values() for tag in tags}
+            ],
+            "tag",
+        )
+        tag_keys = dict(session.query(Tag.tag, Tag.id).all())
+        links = set()
+        for tweet_key, comment_key in session.execute(
+            sqlalchemy.select(
+                tweets_link_comments.c.tweet_id, tweets_link_comments.c.comment_id
+            )
+        ):
+            links.update(
+                (tweet_key, tag_keys[tag]) for tag in comment_tags.get(comment_key, [])
+            )
+        links = [{"tweet_id": tweet_key, "tag_id": tag_key} for tweet_key, tag_key in links]
+        for start in range(0, len(links), TAG_FILL_BATCH_SIZE):
+            session.execute(
+                tweets_link_tags.insert(), links[start : start + TAG_FILL_BATCH_SIZE]
+            )
+        session.commit()
+        print(f"Migration: {len(links)} Tags der Kommentare mit Tweets verknüpft.")
+    except sqlalchemy.exc.SQLAlchemyError:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _fill_terms(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Extract the terms marked as ?WORT? from all stored comments. The archive is scanned for
+    them afterwards like for every new term.
+    :param engine: Engine of the database
+    :return: None
+    """
+    session = sqlalchemy.orm.Session(bind=engine)
+    try:
+        terms = {
+            term
+            for (comment,) in session.query(Comment.comment).filter(
+                Comment.comment.like("%?%?%")
+            )
+            for term in extract_marked_terms(comment)
+        }
+        _insert_ignore(session, Term, [{"term": term} for term in terms], "term")
+        session.commit()
+        print(f"Migration: {len(terms)} markierte Begriffe der Kommentare übernommen.")
+    except sqlalchemy.exc.SQLAlchemyError:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _remove_duplicate_term_matches(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Delete duplicate term matches of a tweet and a term, the oldest row is kept.
+    :param engine: Engine of the database
+    :return: None
+    """
+    first_matches = (
+        sqlalchemy.select(sqlalchemy.func.min(TweetTermMatch.id).label("id"))
+        .group_by(TweetTermMatch.tweet_id, TweetTermMatch.term_id)
+        .subquery()
+    )
+    with engine.begin() as connection:
+        result = connection.execute(
+            sqlalchemy.delete(TweetTermMatch).where(
+                TweetTermMatch.id.not_in(sqlalchemy.select(first_matches.c.id))
+            )
+        )
+    print(f"Migration: {result.rowcount} doppelte Treffer von Begriffen entfernt.")
+
+
+def _remove_duplicate_links(connection, link_table: sqlalchemy.Table) -> None:
+    """
+    Delete repeated rows of a link table without primary key, one row of each link is kept.
+    :param connection: Connection with an active transaction
+    :param link_table: Link table, e.g. tweets_link_comments
+    :return: None
+    """
+    columns = list(link_table.c)
+    duplicates = connection.execute(
+        sqlalchemy.select(*columns).group_by(*columns).having(sqlalchemy.func.count() > 1)
+    ).all()
+    for row in duplicates:
+        connection.execute(
+            link_table.delete().where(
+                sqlalchemy.and_(*(column == value for column, value in zip(columns, row)))
+            )
+        )
+    if duplicates:
+        connection.execute(
+            link_table.insert(),
+            [{column.name: value for column, value in zip(columns, row)} for row in duplicates],
+        )
+
+
+def _remove_duplicate_rows(engine: sqlalchemy.engine.Engine, table, column) -> None:
+    """
+    Merge rows with the same value in a column which gets a unique index, the row with the
+    lowest id is kept. Rows of other tables which reference a merged row are re-pointed to the
+    kept row, links which then exist twice are stored once. Referencing rows which would break
+    a unique index of their own table, e.g. analysis results, are deleted and built again.
+    :param engine: Engine of the database
+    :param table: Table with id column, e.g. the table of Tweet
+    :param column: Column of the unique index
+    :return: None
+    """
+    first_rows = (
+        sqlalchemy.select(sqlalchemy.func.min(table.c.id).label("id"), column.label("value"))
+        .group_by(column)
+        .having(sqlalchemy.func.count() > 1)
+        .subquery()
+    )
+    with engine.begin() as connection:
+        replacements = connection.execute(
+            sqlalchemy.select(table.c.id, first_rows.c.id)
+            .join(first_rows, column == first_rows.c.value)
+            .where(table.c.id != first_rows.c.id)
+        ).all()
+        if not replacements:
+            return
+        duplicate_ids = [duplicate_id for duplicate_id, _ in replacements]
+        for referencing_table in Base.metadata.sorted_tables:
+            for foreign_key in referencing_table.foreign_keys:
+                if foreign_key.column is not table.c.id:
+                    continue
+                reference = foreign_key.parent
+                if reference.unique or any(
+                    index.unique and reference.key in index.columns
+                    for index in referencing_table.indexes
+                ):
+                    for start in range(0, len(duplicate_ids), IN_CLAUSE_CHUNK_SIZE):
+                        connection.execute(
+                            referencing_table.delete().where(
+                                reference.in_(
+                                    duplicate_ids[start : start + IN_CLAUSE_CHUNK_SIZE]
+                                )
+                            )
+                        )
+                    continue
+                connection.execute(
+                    sqlalchemy.update(referencing_table)
+                    .where(reference == sqlalchemy.bindparam("duplicate_id"))
+                    .values({reference.name: sqlalchemy.bindparam("first_id")}),
+                    [
+                        {"duplicate_id": duplicate_id, "first_id": first_id}
+                        for duplicate_id, first_id in replacements
+                    ],
+                )
+                if not referencing_table.primary_key.columns:
+                    _remove_duplicate_links(connection, referencing_table)
+        for start in range(0, len(duplicate_ids), IN_CLAUSE_CHUNK_SIZE):
+            connection.execute(
+                table.delete().where(
+                    table.c.id.in_(duplicate_ids[start : start + IN_CLAUSE_CHUNK_SIZE])
+                )
+            )
+    print(f"Migration: {len(duplicate_ids)} doppelte Einträge in {table.name} zusammengeführt.")
+
+
+def _create_fulltext_index(engine: sqlalchemy.engine.Engine, inspector) -> None:
+    """
+    Create the full-text index of the tweet texts. On SQLite this is a FTS5 table which is kept
+    in sync by triggers on every insert, update and delete of tweets, it is rebuilt from the
+    tweets when its insert trigger was missing. On MariaDB/MySQL it is a FULLTEXT index.
+    :param engine: Engine of the database
+    :param inspector: Inspector of the database
+    :return: None
+    """
+    dialect = engine.dialect.name
+    try:
+        if dialect == "sqlite":
+            with engine.begin() as connection:
+                if (
+                    connection.execute(
+                        sqlalchemy.text(
+                            "SELECT name FROM sqlite_master "
+                            "WHERE type = 'trigger' AND name = 'tweets_fts_insert'"
+                        )
+                    ).first()
+                    is None
+                ):
+                    for statement in SQLITE_FULLTEXT_STATEMENTS:
+                        connection.execute(sqlalchemy.text(statement))
+                    print("Migration: Volltextindex für tweets angelegt.")
+        elif dialect in ("mysql", "mariadb") and FULLTEXT_INDEX_NAME not in {
+            index["name"] for index in inspector.get_indexes("tweets")
+        }:
+            with engine.begin() as connection:
+                connection.execute(
+                    sqlalchemy.text(
+                        f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} ON tweets (tweet_text)"
+                    )
+                )
+            print("Migration: Volltextindex für tweets angelegt.")
+    except sqlalchemy.exc.OperationalError as err:
+        print(f"ERROR: Volltextindex konnte nicht angelegt werden. Fehler: [{err}]")
+
+
+def migrate(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Bring an existing database up to date with the table definitions. Missing columns are added
+    and filled, the positions of the jobs over the archive are moved into the watermark
+    columns, the comments of existing tweets are split into tags once, the full-text index
+    and missing indexes and unique constraints are created. Before a unique index is created,
+    duplicate rows are merged into the row with the lowest id and duplicate term matches are
+    removed, so existing data becomes safe for the upserts. If a unique index still can not be
+    created, the error is raised, because the upserts depend on the unique indexes. Finally the
+    marked terms of existing comments are taken over once and the archive is scanned for them.
+    :param engine: Engine of the database
+    :return: None
+    """
+    inspector = sqlalchemy.inspect(engine)
+    added_columns = _add_missing_columns(engine, inspector)
+    if "twitterUser.current_user_name" in added_columns:
+        _fill_current_user_names(engine)
+    if "handlerCheckpoint.watermark" in added_columns:
+        _move_job_watermarks(engine)
+    with engine.connect() as connection:
+        tags_missing = (
+            connection.execute(sqlalchemy.select(tweets_link_tags).limit(1)).first() is None
+            and connection.execute(sqlalchemy.select(tweets_link_comments).limit(1)).first()
+            is not None
+        )
+    if tags_missing:
+        _fill_tags(engine)
+    inspector = sqlalchemy.inspect(engine)
+    _create_fulltext_index(engine, inspector)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        existing |= {
+            constraint["name"]
+            for constraint in inspector.get_unique_constraints(table.name)
+        }
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if table.name == TweetTermMatch.__tablename__ and index.unique:
+                _remove_duplicate_term_matches(engine)
+            elif index.unique and len(index.columns) == 1 and "id" in table.c:
+                _remove_duplicate_rows(engine, table, list(index.columns)[0])
+            try:
+                index.create(bind=engine)
+                print(f"Migration: Index {index.name} für {table.name} angelegt.")
+            except (
+                sqlalchemy.exc.IntegrityError,
+                sqlalchemy.exc.OperationalError,
+            ) as err:
+                print(
+                    f"ERROR: Index {index.name} konnte nicht angelegt werden. Fehler: [{err}]"
+                )
+                if index.unique:
+                    raise
+    if get_watermark(TERM_FILL_CHECKPOINT_NAME).input_timestamp is None:
+        _fill_terms(engine)
+        scan_archive_for_new_terms()
+        set_watermark(TERM_FILL_CHECKPOINT_NAME, Watermark(datetime.utcnow()))
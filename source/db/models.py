@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Table structure of the database as SQLAlchemy models.
+"""
+from datetime import datetime
+import sqlalchemy
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+Base = declarative_base()
+
+
+tweets_link_comments = sqlalchemy.Table(
+    "tweets_link_comments",
+    Base.metadata,
+    sqlalchemy.Column("tweet_id", sqlalchemy.ForeignKey("tweets.id")),
+    sqlalchemy.Column("comment_id", sqlalchemy.ForeignKey("comments.id")),
+    sqlalchemy.Index(
+        "ix_tweets_link_comments_comment_id_tweet_id", "comment_id", "tweet_id"
+    ),
+)
+
+
+tweets_link_tags = sqlalchemy.Table(
+    "tweets_link_tags",
+    Base.metadata,
+    sqlalchemy.Column("tweet_id", sqlalchemy.ForeignKey("tweets.id"), index=True),
+    sqlalchemy.Column("tag_id", sqlalchemy.ForeignKey("tags.id")),
+    sqlalchemy.Index("ix_tweets_link_tags_tag_id_tweet_id", "tag_id", "tweet_id"),
+)
+
+
+class UserNameAtTime(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for Twitter username combined with timestamp for history"""
+
+    __tablename__ = "userNameAtTime"
+    __table_args__ = {"mariadb_charset": "utf8mb4"}
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    user_id = sqlalchemy.Column(
+        sqlalchemy.Integer, sqlalchemy.ForeignKey("twitterUser.id"), index=True
+    )
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, default=datetime.utcnow
+    )
+    twitter_user_name = sqlalchemy.Column(sqlalchemy.String(500))
+
+    def __repr__(self):
+        return f"<Objekt> UserNameAtTime mit Name: {self.twitter_user_name}"
+
+
+class UserScreenNameAtTime(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for Twitter user screen name combined with timestamp for history"""
+
+    __tablename__ = "userScreenNameAtTime"
+    __table_args__ = {"mariadb_charset": "utf8mb4"}
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    user_id = sqlalchemy.Column(
+        sqlalchemy.Integer, sqlalchemy.ForeignKey("twitterUser.id"), index=True
+    )
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, default=datetime.utcnow
+    )
+    twitter_user_screen_name = sqlalchemy.Column(sqlalchemy.String(500))
+
+    def __repr__(self):
+        return (
+            f"<Objekt> UserScreenNameAtTime mit Name: {self.twitter_user_screen_name}"
+        )
+
+
+class TwitterUser(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for twitter user with needed information to analyze with NLP"""
+
+    __tablename__ = "twitterUser"
+    __table_args__ = {"mariadb_charset": "utf8mb4"}
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    twitter_user_id = sqlalchemy.Column(
+        sqlalchemy.BIGINT, nullable=False, unique=True, index=True
+    )
+    comment = sqlalchemy.Column(sqlalchemy.String(500))
+    current_user_name = sqlalchemy.Column(
+        sqlalchemy.String(500), comment="Latest entry of the user name history."
+    )
+    current_user_screen_name = sqlalchemy.Column(
+        sqlalchemy.String(500), comment="Latest entry of the user screen name history."
+    )
+    tweets = relationship("Tweet", backref="twitterUser")
+    user_names = relationship("UserNameAtTime", backref="twitterUser")
+    user_screen_names = relationship("UserScreenNameAtTime", backref="twitterUser")
+
+    def __repr__(self):
+        return f"<Objekt> TwitterUser mit User-ID {self.twitter_user_id}"
+
+
+class Tweet(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for tweet with needed information to analyze with NLP"""
+
+    __tablename__ = "tweets"
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_tweets_user_id_tweet_create_date", "user_id", "tweet_create_date", "id"
+        ),
+        {
+            "comment": "Table of all recorded tweets to analyze.",
+            "mariadb_charset": "utf8mb4",
+        },
+    )
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    user_id = sqlalchemy.Column(
+        sqlalchemy.Integer, sqlalchemy.ForeignKey("twitterUser.id")
+    )
+    tweet_id = sqlalchemy.Column(
+        sqlalchemy.BIGINT, nullable=False, unique=True, index=True
+    )
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False),
+        nullable=False,
+        default=datetime.utcnow,
+        index=True,
+    )
+    tweet_url = sqlalchemy.Column(sqlalchemy.String(100), nullable=False)
+    tweet_text = sqlalchemy.Column(sqlalchemy.String(281), nullable=False)
+    tweet_create_date = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False),
+        nullable=False,
+        default=datetime.utcnow,
+        index=True,
+        comment="UTC time when this Tweet was created.",
+    )
+    comments = relationship(
+        "Comment", secondary=tweets_link_comments, back_populates="tweets"
+    )
+    tags = relationship("Tag", secondary=tweets_link_tags, back_populates="tweets")
+
+    def __repr__(self):
+        return f"<Tweet-ID {self.tweet_id}"
+
+
+class DeletedTweet(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for tweets which were deleted before recording"""
+
+    __tablename__ = "deleted_tweets"
+    __table_args__ = {
+        "comment": "Table of all tweets which were deleted before recording.",
+        "mariadb_charset": "utf8mb4",
+    }
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    tweet_id = sqlalchemy.Column(
+        sqlalchemy.BIGINT, nullable=False, unique=True, index=True
+    )
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, default=datetime.utcnow
+    )
+    tweet_url = sqlalchemy.Column(sqlalchemy.String(100), nullable=False)
+    twitter_user_screen_name = sqlalchemy.Column(sqlalchemy.String(500), index=True)
+    comment = sqlalchemy.Column(sqlalchemy.String(500))
+
+
+class RejectedMessage(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for direct messages whose content could not be recorded"""
+
+    __tablename__ = "rejected_messages"
+    __table_args__ = {
+        "comment": "Table of all direct messages which were deleted without a recorded tweet "
+        "or user.",
+        "mariadb_charset": "utf8mb4",
+    }
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    message_id = sqlalchemy.Column(
+        sqlalchemy.BIGINT, nullable=False, unique=True, index=True
+    )
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, default=datetime.utcnow
+    )
+    command = sqlalchemy.Column(sqlalchemy.String(100), nullable=False)
+    url = sqlalchemy.Column(sqlalchemy.String(500))
+    comment = sqlalchemy.Column(sqlalchemy.String(500))
+    reason = sqlalchemy.Column(
+        sqlalchemy.String(100), nullable=False, comment="Why the content was not recorded."
+    )
+
+    def __repr__(self):
+        return f"<Objekt> RejectedMessage {self.message_id} wegen {self.reason}"
+
+
+class Comment(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for comments of tweets"""
+
+    __tablename__ = "comments"
+    __table_args__ = {"mariadb_charset": "utf8mb4"}
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, default=datetime.utcnow
+    )
+    comment = sqlalchemy.Column(sqlalchemy.String(500), unique=True, index=True)
+    tweets = relationship(
+        "Tweet", secondary=tweets_link_comments, back_populates="comments"
+    )
+
+    def __repr__(self):
+        return f"<Comment-ID {self.id}"
+
+
+class Tag(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for the single words of the comments, e.g. hetze or bodyshaming"""
+
+    __tablename__ = "tags"
+    __table_args__ = {"mariadb_charset": "utf8mb4"}
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    tag = sqlalchemy.Column(sqlalchemy.String(100), nullable=False, unique=True, index=True)
+    tweets = relationship("Tweet", secondary=tweets_link_tags, back_populates="tags")
+
+    def __repr__(self):
+        return f"<Objekt> Tag {self.tag}"
+
+
+class HandlerCheckpoint(Base):  # pylint: disable=too-few-public-methods
+    """
+    Table structure for the last processed position of a regular job. The message handler
+    stores the last direct message in last_message_id and last_message_timestamp, jobs over the
+    tables of the archive store their position in watermark and watermark_timestamp.
+    """
+
+    __tablename__ = "handlerCheckpoint"
+    __table_args__ = {"mariadb_charset": "utf8mb4"}
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    name = sqlalchemy.Column(
+        sqlalchemy.String(100), nullable=False, unique=True, index=True
+    )
+    last_message_id = sqlalchemy.Column(sqlalchemy.BIGINT)
+    last_message_timestamp = sqlalchemy.Column(sqlalchemy.DateTime(timezone=False))
+    watermark = sqlalchemy.Column(
+        sqlalchemy.BIGINT,
+        comment="Primary key of the last processed row of a job, e.g. of a tweet or term.",
+    )
+    watermark_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False),
+        comment="Timestamp of the last processed row of a job or of its last run.",
+    )
+    update_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False),
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    def __repr__(self):
+        return f"<Objekt> HandlerCheckpoint {self.name} bei {self.last_message_id}"
+
+
+class Term(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for problematic terms which were marked as ?WORT? in comments"""
+
+    __tablename__ = "terms"
+    __table_args__ = {"mariadb_charset": "utf8mb4"}
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    term = sqlalchemy.Column(sqlalchemy.String(100), nullable=False, unique=True, index=True)
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, default=datetime.utcnow
+    )
+
+    def __repr__(self):
+        return f"<Objekt> Term {self.term}"
+
+
+class TweetTermMatch(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for known terms which occur in the text of a tweet"""
+
+    __tablename__ = "tweetTermMatch"
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_tweetTermMatch_tweet_id_term_id", "tweet_id", "term_id", unique=True
+        ),
+        {"mariadb_charset": "utf8mb4"},
+    )
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    tweet_id = sqlalchemy.Column(
+        sqlalchemy.Integer, sqlalchemy.ForeignKey("tweets.id"), nullable=False, index=True
+    )
+    term_id = sqlalchemy.Column(
+        sqlalchemy.Integer, sqlalchemy.ForeignKey("terms.id"), nullable=False, index=True
+    )
+    match_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<Objekt> TweetTermMatch Tweet {self.tweet_id} mit Term {self.term_id}"
+
+
+class AnalysisResult(Base):  # pylint: disable=too-few-public-methods
+    """Table structure for the analysis results of a tweet"""
+
+    __tablename__ = "analysisResult"
+    __table_args__ = {
+        "comment": "Table of the per tweet results of the batch analysis.",
+        "mariadb_charset": "utf8mb4",
+    }
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    tweet_id = sqlalchemy.Column(
+        sqlalchemy.Integer,
+        sqlalchemy.ForeignKey("tweets.id"),
+        nullable=False,
+        unique=True,
+        index=True,
+    )
+    analysis_version = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    input_timestamp = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=False), nullable=False, default=datetime.utcnow
+    )
+    word_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    hashtag_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    mention_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    url_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    keywords = sqlalchemy.Column(sqlalchemy.String(500))
+
+    def __repr__(self):
+        return f"<Objekt> AnalysisResult für Tweet {self.tweet_id}"
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keyset paginated reads, full-text search and the export stream of the stored tweets.
+"""
+# imported back by the db package, which re-exports its functions
+# pylint: disable=cyclic-import
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from itertools import groupby
+import sqlalchemy
+from source import resilience
+from source.db import (
+    DB_BREAKER,
+    EXPORT_CHUNK_SIZE,
+    IN_CLAUSE_CHUNK_SIZE,
+    SQLAlchemyConnectionManager,
+    TRANSIENT_ERRORS,
+    get_checkpoint,
+    get_engine,
+    _write_checkpoint,
+)
+from source.db.models import (
+    Comment,
+    DeletedTweet,
+    Tag,
+    Tweet,
+    TwitterUser,
+    UserNameAtTime,
+    UserScreenNameAtTime,
+    tweets_link_comments,
+    tweets_link_tags,
+)
+from source.terms import parse_search_query
+
+DEFAULT_PAGE_SIZE = 100
+# Incremental jobs leave the tweets of the last seconds for their next run. A transaction which
+# commits late can hold tweets with an older input_timestamp than the newest visible ones, the
+# watermark would otherwise move past them and skip them for good.
+SETTLE_SECONDS = 60
+
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    """
+    One page of a keyset paginated read. The rows are plain row tuples, next_key is passed as
+    after to read the next page and is None on the last page.
+    """
+
+    rows: list
+    next_key: tuple | None
+    comments: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
+class Watermark:
+    """
+    Position of an incremental job over the tweets in the order input_timestamp, id. It is
+    stored in the watermark columns of the HandlerCheckpoint row of the job, watermark_timestamp
+    holds the input_timestamp and watermark the primary key of the last processed tweet.
+    """
+
+    input_timestamp: datetime | None = None
+    tweet_key: int | None = None
+
+
+def settled_until() -> datetime:
+    """
+    Newest input_timestamp an incremental job may process in its current run.
+    :return: Current time minus SETTLE_SECONDS
+    """
+    return datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+
+
+def get_watermark(name: str) -> Watermark:
+    """
+    Read the position of an incremental job over the tweets.
+    :param name: Name of the job
+    :return: Watermark, empty if the job never finished a batch
+    """
+    checkpoint = get_checkpoint(name)
+    return Watermark(checkpoint["watermark_timestamp"], checkpoint["watermark"])
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def set_watermark(name: str, watermark: Watermark) -> None:
+    """
+    Persist the position of an incremental job over the tweets.
+    :param name: Name of the job
+    :param watermark: Position after the last processed tweet
+    :return: None
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        _write_checkpoint(
+            conn.session,
+            name,
+            watermark=watermark.tweet_key,
+            watermark_timestamp=watermark.input_timestamp,
+        )
+        conn.session.commit()
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_tweets_after(
+    after_id: int | None, until_timestamp: datetime, limit: int
+) -> list:
+    """
+    Read the next tweets after a primary key watermark with keyset pagination.
+    :param after_id: Primary key of the last processed tweet, None for all tweets
+    :param until_timestamp: Only tweets stored up to this time are read
+    :param limit: Maximum number of tweets
+    :return: List with rows of primary key and tweet text, ordered by primary key
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        return (
+            conn.session.query(Tweet.id, Tweet.tweet_text)
+            .filter(Tweet.id > (after_id or 0), Tweet.input_timestamp <= until_timestamp)
+            .order_by(Tweet.id)
+            .limit(limit)
+            .all()
+        )
+
+
+def _seek_page(query, order_columns: tuple, after: tuple | None, limit: int) -> tuple:
+    """
+    Read one page with keyset pagination: the page starts after the key of the last row of the
+    previous page instead of skipping rows with OFFSET, so every page is an index range scan.
+    :param query: Query with all filters, the order columns must be selected under their names
+    :param order_columns: Columns of the unique sort key, the last one is a primary key
+    :param after: Key of the last row of the previous page, None for the first page
+    :param limit: Maximum number of rows
+    :return: Tuple of rows and key for the next page
+    """
+    if after is not None:
+        query = query.filter(
+            sqlalchemy.or_(
+                *(
+                    sqlalchemy.and_(
+                        *(
+                            column == value
+                            for column, value in zip(order_columns[:index], after[:index])
+                        ),
+                        order_column > after[index],
+                    )
+                    for index, order_column in enumerate(order_columns)
+                )
+            )
+        )
+    rows = query.order_by(*order_columns).limit(limit).all()
+    if len(rows) < limit:
+        return rows, None
+    return rows, tuple(getattr(rows[-1], column.key) for column in order_columns)
+
+
+def _tweet_query(session):
+    """
+    Query of the tweet columns which are returned by the read functions, joined to the author.
+    :param session: Active session
+    :return: Query
+    """
+    return session.query(
+        Tweet.id,
+        Tweet.tweet_id,
+        Tweet.tweet_url,
+        Tweet.tweet_text,
+        Tweet.tweet_create_date,
+        TwitterUser.twitter_user_id,
+        TwitterUser.current_user_screen_name,
+    ).outerjoin(TwitterUser, Tweet.user_id == TwitterUser.id)
+
+
+def _tweet_page(
+    session, query, after: tuple | None, limit: int, with_comments: bool
+) -> Page:
+    """
+    Read one page of tweets ordered by creation date and load the comments of all tweets of
+    the page with one additional query.
+    :param session: Active session
+    :param query: Tweet query with all filters
+    :param after: Key of the last row of the previous page
+    :param limit: Maximum number of tweets
+    :param with_comments: Load the comments of the tweets
+    :return: Page of tweets, comments as dictionary tweet primary key to list of comments
+    """
+    rows, next_key = _seek_page(
+        query, (Tweet.tweet_create_date, Tweet.id), after, limit
+    )
+    comments = {}
+    if not with_comments:
+        return Page(rows, next_key, comments)
+    for start in range(0, len(rows), IN_CLAUSE_CHUNK_SIZE):
+        for tweet_key, comment in (
+            session.query(tweets_link_comments.c.tweet_id, Comment.comment)
+            .join(Comment, tweets_link_comments.c.comment_id == Comment.id)
+            .filter(
+                tweets_link_comments.c.tweet_id.in_(
+                    [row.id for row in rows[start : start + IN_CLAUSE_CHUNK_SIZE]]
+                )
+            )
+        ):
+            comments.setdefault(tweet_key, []).append(comment)
+    return Page(rows, next_key, comments)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_tweets_by_user(
+    twitter_user_id: int,
+    after: tuple | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    with_comments: bool = False,
+) -> Page:
+    """
+    Read the tweets of a twitter user, ordered by creation date.
+    :param twitter_user_id: ID of the user at twitter
+    :param after: next_key of the previous page, None for the first page
+    :param limit: Maximum number of tweets per page
+    :param with_comments: Load the comments of the tweets
+    :return: Page with rows of id, tweet_id, tweet_url, tweet_text, tweet_create_date,
+    twitter_user_id and current_user_screen_name
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        query = _tweet_query(conn.session).filter(
+            TwitterUser.twitter_user_id == int(twitter_user_id)
+        )
+        return _tweet_page(conn.session, query, after, limit, with_comments)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_tweets_by_tag(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    tag: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    after: tuple | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    with_comments: bool = False,
+) -> Page:
+    """
+    Read the tweets with a tag, optionally only tweets created in a date range. The query runs
+    as indexed join from the tag over the link table to the tweets.
+    :param tag: Tag, e.g. hetze
+    :param start: Earliest creation date of the tweets
+    :param end: Creation date before which the tweets were created
+    :param after: next_key of the previous page, None for the first page
+    :param limit: Maximum number of tweets per page
+    :param with_comments: Load the comments of the tweets
+    :return: Page with rows like get_tweets_by_user
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        query = (
+            _tweet_query(conn.session)
+            .join(tweets_link_tags, tweets_link_tags.c.tweet_id == Tweet.id)
+            .join(Tag, tweets_link_tags.c.tag_id == Tag.id)
+            .filter(Tag.tag == tag.lower())
+        )
+        if start is not None:
+            query = query.filter(Tweet.tweet_create_date >= start)
+        if end is not None:
+            query = query.filter(Tweet.tweet_create_date < end)
+        return _tweet_page(conn.session, query, after, limit, with_comments)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_tweets_by_comment(
+    comment: str,
+    after: tuple | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    with_comments: bool = False,
+) -> Page:
+    """
+    Read the tweets which were captured with exactly this comment.
+    :param comment: Complete comment
+    :param after: next_key of the previous page, None for the first page
+    :param limit: Maximum number of tweets per page
+    :param with_comments: Load all comments of the tweets
+    :return: Page with rows like get_tweets_by_user
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        query = (
+            _tweet_query(conn.session)
+            .join(tweets_link_comments, tweets_link_comments.c.tweet_id == Tweet.id)
+            .join(Comment, tweets_link_comments.c.comment_id == Comment.id)
+            .filter(Comment.comment == comment.lower()[:500])
+        )
+        return _tweet_page(conn.session, query, after, limit, with_comments)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_tweets_by_create_date(
+    start: datetime,
+    end: datetime,
+    after: tuple | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    with_comments: bool = False,
+) -> Page:
+    """
+    Read the tweets created in a date range.
+    :param start: Earliest creation date of the tweets
+    :param end: Creation date before which the tweets were created
+    :param after: next_key of the previous page, None for the first page
+    :param limit: Maximum number of tweets per page
+    :param with_comments: Load the comments of the tweets
+    :return: Page with rows like get_tweets_by_user
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        query = _tweet_query(conn.session).filter(
+            Tweet.tweet_create_date >= start, Tweet.tweet_create_date < end
+        )
+        return _tweet_page(conn.session, query, after, limit, with_comments)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_deleted_tweets_by_screen_name(
+    screen_name: str, after: tuple | None = None, limit: int = DEFAULT_PAGE_SIZE
+) -> Page:
+    """
+    Read the deleted tweets of a user screen name in the order they were recorded.
+    :param screen_name: Screen name of the user from the tweet url
+    :param after: next_key of the previous page, None for the first page
+    :param limit: Maximum number of tweets per page
+    :return: Page with rows of id, tweet_id, tweet_url, input_timestamp and comment
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        query = conn.session.query(
+            DeletedTweet.id,
+            DeletedTweet.tweet_id,
+            DeletedTweet.tweet_url,
+            DeletedTweet.input_timestamp,
+            DeletedTweet.comment,
+        ).filter(DeletedTweet.twitter_user_screen_name == screen_name)
+        return Page(*_seek_page(query, (DeletedTweet.id,), after, limit))
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def get_user_name_history(
+    twitter_user_id: int,
+    screen_names: bool = False,
+    after: tuple | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Page:
+    """
+    Read the name history of a twitter user, oldest entry first.
+    :param twitter_user_id: ID of the user at twitter
+    :param screen_names: Read the screen names instead of the names
+    :param after: next_key of the previous page, None for the first page
+    :param limit: Maximum number of entries per page
+    :return: Page with rows of id, input_timestamp and name
+    """
+    history = UserScreenNameAtTime if screen_names else UserNameAtTime
+    name_column = (
+        UserScreenNameAtTime.twitter_user_screen_name
+        if screen_names
+        else UserNameAtTime.twitter_user_name
+    )
+    with SQLAlchemyConnectionManager() as conn:
+        query = (
+            conn.session.query(history.id, history.input_timestamp, name_column)
+            .join(TwitterUser, history.user_id == TwitterUser.id)
+            .filter(TwitterUser.twitter_user_id == int(twitter_user_id))
+        )
+        return Page(*_seek_page(query, (history.id,), after, limit))
+
+
+def _search_hits(dialect: str, phrases: list):
+    """
+    Subquery of the primary keys and scores of all tweets which contain every phrase. SQLite
+    uses the FTS5 table with bm25, MariaDB/MySQL the FULLTEXT index in boolean mode. The score
+    is ascending, the best match first.
+    :param dialect: Name of the database dialect
+    :param phrases: Phrases of parse_search_query
+    :return: Subquery with the columns tweet_key and score, None for other dialects
+    """
+    if dialect == "sqlite":
+        statement = (
+            "SELECT rowid AS tweet_key, bm25(tweets_fts) AS score FROM tweets_fts "
+            "WHERE tweets_fts MATCH :search_query"
+        )
+        search_query = " ".join(
+            f'"{" ".join(words)}"' + ("*" if prefix else "") for words, prefix in phrases
+        )
+    elif dialect in ("mysql", "mariadb"):
+        match = "MATCH (tweet_text) AGAINST (:search_query IN BOOLEAN MODE)"
+        statement = f"SELECT id AS tweet_key, -({match}) AS score FROM tweets WHERE {match}"
+        search_query = " ".join(
+            f"+{words[0]}*" if prefix and len(words) == 1 else f'+"{" ".join(words)}"'
+            for words, prefix in phrases
+        )
+    else:
+        return None
+    return (
+        sqlalchemy.text(statement)
+        .bindparams(search_query=search_query)
+        .columns(tweet_key=sqlalchemy.Integer, score=sqlalchemy.Float)
+        .subquery("hits")
+    )
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def search_tweets(
+    search_query: str, after: tuple | None = None, limit: int = DEFAULT_PAGE_SIZE
+) -> Page:
+    """
+    Full-text search over the tweet texts, best matches first. Words in double quotes are
+    searched as phrase, a trailing * searches a prefix, all phrases must occur. Databases
+    without full-text index fall back to LIKE without ranking.
+    :param search_query: Search query, e.g. "hetze gegen" idiot*
+    :param after: next_key of the previous page, None for the first page
+    :param limit: Maximum number of tweets per page
+    :return: Page with rows of id, tweet_id, tweet_url, tweet_text, tweet_create_date and score
+    """
+    phrases = parse_search_query(search_query)
+    if not phrases:
+        return Page([], None)
+    with SQLAlchemyConnectionManager() as conn:
+        hits = _search_hits(conn.engine.dialect.name, phrases)
+        columns = (
+            Tweet.id,
+            Tweet.tweet_id,
+            Tweet.tweet_url,
+            Tweet.tweet_text,
+            Tweet.tweet_create_date,
+        )
+        if hits is None:
+            query = conn.session.query(
+                *columns, sqlalchemy.literal(0.0).label("score")
+            ).filter(
+                *(
+                    Tweet.tweet_text.ilike(f"%{' '.join(words)}%")
+                    for words, _ in phrases
+                )
+            )
+            return Page(*_seek_page(query, (Tweet.id,), after, limit))
+        query = conn.session.query(*columns, hits.c.score).join(
+            hits, hits.c.tweet_key == Tweet.id
+        )
+        return Page(*_seek_page(query, (hits.c.score, Tweet.id), after, limit))
+
+
+def iter_tweets_for_export(
+    after: Watermark,
+    until_timestamp: datetime,
+    limit: int,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[dict]:
+    """
+    Stream the next tweets with their comments and the current names of their authors, ordered
+    by input_timestamp and id. The rows are read with a server-side cursor in chunks, so the
+    memory stays bounded for any limit. The stream runs on its own connection which is closed
+    when the limit is reached, so a watermark can be written afterwards even on SQLite.
+    :param after: Watermark of the last exported tweet, empty for all tweets
+    :param until_timestamp: Only tweets stored up to this time are exported
+    :param limit: Maximum number of tweets
+    :param chunk_size: Number of rows fetched from the cursor at once
+    :return: Generator of dictionaries, one per tweet
+    """
+    next_tweets = (
+        sqlalchemy.select(Tweet)
+        .where(Tweet.input_timestamp <= until_timestamp)
+        .order_by(Tweet.input_timestamp, Tweet.id)
+        .limit(limit)
+    )
+    if after.input_timestamp is not None:
+        next_tweets = next_tweets.where(
+            sqlalchemy.or_(
+                Tweet.input_timestamp > after.input_timestamp,
+                sqlalchemy.and_(
+                    Tweet.input_timestamp == after.input_timestamp,
+                    Tweet.id > (after.tweet_key or 0),
+                ),
+            )
+        )
+    next_tweets = next_tweets.subquery()
+    statement = (
+        sqlalchemy.select(
+            next_tweets.c.id,
+            next_tweets.c.tweet_id,
+            next_tweets.c.tweet_url,
+            next_tweets.c.tweet_text,
+            next_tweets.c.tweet_create_date,
+            next_tweets.c.input_timestamp,
+            TwitterUser.twitter_user_id,
+            TwitterUser.current_user_name,
+            TwitterUser.current_user_screen_name,
+            Comment.comment,
+        )
+        .select_from(next_tweets)
+        .outerjoin(TwitterUser, next_tweets.c.user_id == TwitterUser.id)
+        .outerjoin(
+            tweets_link_comments, tweets_link_comments.c.tweet_id == next_tweets.c.id
+        )
+        .outerjoin(Comment, tweets_link_comments.c.comment_id == Comment.id)
+        .order_by(next_tweets.c.input_timestamp, next_tweets.c.id)
+    )
+    with get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(statement)
+        for _, rows in groupby(result.yield_per(chunk_size), key=lambda row: row.id):
+            first_row, *other_rows = rows
+            yield {
+                "id": first_row.id,
+                "tweet_id": first_row.tweet_id,
+                "tweet_url": first_row.tweet_url,
+                "tweet_text": first_row.tweet_text,
+                "tweet_create_date": first_row.tweet_create_date,
+                "input_timestamp": first_row.input_timestamp,
+                "twitter_user_id": first_row.twitter_user_id,
+                "user_name": first_row.current_user_name,
+                "user_screen_name": first_row.current_user_screen_name,
+                "comments": [
+                    row.comment for row in (first_row, *other_rows) if row.comment is not None
+                ],
+            }
@@ -0,0 +1,700 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Functions which write tweets, users, comments, marked terms and analysis results.
+"""
+# imported back by the db package, which re-exports its functions
+# pylint: disable=cyclic-import
+from datetime import datetime
+import sqlalchemy
+from source import resilience
+from source.db import (
+    DB_BREAKER,
+    EXPORT_CHUNK_SIZE,
+    IDENTITY_CACHE,
+    KNOWN_TWEET_IDS,
+    SQLAlchemyConnectionManager,
+    TRANSIENT_ERRORS,
+    _read_checkpoint,
+    get_engine,
+    _write_checkpoint,
+    _cache_after_commit,
+    _insert_ignore,
+    _select_in,
+)
+from source.db.models import (
+    AnalysisResult,
+    Comment,
+    DeletedTweet,
+    RejectedMessage,
+    Tag,
+    Term,
+    Tweet,
+    TweetTermMatch,
+    TwitterUser,
+    UserNameAtTime,
+    UserScreenNameAtTime,
+    tweets_link_comments,
+    tweets_link_tags,
+)
+from source.terms import AhoCorasick, extract_marked_terms, tokenize_comment
+
+TERM_SCAN_CHECKPOINT_NAME = "term_scan"
+TERM_SCAN_BATCH_SIZE = 5000
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def check_and_update_user_names(data: dict) -> None:
+    """
+    Append the name and screen name of the tweet author to the history if they changed.
+    :param data: Tweet information with author_user_id, author_user_name and
+    author_user_screen_name
+    :return: None
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        try:
+            user_keys = _resolve_keys(
+                conn.session,
+                TwitterUser,
+                TwitterUser.twitter_user_id,
+                {int(data["author_user_id"])},
+                lambda value: {"twitter_user_id": value},
+                "users",
+            )
+            _append_name_history(conn.session, [data], user_keys)
+            conn.session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:
+            conn.session.rollback()
+            raise
+
+
+def add_deleted_tweet(data: dict, url: str, comment: str) -> None:
+    """
+    Function to add information of a deleted tweet before recording to database
+    :param comment: Comment or reason why this tweet was tagged
+    :param url: Complete URL of the deleted tweet
+    :param data: Dictionary with information from a tweet-url with user screen name and tweet id
+    :return:
+    """
+    add_tweets_bulk([], [data | {"expand_url": url, "comment": comment}])
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def add_tweet(data: dict) -> None:
+    """
+    Function to add tweet and user data to database.
+    :param data: information as a dictionary, which must be stored in the database.
+    :return: None
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        try:
+            _add_tweet_records(conn.session, [data], with_name_history=False)
+            conn.session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:
+            conn.session.rollback()
+            raise
+    KNOWN_TWEET_IDS.add_many([int(data["tweet_id"])])
+
+
+def _resolve_keys(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    session, table, key_column, values: set, new_rows: callable, cache_namespace: str
+) -> dict:
+    """
+    Upsert all values of a unique lookup column and read back their primary keys. Values which
+    are already in the identity cache are neither inserted nor queried. The keys are read back
+    with a locking read, because the snapshot of the transaction does not contain values which a
+    concurrent writer committed in the meantime. The database compares
+    strings with the collation of the column, e.g. MariaDB ignores case, accents and trailing
+    spaces, so a value can be stored in another form than it is looked up. Such values are
+    queried one by one and are returned under the looked up form.
+    :param session: Active session
+    :param table: Table class, e.g. TwitterUser or Comment
+    :param key_column: Unique lookup column of the table
+    :param values: All values which are needed
+    :param new_rows: Function to build the insert parameters for a missing value
+    :param cache_namespace: Namespace of the identity cache for this lookup
+    :return: Dictionary value to primary key
+    """
+    keys = IDENTITY_CACHE.get_many(cache_namespace, values)
+    missing = [value for value in values if value not in keys]
+    if missing:
+        _insert_ignore(session, table, [new_rows(value) for value in missing], key_column.key)
+        found = dict(
+            _select_in(session, (key_column, table.id), key_column, missing, lock=True)
+        )
+        for value in missing:
+            if value not in found:
+                found[value] = (
+                    session.query(table.id)
+                    .filter(key_column == value)
+                    .limit(1)
+                    .with_for_update(read=True)
+                    .scalar()
+                )
+        _cache_after_commit(session, cache_namespace, found)
+        keys |= found
+    return keys
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def add_tweets_bulk(
+    records: list, deleted_records: list = None, known_records: list = None
+) -> list:
+    """
+    Function to add all tweets of a handler run in one transaction. Existing tweets, users and
+    comments are resolved with one IN query per table, the missing rows are inserted in bulk and
+    new user names are appended to the history. Everything is committed once, then the tweet
+    ids are added to the known tweet ids.
+    :param records: List with tweet information as dictionaries like for add_tweet
+    :param deleted_records: List with dictionaries of deleted tweets with tweet_id,
+    twitter_user_name, expand_url and comment
+    :param known_records: List with dictionaries with tweet_id and comment of tweets which are
+    already stored, only their comments are linked
+    :return: List with the deleted and known records whose comment is not stored, because
+    their tweet is already stored as deleted tweet with another comment
+    """
+    records = records or []
+    deleted_records = deleted_records or []
+    known_records = known_records or []
+    unlinked_records = []
+    if not records and not deleted_records and not known_records:
+        return unlinked_records
+    with SQLAlchemyConnectionManager() as conn:
+        session = conn.session
+        try:
+            if records:
+                _add_tweet_records(session, records)
+            if deleted_records:
+                _add_deleted_tweet_records(session, deleted_records)
+            if known_records:
+                unlinked_records = _link_comments(session, known_records)
+            unlinked_records = _unstored_comments(session, deleted_records + unlinked_records)
+            session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:
+            session.rollback()
+            raise
+    KNOWN_TWEET_IDS.add_many(
+        int(record["tweet_id"]) for record in records + deleted_records
+    )
+    return unlinked_records
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def add_users_bulk(records: list) -> None:
+    """
+    Function to add twitter users which are captured directly, with their comment and name
+    history, in one transaction.
+    :param records: List with dictionaries with author_user_id, author_user_name,
+    author_user_screen_name and comment
+    :return: None
+    """
+    if not records:
+        return
+    with SQLAlchemyConnectionManager() as conn:
+        session = conn.session
+        try:
+            user_keys = _resolve_keys(
+                session,
+                TwitterUser,
+                TwitterUser.twitter_user_id,
+                {int(record["author_user_id"]) for record in records},
+                lambda value: {"twitter_user_id": value},
+                "users",
+            )
+            user_table = TwitterUser.__table__
+            session.execute(
+                sqlalchemy.update(user_table)
+                .where(user_table.c.id == sqlalchemy.bindparam("user_key"))
+                .values(comment=sqlalchemy.bindparam("new_comment")),
+                [
+                    {
+                        "user_key": user_keys[int(record["author_user_id"])],
+                        "new_comment": record["comment"].lower()[:500],
+                    }
+                    for record in records
+                ],
+            )
+            _append_name_history(session, records, user_keys)
+            session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:
+            session.rollback()
+            raise
+
+
+def _add_tweet_records(session, records: list, with_name_history: bool = True) -> None:
+    """
+    Write existing tweets with user, comment and name history without commit. Stored tweets are
+    looked up with a locking read, so a tweet which a concurrent writer committed counts as
+    stored and only the comment is linked.
+    :param session: Active session
+    :param records: List with tweet information as dictionaries like for add_tweet
+    :param with_name_history: Append changed user names to the history
+    :return: None
+    """
+    user_keys = _resolve_keys(
+        session,
+        TwitterUser,
+        TwitterUser.twitter_user_id,
+        {int(record["author_user_id"]) for record in records},
+        lambda value: {"twitter_user_id": value},
+        "users",
+    )
+    comment_keys, tag_keys, marked_terms = _resolve_comment_keys(session, records)
+
+    new_tweets = {}
+    existing_tweets = dict(
+        _select_in(
+            session,
+            (Tweet.tweet_id, Tweet.id),
+            Tweet.tweet_id,
+            {int(record["tweet_id"]) for record in records},
+            lock=True,
+        )
+    )
+    for record in records:
+        tweet_id = int(record["tweet_id"])
+        if tweet_id not in existing_tweets and tweet_id not in new_tweets:
+            new_tweets[tweet_id] = record
+    if new_tweets:
+        _insert_ignore(
+            session,
+            Tweet,
+            [
+                {
+                    "user_id": user_keys[int(record["author_user_id"])],
+                    "tweet_id": tweet_id,
+                    "tweet_url": record["expand_url"],
+                    "tweet_text": record["text"],
+                    "tweet_create_date": record["created_at"],
+                }
+                for tweet_id, record in new_tweets.items()
+            ],
+            "tweet_id",
+        )
+        tweet_keys = dict(
+            _select_in(
+                session, (Tweet.tweet_id, Tweet.id), Tweet.tweet_id, new_tweets, lock=True
+            )
+        )
+        session.execute(
+            tweets_link_comments.insert(),
+            [
+                {
+                    "tweet_id": tweet_keys[tweet_id],
+                    "comment_id": comment_keys[record["comment"].lower()[:500]],
+                }
+                for tweet_id, record in new_tweets.items()
+            ],
+        )
+        tag_links = [
+            {"tweet_id": tweet_keys[tweet_id], "tag_id": tag_keys[tag]}
+            for tweet_id, record in new_tweets.items()
+            for tag in tokenize_comment(record["comment"])
+        ]
+        if tag_links:
+            session.execute(tweets_link_tags.insert(), tag_links)
+        _add_term_matches(
+            session,
+            {tweet_keys[tweet_id]: record["text"] for tweet_id, record in new_tweets.items()},
+            _term_matcher(session, marked_terms),
+        )
+    _link_comments(
+        session,
+        [
+            record
+            for record in records
+            if new_tweets.get(int(record["tweet_id"])) is not record
+        ],
+    )
+    if with_name_history:
+        _append_name_history(session, records, user_keys)
+
+
+def _resolve_comment_keys(session, records: list) -> tuple:
+    """
+    Upsert the comments of the records with their tags and marked terms.
+    :param session: Active session
+    :param records: List with dictionaries with comment
+    :return: Tuple of the dictionaries comment to primary key and tag to primary key and the
+    set of the marked terms
+    """
+    comment_keys = _resolve_keys(
+        session,
+        Comment,
+        Comment.comment,
+        {record["comment"].lower()[:500] for record in records},
+        lambda value: {"comment": value},
+        "comments",
+    )
+    tag_keys = _resolve_keys(
+        session,
+        Tag,
+        Tag.tag,
+        {tag for record in records for tag in tokenize_comment(record["comment"])},
+        lambda value: {"tag": value},
+        "tags",
+    )
+    marked_terms = {
+        term for record in records for term in extract_marked_terms(record["comment"])
+    }
+    if marked_terms:
+        _resolve_keys(
+            session,
+            Term,
+            Term.term,
+            marked_terms,
+            lambda value: {"term": value},
+            "terms",
+        )
+    return comment_keys, tag_keys, marked_terms
+
+
+def _link_comments(session, records: list) -> list:
+    """
+    Link the comments and tags of records to tweets which are already stored, e.g. when the
+    same tweet is captured again by another reporter. Existing links are not duplicated and
+    records of tweets which are not stored, e.g. deleted tweets, are skipped.
+    :param session: Active session
+    :param records: List with dictionaries with tweet_id and comment
+    :return: List with the skipped records
+    """
+    tweet_keys = dict(
+        _select_in(
+            session,
+            (Tweet.tweet_id, Tweet.id),
+            Tweet.tweet_id,
+            {int(record["tweet_id"]) for record in records},
+            lock=True,
+        )
+    )
+    skipped_records = [record for record in records if int(record["tweet_id"]) not in tweet_keys]
+    records = [record for record in records if int(record["tweet_id"]) in tweet_keys]
+    if not records:
+        return skipped_records
+    comment_keys, tag_keys, _ = _resolve_comment_keys(session, records)
+    for link_table, key_column, record_keys in (
+        (
+            tweets_link_comments,
+            "comment_id",
+            lambda record: [comment_keys[record["comment"].lower()[:500]]],
+        ),
+        (
+            tweets_link_tags,
+            "tag_id",
+            lambda record: [tag_keys[tag] for tag in tokenize_comment(record["comment"])],
+        ),
+    ):
+        links = {
+            (tweet_keys[int(record["tweet_id"])], key)
+            for record in records
+            for key in record_keys(record)
+        }
+        links -= set(
+            _select_in(
+                session,
+                (link_table.c.tweet_id, link_table.c[key_column]),
+                link_table.c.tweet_id,
+                {tweet_key for tweet_key, _ in links},
+                lock=True,
+            )
+        )
+        if links:
+            session.execute(
+                link_table.insert(),
+                [{"tweet_id": tweet_key, key_column: key} for tweet_key, key in links],
+            )
+    return skipped_records
+
+
+def _term_matcher(session, required_terms: set) -> tuple:
+    """
+    Automaton of all known terms with their primary keys. It is kept in the identity cache after
+    the commit and is only rebuilt if a required term is missing.
+    :param session: Active session
+    :param required_terms: Terms which must be part of the automaton
+    :return: Tuple of automaton and dictionary term to primary key
+    """
+    cached = IDENTITY_CACHE.get_many("term_matcher", [None]).get(None)
+    if cached is not None and required_terms <= cached[1].keys():
+        return cached
+    term_keys = dict(session.query(Term.term, Term.id).all())
+    matcher = (AhoCorasick(term_keys), term_keys)
+    _cache_after_commit(session, "term_matcher", {None: matcher})
+    return matcher
+
+
+def _add_term_matches(session, tweet_texts: dict, matcher: tuple) -> None:
+    """
+    Scan tweet texts with the automaton and insert a match row per tweet and found term.
+    Matches which are already stored are skipped.
+    :param session: Active session
+    :param tweet_texts: Dictionary tweet primary key to tweet text
+    :param matcher: Tuple of automaton and dictionary term to primary key
+    :return: None
+    """
+    automaton, term_keys = matcher
+    if len(automaton) == 0:
+        return
+    _insert_ignore(
+        session,
+        TweetTermMatch,
+        [
+            {"tweet_id": tweet_key, "term_id": term_keys[term], "match_count": count}
+            for tweet_key, text in tweet_texts.items()
+            for term, count in automaton.count_terms(text).items()
+        ],
+        ("tweet_id", "term_id"),
+    )
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def scan_archive_for_new_terms(batch_size: int = TERM_SCAN_BATCH_SIZE) -> int:
+    """
+    Scan all stored tweets for the terms which were added since the last archive scan. The
+    automaton of the new terms is applied in one pass over the archive, batch by batch with
+    keyset pagination. Matches which were already found at ingest are replaced, so the scan
+    can be repeated after an abort. The watermark of the scan is the primary key of the last
+    scanned term.
+    :param batch_size: Number of tweets per transaction
+    :return: Number of new terms
+    """
+    with SQLAlchemyConnectionManager() as conn:
+        session = conn.session
+        scanned_term_id = _read_checkpoint(session, TERM_SCAN_CHECKPOINT_NAME)["watermark"] or 0
+        term_keys = dict(
+            session.query(Term.term, Term.id).filter(Term.id > scanned_term_id).all()
+        )
+        if not term_keys:
+            return 0
+        automaton = AhoCorasick(term_keys)
+        after_id = 0
+        while True:
+            tweets = (
+                session.query(Tweet.id, Tweet.tweet_text)
+                .filter(Tweet.id > after_id)
+                .order_by(Tweet.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not tweets:
+                break
+            try:
+                session.execute(
+                    sqlalchemy.delete(TweetTermMatch)
+                    .where(
+                        TweetTermMatch.tweet_id.between(tweets[0].id, tweets[-1].id),
+                        TweetTermMatch.term_id.in_(term_keys.values()),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                _add_term_matches(session, dict(tweets), (automaton, term_keys))
+                session.commit()
+            except sqlalchemy.exc.SQLAlchemyError:
+                session.rollback()
+                raise
+            after_id = tweets[-1].id
+        _write_checkpoint(
+            session,
+            TERM_SCAN_CHECKPOINT_NAME,
+            watermark=max(term_keys.values()),
+            watermark_timestamp=datetime.utcnow(),
+        )
+        session.commit()
+    print(f"Archiv nach {len(term_keys)} neuen Begriffen durchsucht.")
+    return len(term_keys)
+
+
+def _append_name_history(session, records: list, user_keys: dict) -> None:
+    """
+    Append name and screen name rows for all users whose names changed and update the current
+    names of the users. The current names are taken from the identity cache, only unknown users
+    are read with one primary key lookup.
+    :param session: Active session
+    :param records: List with tweet information as dictionaries like for add_tweet
+    :param user_keys: Dictionary twitter user id to user primary key
+    :return: None
+    """
+    current_names = {}
+    for record in records:
+        current_names[user_keys[int(record["author_user_id"])]] = (
+            record["author_user_name"],
+            record["author_user_screen_name"],
+        )
+    stored_names = IDENTITY_CACHE.get_many("user_names", current_names)
+    unknown_users = {key for key in current_names if key not in stored_names}
+    if unknown_users:
+        for user_key, name, screen_name in _select_in(
+            session,
+            (
+                TwitterUser.id,
+                TwitterUser.current_user_name,
+                TwitterUser.current_user_screen_name,
+            ),
+            TwitterUser.id,
+            unknown_users,
+        ):
+            stored_names[user_key] = (name, screen_name)
+    changed_users = [
+        {
+            "user_key": user_key,
+            "new_user_name": name,
+            "new_user_screen_name": screen_name,
+        }
+        for user_key, (name, screen_name) in current_names.items()
+        if stored_names.get(user_key) != (name, screen_name)
+    ]
+    _cache_after_commit(session, "user_names", current_names)
+    if not changed_users:
+        return
+    new_names = [
+        {"user_id": user_key, "twitter_user_name": name}
+        for user_key, (name, _) in current_names.items()
+        if stored_names.get(user_key, (None, None))[0] != name
+    ]
+    new_screen_names = [
+        {"user_id": user_key, "twitter_user_screen_name": screen_name}
+        for user_key, (_, screen_name) in current_names.items()
+        if stored_names.get(user_key, (None, None))[1] != screen_name
+    ]
+    if new_names:
+        session.execute(sqlalchemy.insert(UserNameAtTime), new_names)
+    if new_screen_names:
+        session.execute(sqlalchemy.insert(UserScreenNameAtTime), new_screen_names)
+    user_table = TwitterUser.__table__
+    session.execute(
+        sqlalchemy.update(user_table)
+        .where(user_table.c.id == sqlalchemy.bindparam("user_key"))
+        .values(
+            current_user_name=sqlalchemy.bindparam("new_user_name"),
+            current_user_screen_name=sqlalchemy.bindparam("new_user_screen_name"),
+        ),
+        changed_users,
+    )
+
+
+def _add_deleted_tweet_records(session, deleted_records: list) -> None:
+    """
+    Write deleted tweets which are not yet stored without commit.
+    :param session: Active session
+    :param deleted_records: List with dictionaries of deleted tweets
+    :return: None
+    """
+    _insert_ignore(
+        session,
+        DeletedTweet,
+        [
+            {
+                "tweet_id": int(record["tweet_id"]),
+                "tweet_url": record["expand_url"],
+                "twitter_user_screen_name": record["twitter_user_name"],
+                "comment": record["comment"],
+            }
+            for record in deleted_records
+        ],
+        "tweet_id",
+    )
+
+
+def _unstored_comments(session, records: list) -> list:
+    """
+    Find the records of deleted tweets whose comment is not the one stored with the deleted
+    tweet, e.g. of a later message about the same tweet. A replayed record has the stored
+    comment and is not returned.
+    :param session: Active session
+    :param records: List with dictionaries of deleted tweets with tweet_id and comment
+    :return: List with the records whose comment is not stored
+    """
+    if not records:
+        return []
+    stored_comments = dict(
+        _select_in(
+            session,
+            (DeletedTweet.tweet_id, DeletedTweet.comment),
+            DeletedTweet.tweet_id,
+            {int(record["tweet_id"]) for record in records},
+            lock=True,
+        )
+    )
+    return [
+        record
+        for record in records
+        if stored_comments.get(int(record["tweet_id"])) != record["comment"]
+    ]
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def add_rejected_messages_bulk(records: list) -> None:
+    """
+    Function to add direct messages whose tweet or user can not be recorded, so their content
+    is kept after the message is deleted. Messages which are already stored are skipped, so a
+    replayed batch does not fail.
+    :param records: List with dictionaries with message_id, command, expand_url, comment and
+    reason
+    :return: None
+    """
+    if not records:
+        return
+    with SQLAlchemyConnectionManager() as conn:
+        session = conn.session
+        try:
+            _insert_ignore(
+                session,
+                RejectedMessage,
+                [
+                    {
+                        "message_id": int(record["message_id"]),
+                        "command": record["command"],
+                        "url": record["expand_url"][:500],
+                        "comment": record["comment"][:500],
+                        "reason": record["reason"],
+                    }
+                    for record in records
+                ],
+                "message_id",
+            )
+            session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:
+            session.rollback()
+            raise
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def load_known_tweet_ids() -> int:
+    """
+    Load the ids of all stored tweets and deleted tweets into KNOWN_TWEET_IDS. The ids are
+    streamed in chunks and sorted chunk by chunk, so apart from one chunk only int64 arrays are
+    held in memory.
+    :return: Number of loaded ids
+    """
+
+    def stored_ids():
+        with get_engine().connect() as connection:
+            for column in (Tweet.tweet_id, DeletedTweet.tweet_id):
+                result = connection.execution_options(stream_results=True).execute(
+                    sqlalchemy.select(column)
+                )
+                for partition in result.scalars().partitions(EXPORT_CHUNK_SIZE):
+                    yield from partition
+
+    KNOWN_TWEET_IDS.load(stored_ids())
+    return len(KNOWN_TWEET_IDS)
+
+
+@resilience.retry(TRANSIENT_ERRORS, breaker=DB_BREAKER)
+def add_analysis_results_bulk(results: list) -> None:
+    """
+    Function to add the analysis results of many tweets in one transaction. Results of tweets
+    which are already analyzed are skipped, so a repeated batch does not fail.
+    :param results: List with dictionaries with the columns of AnalysisResult
+    :return: None
+    """
+    if not results:
+        return
+    with SQLAlchemyConnectionManager() as conn:
+        session = conn.session
+        try:
+            _insert_ignore(session, AnalysisResult, results, "tweet_id")
+            session.commit()
+        except sqlalchemy.exc.SQLAlchemyError:
+            session.rollback()
+            raise
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental export of the stored tweets with their comments and authors for the NLP analysis.
+Every run continues after the input_timestamp watermark of the last run and writes compressed
+JSONL files or, if pyarrow is installed, Parquet files with a bounded number of rows each.
+"""
+import gzip
+import json
+import os
+from collections.abc import Iterator
+from datetime import datetime
+from source import db
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_CHECKPOINT_NAME = "export_tweets"
+EXPORT_DIR = os.getenv("export_dir", "exports")
+EXPORT_FORMAT = os.getenv("export_format", "jsonl")
+EXPORT_ROWS_PER_FILE = 100000
+EXPORT_ROW_GROUP_SIZE = 10000
+
+
+class JsonlWriter:
+    """Write tweets as gzip compressed JSON lines"""
+
+    suffix = ".jsonl.gz"
+
+    def __init__(self, path: str):
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+
+    def write(self, tweet: dict) -> None:
+        """
+        Write one tweet as line.
+        :param tweet: Dictionary of the tweet
+        :return: None
+        """
+        self.file.write(json.dumps(tweet, default=datetime.isoformat, ensure_ascii=False))
+        self.file.write("\n")
+
+    def close(self) -> None:
+        """
+        Flush and close the file.
+        :return: None
+        """
+        self.file.close()
+
+
+class ParquetWriter:
+    """Write tweets as Parquet file, the rows are buffered and written as row groups"""
+
+    suffix = ".parquet"
+
+    def __init__(self, path: str):
+        self.schema = pyarrow.schema(
+            [
+                ("id", pyarrow.int64()),
+                ("tweet_id", pyarrow.int64()),
+                ("tweet_url", pyarrow.string()),
+                ("tweet_text", pyarrow.string()),
+                ("tweet_create_date", pyarrow.timestamp("us")),
+                ("input_timestamp", pyarrow.timestamp("us")),
+                ("twitter_user_id", pyarrow.int64()),
+                ("user_name", pyarrow.string()),
+                ("user_screen_name", pyarrow.string()),
+                ("comments", pyarrow.list_(pyarrow.string())),
+            ]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        self.rows = []
+
+    def _flush(self) -> None:
+        if self.rows:
+            self.writer.write_table(pyarrow.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def write(self, tweet: dict) -> None:
+        """
+        Buffer one tweet and write a row group if the buffer is full.
+        :param tweet: Dictionary of the tweet
+        :return: None
+        """
+        self.rows.append(tweet)
+        if len(self.rows) >= EXPORT_ROW_GROUP_SIZE:
+            self._flush()
+
+    def close(self) -> None:
+        """
+        Write the remaining rows and close the file.
+        :return: None
+        """
+        self._flush()
+        self.writer.close()
+
+
+def _writer_class(export_format: str) -> type:
+    """
+    Select the writer of the export format.
+    :param export_format: "jsonl" or "parquet"
+    :return: Writer class
+    """
+    if export_format == "parquet":
+        if pyarrow is None:
+            raise ValueError("Für den Export als Parquet muss pyarrow installiert sein.")
+        return ParquetWriter
+    if export_format == "jsonl":
+        return JsonlWriter
+    raise ValueError(f"Unbekanntes Exportformat >{export_format}<, erlaubt: jsonl, parquet.")
+
+
+def export_tweets(
+    export_dir: str = EXPORT_DIR,
+    export_format: str = EXPORT_FORMAT,
+    rows_per_file: int = EXPORT_ROWS_PER_FILE,
+) -> list:
+    """
+    Export all tweets stored since the last export. Every file is streamed with its own query,
+    written under a temporary name and renamed when it is complete, then the watermark moves to
+    its last tweet. An aborted export therefore continues after the last complete file. Tweets
+    of the last db.SETTLE_SECONDS are left for the next run.
+    :param export_dir: Directory of the export files
+    :param export_format: "jsonl" or "parquet"
+    :param rows_per_file: Maximum number of tweets per file
+    :return: List with the paths of the written files
+    """
+    writer_class = _writer_class(export_format)
+    os.makedirs(export_dir, exist_ok=True)
+    watermark = db.get_watermark(EXPORT_CHECKPOINT_NAME)
+    until_timestamp = db.settled_until()
+    run_name = f"tweets_{datetime.utcnow():%Y%m%d_%H%M%S}"
+    written_files = []
+    while True:
+        path = os.path.join(
+            export_dir, f"{run_name}_{len(written_files):04d}{writer_class.suffix}"
+        )
+        writer, rows, last_tweet = None, 0, None
+        for tweet in db.iter_tweets_for_export(watermark, until_timestamp, rows_per_file):
+            if writer is None:
+                writer = writer_class(path + ".tmp")
+            writer.write(tweet)
+            rows += 1
+            last_tweet = tweet
+        if writer is None:
+            break
+        writer.close()
+        os.replace(path + ".tmp", path)
+        written_files.append(path)
+        watermark = db.Watermark(last_tweet["input_timestamp"], last_tweet["id"])
+        db.set_watermark(EXPORT_CHECKPOINT_NAME, watermark)
+        if rows < rows_per_file:
+            break
+    print(f"Export: {len(written_files)} Dateien nach {export_dir} geschrieben.")
+    return written_files
+
+
+def read_exported_tweets(export_dir: str = EXPORT_DIR) -> Iterator[dict]:
+    """
+    Read all exported tweets file by file in the order of the export. Only one row group or
+    line is held in memory at a time.
+    :param export_dir: Directory of the export files
+    :return: Generator of dictionaries, one per tweet
+    """
+    for file_name in sorted(os.listdir(export_dir)):
+        path = os.path.join(export_dir, file_name)
+        if file_name.endswith(JsonlWriter.suffix):
+            with gzip.open(path, "rt", encoding="utf-8") as export_file:
+                for line in export_file:
+                    yield json.loads(line)
+        elif file_name.endswith(ParquetWriter.suffix) and pyarrow is not None:
+            for batch in pyarrow.parquet.ParquetFile(path).iter_batches():
+                yield from batch.to_pylist()
+
+
+def main() -> None:
+    """
+    Run one export with the settings of the env variables export_dir and export_format.
+    :return: None
+    """
+    db.init()
+    if db.DB_CONNECTION_VALID is True:
+        export_tweets()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,139 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Collection of functions for analyzing tweets with NLP
+Collection of functions for analyzing tweets with NLP. Every run analyzes only the tweets which
+were stored since the watermark of the last run. The tweets are split into chunks and analyzed
+in a process pool, the results are written back in bulk.
 """
+import os
+import re
+import time
+import functools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from source import db
+from source.scheduler import AdaptiveScheduler, read_positive_number
 
+ANALYSIS_CHECKPOINT_NAME = "analysis"
+ANALYSIS_VERSION = 1
+ANALYSIS_BATCH_SIZE = 5000
+ANALYSIS_CHUNK_SIZE = 500
+KEYWORD_COUNT = 5
+KEYWORD_MIN_LENGTH = 4
+TOKEN_PATTERN = re.compile(r"https?://\S+|[#@]?\w+")
 
-def main() -> None:
+
+def analyze_tweet(tweet_key: int, tweet_text: str) -> dict:
+    """
+    Analyze the text of one tweet.
+    :param tweet_key: Primary key of the tweet
+    :param tweet_text: Text of the tweet
+    :return: Dictionary with the columns of the analysis result
+    """
+    tokens = TOKEN_PATTERN.findall(tweet_text)
+    words = [
+        token.lower()
+        for token in tokens
+        if token[0] not in "#@" and not token.startswith("http")
+    ]
+    keywords = Counter(word for word in words if len(word) >= KEYWORD_MIN_LENGTH)
+    return {
+        "tweet_id": tweet_key,
+        "analysis_version": ANALYSIS_VERSION,
+        "word_count": len(words),
+        "hashtag_count": sum(1 for token in tokens if token.startswith("#")),
+        "mention_count": sum(1 for token in tokens if token.startswith("@")),
+        "url_count": sum(1 for token in tokens if token.startswith("http")),
+        "keywords": " ".join(
+            word for word, _ in keywords.most_common(KEYWORD_COUNT)
+        )[:500],
+    }
+
+
+def analyze_chunk(tweets: list) -> list:
+    """
+    Analyze a chunk of tweets in a worker process.
+    :param tweets: List of tuples with primary key and text of the tweets
+    :return: List with the analysis results
+    """
+    return [analyze_tweet(tweet_key, tweet_text) for tweet_key, tweet_text in tweets]
+
+
+def run_analysis(
+    executor: ProcessPoolExecutor,
+    batch_size: int = ANALYSIS_BATCH_SIZE,
+    chunk_size: int = ANALYSIS_CHUNK_SIZE,
+    deadline: float = None,
+) -> dict:
+    """
+    Analyze all tweets after the watermark batch by batch. Every batch is split into chunks for
+    the process pool, its results are inserted in bulk and then the watermark is moved to its
+    last tweet. Tweets of the last db.SETTLE_SECONDS are left for the next run. Before, the
+    archive is scanned for newly marked terms.
+    :param executor: Process pool of the analysis
+    :param batch_size: Number of tweets read from the database at once
+    :param chunk_size: Number of tweets per task of the process pool
+    :param deadline: Monotonic time after which no new batch is started
+    :return: Dictionary with the number of analyzed tweets as messages
+    """
+    db.scan_archive_for_new_terms()
+    after_id = db.get_watermark(ANALYSIS_CHECKPOINT_NAME).tweet_key
+    until_timestamp = db.settled_until()
+    analyzed = 0
+    while deadline is None or time.monotonic() < deadline:
+        tweets = [tuple(row) for row in db.get_tweets_after(after_id, until_timestamp, batch_size)]
+        if not tweets:
+            break
+        chunks = [tweets[start : start + chunk_size] for start in range(0, len(tweets), chunk_size)]
+        results = [result for chunk in executor.map(analyze_chunk, chunks) for result in chunk]
+        db.add_analysis_results_bulk(results)
+        after_id = tweets[-1][0]
+        db.set_watermark(ANALYSIS_CHECKPOINT_NAME, db.Watermark(datetime.utcnow(), after_id))
+        analyzed += len(tweets)
+        if len(tweets) < batch_size:
+            break
+    print(f"Analyse: {analyzed} Tweets analysiert.")
+    return {"messages": analyzed}
+
+
+def check_and_verify_env_variables() -> dict:
+    """Function controls the passed env variables of the analysis and checks if they are valid."""
+    environment_data = {"all_verified": True}
+    read_positive_number(environment_data, "analysis_workers", str(os.cpu_count() or 1))
+    read_positive_number(environment_data, "analysis_min_interval", "300", float)
+    read_positive_number(environment_data, "analysis_max_interval", "3600", float)
+    if environment_data.get("analysis_min_interval", 0) > environment_data.get(
+        "analysis_max_interval", 0
+    ):
+        environment_data["all_verified"] &= False
+        print("Env variable >analysis_min_interval< must not exceed >analysis_max_interval<.")
+    return environment_data
+
+
+def main(env_data: dict) -> None:
     """
-    Main scheduling function to analyze tweets
+    Main scheduling function to analyze tweets. The interval between the runs adapts to the
+    number of new tweets between analysis_min_interval and analysis_max_interval seconds, the
+    process pool with analysis_workers processes is kept between the runs.
+    :param env_data: Dictionary with the verified env variables of the analysis
     :return: None
     """
+    workers = env_data["analysis_workers"]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        analysis_scheduler = AdaptiveScheduler(
+            functools.partial(run_analysis, executor),
+            env_data["analysis_min_interval"],
+            env_data["analysis_max_interval"],
+            env_data["analysis_max_interval"],
+        )
+        print(f"Starte Analyse mit {workers} Prozessen.")
+        analysis_scheduler.run_forever()
 
 
 if __name__ == "__main__":
-    main()
+    verified_env_data = check_and_verify_env_variables()
+    if verified_env_data["all_verified"] is not False:
+        db.init()
+        if db.DB_CONNECTION_VALID is True:
+            main(verified_env_data)
@@ -8,30 +8,152 @@ function should run later in the docker container.
 import os
 import time
 import datetime
+import itertools
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import Callable, Iterable, Iterator
 from dataclasses import dataclass
 import re
-import schedule
+import sqlalchemy
 import tweepy
-from source import db
+from source import db, metrics, profiling, resilience
+from source.metrics import METRICS
+from source.rate_limit import RateLimitDeadlineError, RateLimitedAPI
+from source.scheduler import AdaptiveScheduler, read_positive_number
+from source.work_queue import STORED, WorkQueue
 
-MESSAGE_PATTERN = r"^#?bot\s(.*)\s(https:.*)"
-# MESSAGE_PATTERN = r"^#?tweet\s(.*)\s(https:.*)"
-# MESSAGE_PATTERN = r"^#?user\s(.*)\s(https:.*)"
+MESSAGE_PATTERN = r"^#?(?P<command>{commands})\s(?P<message>.*)\s(?P<short_url>https:.*)"
 TWEET_URL_PATTERN = r"^(https://twitter.com/)(.+)(/status/)(\d+)$"
-MAX_TWEETS_PER_PAGE = 10
-MAX_PAGES = 10
+USER_URL_PATTERN = r"^(https://twitter.com/)(\w+)/?$"
+MAX_TWEETS_PER_PAGE = 50
+MAX_PAGES = 50
+CHECKPOINT_NAME = "message_handler"
+MAX_TWEETS_PER_LOOKUP = 100
+MAX_WRITE_FAILURES = 3
+QUEUE_POLL_INTERVAL = 0.5
+WORK_QUEUE_PATH = os.getenv("work_queue_path", "work_queue.db")
+REJECTED_URL_NOT_RECOGNIZED = "url_not_recognized"
+REJECTED_USER_NOT_FOUND = "user_not_found"
+REJECTED_TWEET_DELETED = "tweet_deleted"
 
 
-@dataclass
-class TwitterMessage:
+@dataclass(frozen=True)
+class ParsedMessage:
     """
-    Class to handle Twitter messages and process
+    Result of parsing a direct message with the command dispatcher
     """
 
-    message_id: str
-    message_timestamp: datetime.datetime
-    sender_id: str
-    message_data: dict
+    command: str
+    message: str
+    short_url: str
+
+
+@dataclass(frozen=True)
+class Command:
+    """
+    Handler functions of a message command. prepare turns a matched message into a work queue
+    entry, store writes a batch of entries of this command.
+    """
+
+    name: str
+    prepare: Callable
+    store: Callable
+
+
+class CommandRouter:
+    """
+    Registry of all message commands. The patterns of all commands are compiled once into a
+    single regular expression, so each message is parsed with one match regardless of the
+    number of commands.
+    """
+
+    def __init__(self):
+        self.commands = {}
+        self.pattern = None
+
+    def register(self, name: str, prepare: Callable, store: Callable) -> None:
+        """
+        Register a command and rebuild the dispatcher.
+        :param name: Keyword of the command without #
+        :param prepare: Function to turn a matched message into a work queue entry
+        :param store: Function to store a batch of work queue entries
+        :return: None
+        """
+        self.commands[name] = Command(name, prepare, store)
+        self.pattern = re.compile(
+            MESSAGE_PATTERN.format(
+                commands="|".join(
+                    re.escape(command)
+                    for command in sorted(self.commands, key=len, reverse=True)
+                )
+            )
+        )
+
+    def parse(self, text: str) -> ParsedMessage | None:
+        """
+        Parse a message into command, comment and url.
+        :param text: Complete message in a str
+        :return: Parsed message or None if no command matches
+        """
+        if self.pattern is None:
+            return None
+        result = self.pattern.match(text)
+        if result is None:
+            return None
+        return ParsedMessage(**result.groupdict())
+
+    def get(self, name: str) -> Command:
+        """
+        Return the handler functions of a command.
+        :param name: Keyword of the command
+        :return: Registered command
+        """
+        return self.commands[name]
+
+
+COMMANDS = CommandRouter()
+
+
+# The record is flat on purpose, every field is one value of the work queue entry.
+@dataclass(frozen=True, slots=True)
+class TwitterMessage:  # pylint: disable=too-many-instance-attributes
+    """
+    Compact record of a matched Twitter message with only the fields the pipeline needs. The
+    raw payload of the api is not kept.
+    """
+
+    message_id: int
+    message_timestamp: int
+    sender_id: int
+    command: str
+    comment: str
+    expand_url: str
+    tweet_id: int | None
+    twitter_user_name: str | None
+
+    @classmethod
+    def from_direct_message(cls, message, parsed: ParsedMessage) -> "TwitterMessage":
+        """
+        Build the record straight from a direct message of the api.
+        :param message: Direct message object from the twitter api
+        :param parsed: Parsed text of the message
+        :return: Compact message record
+        """
+        expand_url = extract_expand_url(message.message_create["message_data"])
+        decomposed_url = decompose_tweet_url(expand_url)
+        return cls(
+            message_id=int(message.id),
+            message_timestamp=int(message.created_timestamp),
+            sender_id=int(message.message_create["sender_id"]),
+            command=parsed.command,
+            comment=parsed.message,
+            expand_url=expand_url,
+            tweet_id=int(decomposed_url["tweet_id"])
+            if decomposed_url["found_match"]
+            else None,
+            twitter_user_name=decomposed_url["twitter_user_name"],
+        )
 
 
 def decompose_tweet_url(tweet_url: str) -> dict:
@@ -56,10 +178,24 @@ def analyze_message(tweet_text: str) -> dict:
     :return: Dictionary with information with message, url and if results were found.
     """
     result_return = {"found_match": False, "message": None, "short_url": None}
-    result = re.match(MESSAGE_PATTERN, tweet_text)
+    result = COMMANDS.parse(tweet_text)
     if result is not None:
-        result_return["message"] = result.groups()[0]
-        result_return["short_url"] = result.groups()[1]
+        result_return["message"] = result.message
+        result_return["short_url"] = result.short_url
+        result_return["found_match"] = True
+    return result_return
+
+
+def decompose_user_url(user_url: str) -> dict:
+    """
+    Filter and extract the user name of a profile url
+    :param user_url: Complete url of the twitter profile in a str
+    :return: Dictionary with information with username and if results were found.
+    """
+    result_return = {"found_match": False, "twitter_user_name": None}
+    result = re.match(USER_URL_PATTERN, user_url)
+    if result is not None:
+        result_return["twitter_user_name"] = result.groups()[1]
         result_return["found_match"] = True
     return result_return
 
@@ -85,28 +221,115 @@ def extract_expand_url(tweet_content) -> str:
         return ""
 
 
-def get_all_matched_messages(api_endpoint: tweepy.API) -> list:
+def get_new_direct_messages(
+    api_endpoint: tweepy.API, checkpoint: dict
+) -> Iterator[tweepy.models.DirectMessage]:
     """
-    Get all messages from twitter and check if a match found.
+    Stream all direct messages which are newer than the checkpoint. Paging stops at the first
+    already seen message, MAX_PAGES is only a safety limit. The checkpoint is updated in place
+    with the newest message. If paging stops at MAX_PAGES before an already seen message,
+    older messages may be missing and checkpoint["complete"] is set to False, so the checkpoint
+    must not be moved. The next run starts from the newest message again and reaches further,
+    because the processed messages are deleted.
     :param api_endpoint: Twitter api endpoint
-    :return: list with messages
-    """
-    matched_messages = [
-        TwitterMessage(
-            message_id=message.id,
-            message_timestamp=message.created_timestamp,
-            sender_id=message.message_create["sender_id"],
-            message_data=message.message_create["message_data"],
+    :param checkpoint: Dictionary with last_message_id and last_message_timestamp
+    :return: Generator with new direct messages
+    """
+    last_message_id = checkpoint["last_message_id"]
+    newest_message_found = False
+    checkpoint["complete"] = True
+    pages = iter(
+        tweepy.Cursor(api_endpoint.get_direct_messages, count=MAX_TWEETS_PER_PAGE).pages(
+            MAX_PAGES
         )
-        for page in tweepy.Cursor(
-            api_endpoint.get_direct_messages, count=MAX_TWEETS_PER_PAGE
-        ).pages(MAX_PAGES)
-        for message in page
-        if analyze_message(message.message_create["message_data"]["text"])[
-            "found_match"
-        ]
-    ]
-    return matched_messages
+    )
+    while True:
+        with METRICS.timer("twitterbot_stage_seconds", stage="fetch"):
+            page = next(pages, None)
+        if page is None:
+            if getattr(pages, "next_cursor", None) not in (None, -1):
+                checkpoint["complete"] = False
+                print(f"Maximal {MAX_PAGES} Seiten gelesen, Rest folgt im nächsten Lauf.")
+            return
+        METRICS.inc("twitterbot_messages_fetched_total", len(page))
+        for message in page:
+            if last_message_id is not None and int(message.id) <= last_message_id:
+                return
+            if not newest_message_found:
+                checkpoint["last_message_id"] = int(message.id)
+                checkpoint["last_message_timestamp"] = datetime.datetime.utcfromtimestamp(
+                    int(message.created_timestamp) / 1000
+                )
+                newest_message_found = True
+            yield message
+
+
+def get_all_matched_messages(
+    api_endpoint: tweepy.API, checkpoint: dict = None
+) -> Iterator[TwitterMessage]:
+    """
+    Get all new messages from twitter and check if a match found. The pages are streamed, so
+    matched messages are available while later pages are still downloading.
+    :param api_endpoint: Twitter api endpoint
+    :param checkpoint: Dictionary with the last seen message, all messages are read if None
+    :return: Generator with matched messages
+    """
+    if checkpoint is None:
+        checkpoint = {"last_message_id": None, "last_message_timestamp": None}
+    for message in get_new_direct_messages(api_endpoint, checkpoint):
+        with METRICS.timer("twitterbot_stage_seconds", stage="parse"):
+            parsed = COMMANDS.parse(message.message_create["message_data"]["text"])
+            matched_message = (
+                TwitterMessage.from_direct_message(message, parsed) if parsed else None
+            )
+        if matched_message is not None:
+            METRICS.inc("twitterbot_messages_matched_total", command=parsed.command)
+            yield matched_message
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[list]:
+    """
+    Split a stream into lists with a maximum size, so each pipeline stage has a bounded buffer.
+    :param iterable: Stream of elements
+    :param batch_size: Maximum number of elements per batch
+    :return: Generator with lists of elements
+    """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def _extract_status_data(tweet_status) -> dict:
+    """
+    Extract the needed information of a tweet status.
+    :param tweet_status: Status object from the twitter api
+    :return: Dictionary with author and tweet information
+    """
+    return {
+        "author_user_id": tweet_status.user.id,
+        "author_user_name": tweet_status.user.name,
+        "author_user_screen_name": tweet_status.user.screen_name,
+        "created_at": tweet_status.created_at,
+        "text": tweet_status.text,
+    }
+
+
+def get_tweet_statuses(api: tweepy.API, tweet_ids: list) -> dict:
+    """
+    Fetch the status of many tweets with the bulk lookup endpoint, 100 tweets per request.
+    Tweets which are deleted or not visible are missing in the result.
+    :param api: Twitter api endpoint
+    :param tweet_ids: List with tweet ids
+    :return: Dictionary tweet id as int to status information
+    """
+    unique_ids = list(dict.fromkeys(int(tweet_id) for tweet_id in tweet_ids))
+    tweet_statuses = {}
+    for start in range(0, len(unique_ids), MAX_TWEETS_PER_LOOKUP):
+        for tweet_status in api.lookup_statuses(
+            unique_ids[start : start + MAX_TWEETS_PER_LOOKUP]
+        ):
+            tweet_statuses[tweet_status.id] = _extract_status_data(tweet_status)
+    return tweet_statuses
 
 
 def get_tweet_status(api: tweepy.API, tweet_id: str) -> dict:
@@ -123,62 +346,505 @@ def get_tweet_status(api: tweepy.API, tweet_id: str) -> dict:
         "created_at": None,
         "text": None,
     }
-    try:
-        tweet_status = api.get_status(tweet_id)
-        tweet_status_data["author_user_id"] = tweet_status.user.id
-        tweet_status_data["author_user_name"] = tweet_status.user.name
-        tweet_status_data["author_user_screen_name"] = tweet_status.user.screen_name
-        tweet_status_data["created_at"] = tweet_status.created_at
-        tweet_status_data["text"] = tweet_status.text
-
-    except tweepy.errors.NotFound as _:
+    tweet_status = get_tweet_statuses(api, [tweet_id]).get(int(tweet_id))
+    if tweet_status is None:
         print(f"Tweet mit der ID: {tweet_id} nicht mehr vorhanden.")
-    finally:
-        return tweet_status_data  # pylint: disable=lost-exception
+        return tweet_status_data
+    return tweet_status
 
 
-def message_handler(communication_data: dict) -> None:
+def prepare_entry(message: TwitterMessage) -> dict | None:
     """
-    Called regularly fetch messages and save content
-    :param communication_data: Dictionary with app information.
+    Turn a matched message into an entry for the work queue with the prepare function of its
+    command.
+    :param message: Matched message
+    :return: Dictionary for the work queue or None if the message can not be processed
+    """
+    entry = COMMANDS.get(message.command).prepare(message)
+    if entry is None:
+        return None
+    return {"message_id": message.message_id, "command": message.command} | entry
+
+
+def prepare_tweet_entry(message: TwitterMessage) -> dict | None:
+    """
+    Prepare a message which captures a tweet.
+    :param message: Matched message
+    :return: Dictionary with comment, urls and tweet id or None if the tweet url is not valid
+    """
+    if message.tweet_id is None:
+        print("Tweet-URL nicht erkannt: " + message.expand_url)
+        return None
+    return {
+        "comment": message.comment,
+        "expand_url": message.expand_url,
+        "tweet_id": message.tweet_id,
+        "twitter_user_name": message.twitter_user_name,
+    }
+
+
+def prepare_user_entry(message: TwitterMessage) -> dict | None:
+    """
+    Prepare a message which captures a twitter user.
+    :param message: Matched message
+    :return: Dictionary with comment, url and user name or None if the profile url is not valid
+    """
+    decomposed_url = decompose_user_url(message.expand_url)
+    if not decomposed_url["found_match"]:
+        print("Profil-URL nicht erkannt: " + message.expand_url)
+        return None
+    return {
+        "comment": message.comment,
+        "expand_url": message.expand_url,
+        "twitter_user_name": decomposed_url["twitter_user_name"],
+    }
+
+
+def store_entries(api: tweepy.API, entries: list) -> None:
+    """
+    Store a batch of queue entries with the store function of their commands.
+    :param api: Twitter api endpoint
+    :param entries: List with entries of the work queue
+    :return: None
+    """
+    entries_by_command = {}
+    for entry in entries:
+        entries_by_command.setdefault(entry.get("command", "bot"), []).append(entry)
+    for command, command_entries in entries_by_command.items():
+        COMMANDS.get(command).store(api, command_entries)
+
+
+def store_tweet_entries(api: tweepy.API, entries: list) -> None:
+    """
+    Hydrate a batch of tweet entries and store the tweets in one transaction. Tweets which are
+    already stored or appear twice in the batch are not hydrated, only their comments are
+    linked. A deleted tweet only keeps the comment of its first message, the later messages
+    about it are stored as rejected messages, so their comments are kept.
+    :param api: Twitter api endpoint
+    :param entries: List with entries of the work queue
     :return: None
     """
+    new_entries = []
+    known_entries = []
+    batch_tweet_ids = set()
+    for entry in entries:
+        tweet_id = int(entry["tweet_id"])
+        if tweet_id in db.KNOWN_TWEET_IDS or tweet_id in batch_tweet_ids:
+            known_entries.append(entry)
+        else:
+            batch_tweet_ids.add(tweet_id)
+            new_entries.append(entry)
+    tweet_statuses = {}
+    if new_entries:
+        with METRICS.timer("twitterbot_stage_seconds", stage="hydrate"):
+            tweet_statuses = get_tweet_statuses(
+                api, [entry["tweet_id"] for entry in new_entries]
+            )
+    records = []
+    deleted_records = []
+    for entry in new_entries:
+        tweet_status = tweet_statuses.get(int(entry["tweet_id"]))
+        if tweet_status is not None:
+            records.append(entry | tweet_status)
+        else:
+            print(f"Tweet mit der ID: {entry['tweet_id']} nicht mehr vorhanden.")
+            deleted_records.append(entry)
+
+    _write_tweet_records(records, deleted_records, known_entries)
+
+
+def _write_tweet_records(records: list, deleted_records: list, known_entries: list) -> None:
+    """
+    Store the hydrated, deleted and known tweets of a batch. Messages whose comment can not be
+    stored with a deleted tweet are stored as rejected messages.
+    :param records: List with the entries and the information of the existing tweets
+    :param deleted_records: List with the entries of deleted tweets
+    :param known_entries: List with the entries of tweets which are already stored
+    :return: None
+    """
+    with METRICS.timer("twitterbot_stage_seconds", stage="db_write"):
+        rejected_records = [
+            entry | {"reason": REJECTED_TWEET_DELETED}
+            for entry in db.add_tweets_bulk(records, deleted_records, known_entries)
+        ]
+        db.add_rejected_messages_bulk(rejected_records)
+    rejected_ids = {record["message_id"] for record in rejected_records}
+    deleted_records = [
+        entry for entry in deleted_records if entry["message_id"] not in rejected_ids
+    ]
+    known_entries = [entry for entry in known_entries if entry["message_id"] not in rejected_ids]
+    METRICS.inc("twitterbot_tweets_stored_total", len(records))
+    METRICS.inc("twitterbot_deleted_tweets_stored_total", len(deleted_records))
+    METRICS.inc("twitterbot_known_tweets_total", len(known_entries))
+    METRICS.inc("twitterbot_messages_rejected_total", len(rejected_records))
+    for tweet_data in records:
+        print("Existierender Tweet aufgenommen: " + tweet_data["expand_url"])
+    for deleted_data in deleted_records:
+        print("Gelöschter Tweet aufgenommen: " + deleted_data["expand_url"])
+    for known_data in known_entries:
+        print("Bekannter Tweet, Kommentar verknüpft: " + known_data["expand_url"])
+    for rejected_data in rejected_records:
+        print("Tweet bereits gelöscht, Nachricht abgelegt: " + rejected_data["expand_url"])
+
+
+def store_user_entries(api: tweepy.API, entries: list) -> None:
+    """
+    Look up a batch of user entries and store the users with their comment. Users which do not
+    exist anymore are stored as rejected messages, so the comment is kept when the direct
+    message is deleted.
+    :param api: Twitter api endpoint
+    :param entries: List with entries of the work queue
+    :return: None
+    """
+    screen_names = list(
+        dict.fromkeys(entry["twitter_user_name"].lower() for entry in entries)
+    )
+    users = {}
+    with METRICS.timer("twitterbot_stage_seconds", stage="hydrate"):
+        for start in range(0, len(screen_names), MAX_TWEETS_PER_LOOKUP):
+            try:
+                found_users = api.lookup_users(
+                    screen_name=screen_names[start : start + MAX_TWEETS_PER_LOOKUP]
+                )
+            except tweepy.NotFound:
+                found_users = []
+            for user in found_users:
+                users[user.screen_name.lower()] = user
+    records = []
+    rejected_records = []
+    for entry in entries:
+        user = users.get(entry["twitter_user_name"].lower())
+        if user is None:
+            rejected_records.append(entry | {"reason": REJECTED_USER_NOT_FOUND})
+            continue
+        records.append(
+            {
+                "author_user_id": user.id,
+                "author_user_name": user.name,
+                "author_user_screen_name": user.screen_name,
+                "comment": entry["comment"],
+            }
+        )
+    with METRICS.timer("twitterbot_stage_seconds", stage="db_write"):
+        db.add_users_bulk(records)
+        db.add_rejected_messages_bulk(rejected_records)
+    METRICS.inc("twitterbot_users_stored_total", len(records))
+    METRICS.inc("twitterbot_messages_rejected_total", len(rejected_records))
+    for record in records:
+        print("Twitter User aufgenommen: " + record["author_user_screen_name"])
+    for rejected_data in rejected_records:
+        print(
+            "Twitter User nicht mehr vorhanden, Nachricht abgelegt: "
+            + rejected_data["expand_url"]
+        )
+
+
+COMMANDS.register("bot", prepare_tweet_entry, store_tweet_entries)
+COMMANDS.register("tweet", prepare_tweet_entry, store_tweet_entries)
+COMMANDS.register("user", prepare_user_entry, store_user_entries)
+
+
+def delete_direct_messages(
+    api: tweepy.API,
+    queue: WorkQueue,
+    message_ids: list,
+    delete_executor: ThreadPoolExecutor,
+) -> None:
+    """
+    Delete the direct messages of stored entries and remove the entries from the queue.
+    Messages which are already deleted count as done.
+    :param api: Twitter api endpoint
+    :param queue: Work queue
+    :param message_ids: IDs of the stored messages
+    :param delete_executor: Thread pool to run the delete requests in parallel
+    :return: None
+    """
+
+    def delete(message_id: str) -> None:
+        with METRICS.timer("twitterbot_stage_seconds", stage="delete"):
+            try:
+                api.delete_direct_message(message_id)
+            except tweepy.NotFound:
+                pass
+            queue.remove([message_id])
+
+    list(delete_executor.map(delete, message_ids))
+
+
+def remaining_time(deadline: float | None, wait_time: float = float("inf")) -> float:
+    """
+    Limit a wait to the time which is left until the deadline.
+    :param deadline: Optional time.monotonic() value when the run has to stop
+    :param wait_time: Seconds which should be waited
+    :return: Seconds which may be waited, 0 after the deadline
+    """
+    if deadline is None:
+        return wait_time
+    return max(min(wait_time, deadline - time.monotonic()), 0.0)
+
+
+def reject_messages(
+    api: tweepy.API,
+    queue: WorkQueue,
+    rejected_records: list,
+    delete_executor: ThreadPoolExecutor,
+) -> None:
+    """
+    Store direct messages which can not be processed as rejected messages and delete them
+    afterwards, so they do not stay in the inbox and their content is kept.
+    :param api: Twitter api endpoint
+    :param queue: Work queue
+    :param rejected_records: List with dictionaries with message_id, command, expand_url,
+    comment and reason
+    :param delete_executor: Thread pool to run the delete requests in parallel
+    :return: None
+    """
+    db.add_rejected_messages_bulk(rejected_records)
+    METRICS.inc("twitterbot_messages_rejected_total", len(rejected_records))
+    message_ids = [record["message_id"] for record in rejected_records]
+    queue.enqueue([{"message_id": message_id} for message_id in message_ids], STORED)
+    delete_direct_messages(api, queue, message_ids, delete_executor)
+
+
+def write_entries(
+    api: tweepy.API,
+    queue: WorkQueue,
+    fetch_done: threading.Event,
+    delete_executor: ThreadPoolExecutor,
+    deadline: float = None,
+) -> None:
+    """
+    Writer stage: drain the work queue in batches, store and acknowledge the entries and delete
+    their direct messages afterwards. Transient errors are retried inside the db and api calls.
+    A batch which still fails goes back to the queue, while a circuit is open the writer sleeps
+    until the next trial, but not beyond the deadline. After MAX_WRITE_FAILURES failures in a
+    row the writer stops and the entries wait for the next run, as well as after the deadline
+    or when the rate limit allows the next request only after it.
+    :param api: Twitter api endpoint
+    :param queue: Work queue
+    :param fetch_done: Event which is set when all messages are fetched
+    :param delete_executor: Thread pool to run the delete requests in parallel
+    :param deadline: Optional time.monotonic() value when the writer has to stop
+    :return: None
+    """
+    failures = 0
+    while failures < MAX_WRITE_FAILURES and (
+        deadline is None or time.monotonic() < deadline
+    ):
+        entries = queue.lease(MAX_TWEETS_PER_LOOKUP)
+        if not entries:
+            if fetch_done.is_set():
+                return
+            fetch_done.wait(QUEUE_POLL_INTERVAL)
+            continue
+        message_ids = [entry["message_id"] for entry in entries]
+        try:
+            store_entries(api, entries)
+        except resilience.CircuitOpenError as err:
+            queue.release(message_ids)
+            failures += 1
+            METRICS.inc("twitterbot_messages_failed_total", len(message_ids))
+            print(f"Speichern pausiert: {err}")
+            time.sleep(remaining_time(deadline, err.retry_after))
+            continue
+        except RateLimitDeadlineError as err:
+            queue.release(message_ids)
+            print(f"Speichern beendet, Nachrichten bleiben in der Warteschlange: {err}")
+            return
+        except (
+            sqlalchemy.exc.SQLAlchemyError,
+            tweepy.errors.TwitterServerError,
+        ) as err:
+            queue.release(message_ids)
+            failures += 1
+            METRICS.inc("twitterbot_messages_failed_total", len(message_ids))
+            print(f"Speichern fehlgeschlagen, Nachrichten bleiben in der Warteschlange: {err}")
+            continue
+        failures = 0
+        queue.acknowledge(message_ids)
+        delete_direct_messages(api, queue, message_ids, delete_executor)
+
+
+def enqueue_messages(
+    api: tweepy.API,
+    queue: WorkQueue,
+    messages: list,
+    delete_executor: ThreadPoolExecutor,
+) -> int:
+    """
+    Fetch stage: turn a batch of matched messages into entries of the work queue. Messages which
+    match a command but can not be processed, e.g. with an unknown url, are stored as rejected
+    messages and deleted right away, so they do not stay in the inbox.
+    :param api: Twitter api endpoint
+    :param queue: Work queue
+    :param messages: List with matched messages
+    :param delete_executor: Thread pool to run the delete requests in parallel
+    :return: Number of enqueued messages
+    """
+    entries = []
+    rejected_records = []
+    for message in messages:
+        if entry := prepare_entry(message):
+            entries.append(entry)
+        else:
+            rejected_records.append(
+                {
+                    "message_id": message.message_id,
+                    "command": message.command,
+                    "expand_url": message.expand_url,
+                    "comment": message.comment,
+                    "reason": REJECTED_URL_NOT_RECOGNIZED,
+                }
+            )
+    queue.enqueue(entries)
+    if rejected_records:
+        reject_messages(api, queue, rejected_records, delete_executor)
+    return len(entries)
+
+
+def run_pipeline(
+    api: tweepy.API,
+    messages: Iterable,
+    queue: WorkQueue,
+    worker_count: int = 1,
+    deadline: float = None,
+) -> tuple[int, bool]:
+    """
+    Run the pipeline for all matched messages. The fetch stage parses the messages into the
+    durable work queue, worker_count writer threads drain it at the same time. Direct messages
+    which were stored in an earlier run but not deleted are deleted first, as far as the
+    deadline allows. After the deadline no further messages are fetched or written, the rest
+    waits for the next run.
+    :param api: Twitter api endpoint
+    :param messages: Stream of matched messages
+    :param queue: Work queue
+    :param worker_count: Number of parallel writers
+    :param deadline: Optional time.monotonic() value when the run has to stop
+    :return: Number of enqueued messages and if all messages were fetched
+    """
+    queue.recover()
+    fetch_done = threading.Event()
+    with ThreadPoolExecutor(
+        max_workers=worker_count
+    ) as writer_executor, ThreadPoolExecutor(max_workers=worker_count) as delete_executor:
+        while remaining_time(deadline) > 0 and (
+            message_ids := queue.stored(MAX_TWEETS_PER_LOOKUP)
+        ):
+            delete_direct_messages(api, queue, message_ids, delete_executor)
+        writers = [
+            writer_executor.submit(
+                write_entries, api, queue, fetch_done, delete_executor, deadline
+            )
+            for _ in range(worker_count)
+        ]
+        message_count = 0
+        fetch_complete = True
+        try:
+            for batch in batched(messages, MAX_TWEETS_PER_LOOKUP):
+                message_count += enqueue_messages(api, queue, batch, delete_executor)
+                if deadline is not None and time.monotonic() >= deadline:
+                    print("Zeitbudget des Laufs erreicht, Rest folgt im nächsten Lauf.")
+                    fetch_complete = False
+                    break
+        finally:
+            fetch_done.set()
+        for writer in as_completed(writers):
+            writer.result()
+    return message_count, fetch_complete
+
+
+def create_api(communication_data: dict) -> RateLimitedAPI:
+    """
+    Create the rate limited twitter api endpoint with the authentication information.
+    :param communication_data: Dictionary with app information.
+    :return: Twitter api endpoint
+    """
     auth = tweepy.OAuth1UserHandler(
         communication_data["consumer_key"],
         communication_data["consumer_secret"],
         communication_data["access_token"],
         communication_data["access_token_secret"],
     )
-    api = tweepy.API(auth, wait_on_rate_limit=True)
+    return RateLimitedAPI(tweepy.API(auth))
+
+
+def handle_messages(
+    api: tweepy.API,
+    worker_count: int = 1,
+    queue_path: str = WORK_QUEUE_PATH,
+    deadline: float = None,
+) -> dict:
+    """
+    Fetch, store and delete all new matched messages with the given api endpoint. The messages
+    are streamed through the stages fetch, hydrate, store and delete in batches of
+    MAX_TWEETS_PER_LOOKUP. Only messages newer than the stored checkpoint are fetched, the
+    checkpoint moves after a run which fetched all of them.
+    :param api: Twitter api endpoint
+    :param worker_count: Number of parallel workers
+    :param queue_path: Path of the work queue file
+    :param deadline: Optional time.monotonic() value when the run has to stop
+    :return: Dictionary with the number of messages and the remaining rate limit budget of the
+    direct message endpoint as fraction
+    """
+    run_result = {"messages": 0, "rate_limit_remaining": 1.0}
+    queue = WorkQueue(queue_path)
+    if isinstance(api, RateLimitedAPI):
+        api.deadline = deadline
     try:
         api.verify_credentials()
-        matched_message = get_all_matched_messages(api)
-        for message in matched_message:
-            tweet_data = {
-                "comment": analyze_message(message.message_data["text"])["message"],
-                "expand_url": extract_expand_url(message.message_data),
-            }
-            decomposed_url = decompose_tweet_url(tweet_data["expand_url"])
-            tweet_data["tweet_id"] = decomposed_url["tweet_id"]
-            tweet_data |= get_tweet_status(api, decomposed_url["tweet_id"])
-
-            if tweet_data["author_user_id"] is not None:
-                db.add_tweet(tweet_data)
-                db.check_and_update_user_names(tweet_data)
-                print("Existierender Tweet aufgenommen: " + tweet_data["expand_url"])
-            else:
-                db.add_deleted_tweet(
-                    decomposed_url, tweet_data["expand_url"], tweet_data["comment"]
-                )
-                print("Gelöschter Tweet aufgenommen: " + tweet_data["expand_url"])
-            api.delete_direct_message(message.message_id)
+        db.reset_identity_cache()
+        if not db.KNOWN_TWEET_IDS.loaded:
+            print(f"{db.load_known_tweet_ids()} bekannte Tweet-IDs geladen.")
+        checkpoint = db.get_checkpoint(CHECKPOINT_NAME)
+        run_result["messages"], fetch_complete = run_pipeline(
+            api,
+            get_all_matched_messages(api, checkpoint),
+            queue,
+            worker_count,
+            deadline,
+        )
+        if (
+            fetch_complete
+            and checkpoint.get("complete")
+            and checkpoint["last_message_id"] is not None
+        ):
+            db.set_checkpoint(
+                CHECKPOINT_NAME,
+                checkpoint["last_message_id"],
+                checkpoint["last_message_timestamp"],
+            )
 
     except tweepy.TooManyRequests as err:
         print(err)
+    except RateLimitDeadlineError as err:
+        print(f"Lauf beendet, Rest folgt im nächsten Lauf: {err}")
     except tweepy.Unauthorized:
         print("Anmeldedaten nicht korrekt")
     except tweepy.errors.Forbidden as err:
         print(f"Keinen vollen Zugang: {err}")
+    except resilience.CircuitOpenError as err:
+        print(err)
+    except (sqlalchemy.exc.OperationalError, tweepy.errors.TwitterServerError) as err:
+        print(f"Lauf abgebrochen, Dienst nicht erreichbar: {err}")
+    finally:
+        queue.close()
+        if isinstance(api, RateLimitedAPI):
+            api.deadline = None
+    bucket = getattr(api, "buckets", {}).get("get_direct_messages")
+    if bucket is not None:
+        run_result["rate_limit_remaining"] = bucket.remaining / bucket.capacity
+    return run_result
+
+
+def message_handler(communication_data: dict) -> dict:
+    """
+    Fetch messages and save content once.
+    :param communication_data: Dictionary with app information.
+    :return: Dictionary with the result of the run
+    """
+    return handle_messages(
+        create_api(communication_data), communication_data.get("worker_count", 1)
+    )
 
 
 def check_and_verify_env_variables() -> dict:
@@ -197,36 +863,63 @@ def check_and_verify_env_variables() -> dict:
             "Not all env variable are defined. Please check the documentation and add all twitter"
             "authentication information."
         )
-    try:
-        _ = datetime.datetime.strptime(os.getenv("schedule_time_every_day"), "%H:%M")
-        environment_data["schedule_time_every_day"] = os.getenv(
-            "schedule_time_every_day"
+    read_positive_number(environment_data, "worker_count", "1")
+    if os.getenv("schedule_time_every_day") is not None:
+        print(
+            "WARNING: Env variable >schedule_time_every_day< is deprecated and ignored. The runs "
+            "are planned with >min_poll_interval< and >max_poll_interval<."
         )
-        environment_data["all_verified"] &= True
-
+    read_positive_number(environment_data, "min_poll_interval", "300", float)
+    read_positive_number(environment_data, "max_poll_interval", "3600", float)
+    read_positive_number(environment_data, "run_time_budget", "600", float)
+    try:
+        environment_data["profile_runs"] = int(os.getenv("profile_runs", "0"))
     except ValueError:
         environment_data["all_verified"] &= False
-        print("Wrong time format for >schedule_time_every_day<. Should be HH:MM")
-    except TypeError:
+        print("Env variable >profile_runs< must be a number.")
+    environment_data["profile_dir"] = os.getenv("profile_dir", "profiles")
+    if os.getenv("metrics_port"):
+        read_positive_number(environment_data, "metrics_port", "0")
+    environment_data["metrics_snapshot_path"] = os.getenv("metrics_snapshot_path")
+    read_positive_number(environment_data, "metrics_snapshot_interval", "60", float)
+    if environment_data.get("min_poll_interval", 0) > environment_data.get(
+        "max_poll_interval", 0
+    ):
         environment_data["all_verified"] &= False
-        print("Env variable >schedule_time_every_day< is not defined.")
+        print("Env variable >min_poll_interval< must not exceed >max_poll_interval<.")
 
     return environment_data
 
 
 def main(env_data: dict) -> None:
     """
-    Scheduling function for regular call.
+    Scheduling function for regular call. The interval between the runs adapts to the message
+    volume and the rate limit budget, the api endpoint with its budgets is kept between runs.
+    With metrics_port or metrics_snapshot_path the metrics are exported, with profile_runs the
+    first runs are profiled and a report is written to profile_dir.
     :param env_data: Dictionary with app information.
     :return: None
     """
-    schedule.every().day.at(env_data["schedule_time_every_day"]).do(
-        message_handler, env_data
+    if env_data.get("metrics_port"):
+        metrics.start_http_server(env_data["metrics_port"])
+    if env_data["metrics_snapshot_path"]:
+        metrics.start_snapshot_writer(
+            env_data["metrics_snapshot_path"], env_data["metrics_snapshot_interval"]
+        )
+    api = create_api(env_data)
+    job = functools.partial(handle_messages, api, env_data["worker_count"])
+    if env_data["profile_runs"] > 0:
+        job = profiling.profiled(
+            job, db.get_engine(), env_data["profile_dir"], env_data["profile_runs"]
+        )
+    handler_scheduler = AdaptiveScheduler(
+        job,
+        env_data["min_poll_interval"],
+        env_data["max_poll_interval"],
+        env_data["run_time_budget"],
     )
     print("Env data are verified, start job.")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    handler_scheduler.run_forever()
 
 
 if __name__ == "__main__":
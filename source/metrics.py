@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Collection of counters and histograms for the hot paths of the handler. The metrics can be
+served in the Prometheus text format over HTTP or written as JSON snapshot to a file.
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sqlalchemy
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0, 900.0)
+
+
+class Histogram:  # pylint: disable=too-few-public-methods
+    """Cumulative histogram with fixed bucket limits in seconds"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Add a value to all buckets whose limit is not exceeded.
+        :param value: Measured value
+        :return: None
+        """
+        self.count += 1
+        self.sum += value
+        for index, limit in enumerate(self.buckets):
+            if value <= limit:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """
+    Thread safe registry of all counters and histograms. Every metric is identified by its name
+    and its labels.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increase a counter.
+        :param name: Name of the counter
+        :param value: Increment
+        :param labels: Labels of the counter
+        :return: None
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Add a value to a histogram.
+        :param name: Name of the histogram
+        :param value: Measured value
+        :param labels: Labels of the histogram
+        :return: None
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Measure the duration of the with block into a histogram.
+        :param name: Name of the histogram
+        :param labels: Labels of the histogram
+        :return: Context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        Copy of all metrics as dictionary for the JSON export.
+        :return: Dictionary with counters and histograms
+        """
+        with self.lock:
+            return {
+                "timestamp": time.time(),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": dict(zip(histogram.buckets, histogram.counts)),
+                    }
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        :return: Metrics as text
+        """
+
+        def label_text(labels: tuple, extra: tuple = ()) -> str:
+            pairs = [f'{key}="{value}"' for key, value in labels + extra]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = []
+        typed = set()
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{label_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for limit, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(
+                        f"{name}_bucket{label_text(labels, (('le', limit),))} {count}"
+                    )
+                lines.append(
+                    f"{name}_bucket{label_text(labels, (('le', '+Inf'),))} "
+                    f"{histogram.count}"
+                )
+                lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """
+        Drop all metrics.
+        :return: None
+        """
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+METRICS = MetricsRegistry()
+_INSTRUMENTED_ENGINES = weakref.WeakSet()
+
+
+def instrument_engine(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Count all SQL statements of the engine and measure their duration. The start time is kept
+    on the execution context of the statement, so a failed statement leaves nothing behind,
+    it is only counted as error.
+    :param engine: Engine of the database
+    :return: None
+    """
+    if engine in _INSTRUMENTED_ENGINES:
+        return
+    _INSTRUMENTED_ENGINES.add(engine)
+
+    @sqlalchemy.event.listens_for(engine, "before_cursor_execute")
+    def start_query(  # pylint: disable=too-many-arguments
+        _conn, _cursor, _statement, _parameters, context, _executemany
+    ):
+        if context is not None:
+            context.twitterbot_query_start = time.perf_counter()
+
+    @sqlalchemy.event.listens_for(engine, "after_cursor_execute")
+    def end_query(  # pylint: disable=too-many-arguments
+        _conn, _cursor, _statement, _parameters, context, _executemany
+    ):
+        start = getattr(context, "twitterbot_query_start", None)
+        METRICS.inc("twitterbot_sql_queries_total")
+        if start is not None:
+            METRICS.observe("twitterbot_sql_query_seconds", time.perf_counter() - start)
+
+    @sqlalchemy.event.listens_for(engine, "handle_error")
+    def failed_query(_exception_context):
+        METRICS.inc("twitterbot_sql_errors_total")
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve the metrics on /metrics"""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer a scrape request"""
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        """No log line for every scrape"""
+
+
+def start_http_server(port: int) -> ThreadingHTTPServer:
+    """
+    Serve the metrics for Prometheus in a background thread.
+    :param port: TCP port of the endpoint
+    :return: Running server
+    """
+    server = ThreadingHTTPServer(("", port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metriken unter http://0.0.0.0:{port}/metrics verfügbar.")
+    return server
+
+
+def write_snapshot(path: str) -> None:
+    """
+    Write the current metrics as JSON file. The file is replaced atomically.
+    :param path: Path of the snapshot file
+    :return: None
+    """
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as snapshot_file:
+        json.dump(METRICS.snapshot(), snapshot_file)
+    os.replace(temporary_path, path)
+
+
+def start_snapshot_writer(path: str, interval: float) -> threading.Thread:
+    """
+    Write a JSON snapshot of the metrics periodically in a background thread.
+    :param path: Path of the snapshot file
+    :param interval: Seconds between two snapshots
+    :return: Running thread
+    """
+
+    def write_periodically():
+        while True:
+            time.sleep(interval)
+            write_snapshot(path)
+
+    thread = threading.Thread(target=write_periodically, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opt-in profiling of single handler runs. A profiled run is wrapped in cProfile, every SQL
+statement is captured with its duration and repeated statements are reported as N+1 candidates.
+The report is written as text file next to the raw cProfile data.
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime
+import sqlalchemy
+
+N_PLUS_ONE_THRESHOLD = 10
+REPORT_TOP_FUNCTIONS = 30
+REPORT_TOP_STATEMENTS = 15
+FOCUS_FUNCTIONS = {
+    "add_tweet": "Datenbank add_tweet",
+    "add_tweets_bulk": "Datenbank add_tweets_bulk",
+    "add_users_bulk": "Datenbank add_users_bulk",
+    "check_and_update_user_names": "Datenbank check_and_update_user_names",
+    "limited_call": "Twitter API Aufrufe",
+    "get_tweet_statuses": "Twitter API Tweet-Abfrage",
+    "delete_direct_messages": "Twitter API Nachrichten löschen",
+}
+
+
+class SQLCapture:
+    """
+    Capture every SQL statement of an engine with its duration. Statements are parameterized,
+    the same text executed again and again in a row is a N+1 pattern.
+    """
+
+    def __init__(self, engine: sqlalchemy.engine.Engine):
+        self.engine = engine
+        self.statements = []
+        self.lock = threading.Lock()
+
+    def _start(  # pylint: disable=too-many-arguments
+        self, _conn, _cursor, _statement, _parameters, context, _executemany
+    ):
+        if context is not None:
+            context.profile_start = time.perf_counter()
+
+    def _end(  # pylint: disable=too-many-arguments
+        self, _conn, _cursor, statement, _parameters, context, _executemany
+    ):
+        start = getattr(context, "profile_start", None)
+        if start is None:
+            return
+        with self.lock:
+            self.statements.append(
+                (" ".join(statement.split()), time.perf_counter() - start)
+            )
+
+    def __enter__(self):
+        sqlalchemy.event.listen(self.engine, "before_cursor_execute", self._start)
+        sqlalchemy.event.listen(self.engine, "after_cursor_execute", self._end)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        sqlalchemy.event.remove(self.engine, "before_cursor_execute", self._start)
+        sqlalchemy.event.remove(self.engine, "after_cursor_execute", self._end)
+
+    def summary(self) -> list:
+        """
+        Group the statements by their text.
+        :return: List of (statement, count, total seconds) sorted by total seconds
+        """
+        grouped = {}
+        for statement, duration in self.statements:
+            count, total = grouped.get(statement, (0, 0.0))
+            grouped[statement] = (count + 1, total + duration)
+        return sorted(
+            ((statement, count, total) for statement, (count, total) in grouped.items()),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+
+    def n_plus_one_candidates(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list:
+        """
+        Find statements which are executed at least threshold times in a row.
+        :param threshold: Minimum length of a repetition
+        :return: List of (statement, longest repetition)
+        """
+        longest = {}
+        previous, repetition = None, 0
+        for statement, _ in self.statements:
+            repetition = repetition + 1 if statement == previous else 1
+            previous = statement
+            longest[statement] = max(longest.get(statement, 0), repetition)
+        return sorted(
+            (
+                (statement, count)
+                for statement, count in longest.items()
+                if count >= threshold
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+
+def _focus_lines(stats: pstats.Stats) -> list:
+    """
+    Cumulative time of the functions which usually dominate a run.
+    :param stats: Statistics of the profiled run
+    :return: Report lines sorted by cumulative time
+    """
+    totals = {}
+    for (_, _, function_name), (_, calls, _, cumulative, _) in stats.stats.items():
+        if function_name in FOCUS_FUNCTIONS:
+            count, seconds = totals.get(function_name, (0, 0.0))
+            totals[function_name] = (count + calls, max(seconds, cumulative))
+    return [
+        f"{seconds:10.3f}s {count:8d}x  {FOCUS_FUNCTIONS[name]} ({name})"
+        for name, (count, seconds) in sorted(
+            totals.items(), key=lambda item: item[1][1], reverse=True
+        )
+    ]
+
+
+def write_report(
+    profilers: list, capture: SQLCapture, report_dir: str, duration: float
+) -> str:
+    """
+    Write the text report and the raw cProfile data of a run.
+    :param profilers: Profilers of the run, the first one of the calling thread
+    :param capture: Captured SQL statements of the run
+    :param report_dir: Directory of the reports
+    :param duration: Wall clock duration of the run in seconds
+    :return: Path of the text report
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    base_path = os.path.join(report_dir, f"profile_{datetime.now():%Y%m%d_%H%M%S}")
+    stats_text = io.StringIO()
+    stats = pstats.Stats(*profilers, stream=stats_text)
+    stats.dump_stats(base_path + ".prof")
+    stats.sort_stats("cumulative").print_stats(REPORT_TOP_FUNCTIONS)
+    sql_summary = capture.summary()
+    lines = [
+        f"Laufzeit: {duration:.3f}s",
+        f"SQL-Statements: {len(capture.statements)} in "
+        f"{sum(item[2] for item in sql_summary):.3f}s",
+        "",
+        "== Schwerpunkte ==",
+        *_focus_lines(stats),
+        "",
+        "== SQL nach Gesamtzeit ==",
+        *(
+            f"{total:10.3f}s {count:8d}x  {statement[:200]}"
+            for statement, count, total in sql_summary[:REPORT_TOP_STATEMENTS]
+        ),
+        "",
+        f"== N+1 Kandidaten (ab {N_PLUS_ONE_THRESHOLD} Wiederholungen in Folge) ==",
+        *(
+            f"{count:8d}x  {statement[:200]}"
+            for statement, count in capture.n_plus_one_candidates()
+        ),
+        "",
+        "== cProfile ==",
+        stats_text.getvalue(),
+    ]
+    with open(base_path + ".txt", "w", encoding="utf-8") as report_file:
+        report_file.write("\n".join(lines))
+    return base_path + ".txt"
+
+
+def profiled(
+    job: Callable, engine: sqlalchemy.engine.Engine, report_dir: str, runs: int = 1
+) -> Callable:
+    """
+    Wrap a job so that its next runs are profiled. Every run writes its own report. Before
+    Python 3.12 cProfile only sees its own thread, so threads started during the run get their
+    own profiler which is merged into the report.
+    :param job: Job of the scheduler
+    :param engine: Engine of the database for the SQL capture
+    :param report_dir: Directory of the reports
+    :param runs: Number of runs to profile, later runs are not profiled
+    :return: Wrapped job
+    """
+    remaining_runs = [runs]
+
+    @functools.wraps(job)
+    def wrapper(*args, **kwargs):
+        if remaining_runs[0] <= 0:
+            return job(*args, **kwargs)
+        remaining_runs[0] -= 1
+        profilers = [cProfile.Profile()]
+
+        def profile_thread(*_):
+            thread_profiler = cProfile.Profile()
+            profilers.append(thread_profiler)
+            thread_profiler.enable()
+
+        start = time.perf_counter()
+        with SQLCapture(engine) as capture:
+            if sys.version_info < (3, 12):
+                threading.setprofile(profile_thread)
+            profilers[0].enable()
+            try:
+                return job(*args, **kwargs)
+            finally:
+                profilers[0].disable()
+                threading.setprofile(None)
+                report_path = write_report(
+                    profilers, capture, report_dir, time.perf_counter() - start
+                )
+                print(f"Profil des Laufs gespeichert unter {report_path}")
+
+    return wrapper
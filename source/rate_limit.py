@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client side rate limiting of the twitter api. Every endpoint gets its own token bucket which is
+synchronized with the rate limit headers of the responses.
+"""
+import functools
+import threading
+import time
+import tweepy
+from source import resilience
+from source.metrics import METRICS
+
+RATE_LIMIT_WINDOW = 15 * 60
+RATE_LIMIT_RETRIES = 3
+ENDPOINT_RATE_LIMITS = {
+    "verify_credentials": 75,
+    "get_direct_messages": 15,
+    "lookup_statuses": 900,
+    "get_status": 900,
+    "lookup_users": 900,
+    "delete_direct_message": 300,
+}
+ENDPOINT_PATHS = {
+    "account/verify_credentials.json": "verify_credentials",
+    "direct_messages/events/list.json": "get_direct_messages",
+    "statuses/lookup.json": "lookup_statuses",
+    "statuses/show.json": "get_status",
+    "users/lookup.json": "lookup_users",
+    "direct_messages/events/destroy.json": "delete_direct_message",
+}
+
+
+class RateLimitDeadlineError(Exception):
+    """Raised when the next token of an endpoint is only available after the deadline of the run"""
+
+    def __init__(self, wait_time: float):
+        super().__init__(
+            f"Rate-Limit erlaubt die nächste Anfrage erst in {wait_time:.0f}s, "
+            f"nach dem Ende des Zeitbudgets"
+        )
+        self.wait_time = wait_time
+
+
+class TokenBucket:
+    """
+    Request budget of one api endpoint. Without information from the api the tokens refill
+    continuously over the rate limit window. After a response the bucket is synchronized with
+    the rate limit headers and refills completely at the announced reset time.
+    """
+
+    def __init__(self, capacity: int, window: float = RATE_LIMIT_WINDOW):
+        self.capacity = capacity
+        self.window = window
+        self.tokens = float(capacity)
+        self.reset_at = None
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.reset_at is not None:
+            if now >= self.reset_at:
+                self.tokens = float(self.capacity)
+                self.reset_at = None
+        else:
+            self.tokens = min(
+                float(self.capacity),
+                self.tokens + (now - self.updated) * self.capacity / self.window,
+            )
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available.
+        :return: 0 if a token was taken, otherwise the seconds until the next token
+        """
+        with self.lock:
+            now = time.time()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            if self.reset_at is not None:
+                return max(self.reset_at - now, 0.0)
+            return (1 - self.tokens) * self.window / self.capacity
+
+    def acquire(self, deadline: float = None) -> float:
+        """
+        Wait until a token is available and take it. Only the calling thread sleeps. If the
+        token is only available after the deadline, nothing is waited for.
+        :param deadline: Optional time.monotonic() value until which the caller may wait
+        :return: Seconds waited for the token
+        """
+        waited = 0.0
+        while (wait_time := self.try_acquire()) > 0:
+            if deadline is not None and time.monotonic() + wait_time > deadline:
+                raise RateLimitDeadlineError(wait_time)
+            time.sleep(wait_time)
+            waited += wait_time
+        return waited
+
+    def sync(self, limit: int, remaining: int, reset: float) -> None:
+        """
+        Synchronize the bucket with the rate limit headers of a response.
+        :param limit: Number of requests per window
+        :param remaining: Remaining requests in the current window
+        :param reset: Epoch time when the window resets
+        :return: None
+        """
+        with self.lock:
+            self.capacity = limit
+            self.tokens = float(remaining)
+            self.reset_at = reset
+            self.updated = time.time()
+
+    @property
+    def remaining(self) -> int:
+        """Number of requests which can be sent without waiting"""
+        with self.lock:
+            self._refill(time.time())
+            return int(self.tokens)
+
+
+class RateLimitedAPI:  # pylint: disable=too-few-public-methods
+    """
+    Wrapper around tweepy.API with a token bucket per endpoint. The buckets are synchronized with
+    the rate limit headers of every response. A call to an exhausted endpoint waits for its own
+    reset, calls to other endpoints go on, e.g. from other worker threads. Server errors are
+    retried with backoff behind a circuit breaker per endpoint, so a failing endpoint does not
+    block the others. While deadline is set, no call waits for a token beyond it.
+    """
+
+    def __init__(
+        self, api: tweepy.API, rate_limits: dict = None, window: float = RATE_LIMIT_WINDOW
+    ):
+        self.api = api
+        self.deadline = None
+        self.buckets = {
+            endpoint: TokenBucket(limit, window)
+            for endpoint, limit in (rate_limits or ENDPOINT_RATE_LIMITS).items()
+        }
+        self.breakers = {
+            endpoint: resilience.CircuitBreaker(f"twitter {endpoint}")
+            for endpoint in self.buckets
+        }
+        if hasattr(api, "session"):
+            api.session.hooks["response"].append(self._read_rate_limit_headers)
+
+    def _read_rate_limit_headers(self, response, *_, **__):
+        endpoint = next(
+            (
+                name
+                for path, name in ENDPOINT_PATHS.items()
+                if response.url.split("?")[0].endswith(path)
+            ),
+            None,
+        )
+        headers = response.headers
+        if endpoint in self.buckets and "x-rate-limit-remaining" in headers:
+            self.buckets[endpoint].sync(
+                int(headers["x-rate-limit-limit"]),
+                int(headers["x-rate-limit-remaining"]),
+                float(headers["x-rate-limit-reset"]),
+            )
+        return response
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.api, name)
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            return attribute
+        breaker = self.breakers[name]
+
+        @functools.wraps(attribute)
+        def limited_call(*args, **kwargs):
+            for attempt in range(RATE_LIMIT_RETRIES):
+                METRICS.observe(
+                    "twitterbot_rate_limit_wait_seconds",
+                    bucket.acquire(self.deadline),
+                    endpoint=name,
+                )
+                METRICS.inc("twitterbot_api_calls_total", endpoint=name)
+                try:
+                    with METRICS.timer("twitterbot_api_call_seconds", endpoint=name):
+                        return resilience.retry_call(
+                            attribute,
+                            *args,
+                            retry_on=(tweepy.errors.TwitterServerError,),
+                            breaker=breaker,
+                            **kwargs,
+                        )
+                except tweepy.TooManyRequests:
+                    if attempt == RATE_LIMIT_RETRIES - 1:
+                        raise
+                    with bucket.lock:
+                        bucket.tokens = 0.0
+                        if bucket.reset_at is None:
+                            bucket.reset_at = time.time() + bucket.window
+            return None
+
+        return limited_call
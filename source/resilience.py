@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared resilience functions for database and twitter api calls: retry with jittered exponential
+backoff and a circuit breaker which pauses a failing dependency for a while.
+"""
+import functools
+import random
+import threading
+import time
+
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit of the dependency is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} ist offen, erneuter Versuch in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one dependency. After failure_threshold failures in a row the circuit
+    opens and all calls are refused for reset_timeout seconds. Then a single trial call is
+    allowed, its result closes or opens the circuit again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the next trial call is allowed.
+        :return: 0 if the circuit is closed or a trial is possible
+        """
+        with self.lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """
+        Check if a call may be sent. An open circuit changes to half open after the reset
+        timeout and lets exactly one trial call through.
+        :return: True if the call may be sent
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if (
+                self.state == OPEN
+                and time.monotonic() >= self.opened_at + self.reset_timeout
+            ):
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """
+        Close the circuit after a successful call.
+        :return: None
+        """
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """
+        Count a failed call and open the circuit at the threshold or after a failed trial.
+        :return: None
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"Circuit {self.name} geöffnet nach {self.failures} Fehlern.")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """
+        End a trial call which neither succeeded nor failed with a transient error, e.g. because
+        it raised a permanent error of the dependency. The circuit goes back to open without a
+        new reset timeout, so the next call is a trial again.
+        :return: None
+        """
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def wait(self) -> None:
+        """
+        Sleep until the next trial call is allowed, without polling the dependency.
+        :return: None
+        """
+        time.sleep(self.retry_after())
+
+
+def backoff_delay(
+    attempt: int, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY
+) -> float:
+    """
+    Exponential backoff with full jitter.
+    :param attempt: Number of the failed attempt, starting with 0
+    :param base_delay: Delay of the first retry in seconds
+    :param max_delay: Upper limit of the delay in seconds
+    :return: Random delay in seconds
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def retry_call(  # pylint: disable=too-many-arguments
+    func,
+    *args,
+    retry_on: tuple = (),
+    attempts: int = RETRY_ATTEMPTS,
+    base_delay: float = RETRY_BASE_DELAY,
+    max_delay: float = RETRY_MAX_DELAY,
+    breaker: CircuitBreaker = None,
+    **kwargs,
+):
+    """
+    Call a function and retry it on transient errors with jittered exponential backoff. Only
+    idempotent operations may be retried. With a circuit breaker every failure is counted and
+    no call is sent while the circuit is open. Other errors end a trial call of the breaker and
+    are raised unchanged.
+    :param func: Function to call
+    :param retry_on: Exception types which are transient
+    :param attempts: Maximum number of calls
+    :param base_delay: Delay of the first retry in seconds
+    :param max_delay: Upper limit of the delay in seconds
+    :param breaker: Optional circuit breaker of the dependency
+    :return: Return value of the function
+    """
+    for attempt in range(attempts):
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(breaker.name, breaker.retry_after())
+        try:
+            result = func(*args, **kwargs)
+        except retry_on:
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+            continue
+        except BaseException:
+            if breaker is not None:
+                breaker.release_trial()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+    return None
+
+
+def retry(retry_on: tuple, breaker: CircuitBreaker = None, **retry_arguments):
+    """
+    Decorator version of retry_call.
+    :param retry_on: Exception types which are transient
+    :param breaker: Optional circuit breaker of the dependency
+    :param retry_arguments: Further arguments for retry_call, e.g. attempts
+    :return: Decorator
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return retry_call(
+                func,
+                *args,
+                retry_on=retry_on,
+                breaker=breaker,
+                **retry_arguments,
+                **kwargs,
+            )
+
+        return wrapper
+
+    return decorator
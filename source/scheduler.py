@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adaptive scheduler for the regular handler runs. The scheduler sleeps until the next run is due
+and adapts the interval to the number of messages of the last run and the remaining rate limit
+budget. Runs never overlap and get a wall clock budget.
+"""
+import os
+import threading
+import time
+import traceback
+from collections.abc import Callable
+
+BUSY_RUN_MESSAGES = 50
+LOW_BUDGET_FRACTION = 0.2
+SPEED_UP_FACTOR = 0.5
+SLOW_DOWN_FACTOR = 1.5
+
+
+class AdaptiveScheduler:
+    """
+    Run a job again and again with an interval between min_interval and max_interval seconds.
+    The job gets the deadline of its run and returns a dictionary with the number of handled
+    messages and the remaining rate limit budget as fraction.
+    """
+
+    def __init__(
+        self,
+        job: Callable,
+        min_interval: float,
+        max_interval: float,
+        run_budget: float,
+    ):
+        self.job = job
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.run_budget = run_budget
+        self.interval = min_interval
+        self.next_run = time.monotonic()
+        self.stop_event = threading.Event()
+
+    def next_interval(self, run_result: dict) -> float:
+        """
+        Calculate the interval until the next run. Busy runs shorten the interval, empty runs
+        and a low rate limit budget stretch it.
+        :param run_result: Dictionary with messages and rate_limit_remaining of the last run
+        :return: Interval in seconds
+        """
+        interval = self.interval
+        if run_result.get("messages", 0) >= BUSY_RUN_MESSAGES:
+            interval *= SPEED_UP_FACTOR
+        elif run_result.get("messages", 0) == 0:
+            interval *= SLOW_DOWN_FACTOR
+        if run_result.get("rate_limit_remaining", 1.0) < LOW_BUDGET_FRACTION:
+            interval = max(interval * SLOW_DOWN_FACTOR, self.max_interval / 2)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def run_once(self) -> dict:
+        """
+        Run the job with a deadline.
+        :return: Result of the job
+        """
+        return self.job(deadline=time.monotonic() + self.run_budget) or {}
+
+    def run_forever(self) -> None:
+        """
+        Sleep until the next run is due, run the job and plan the next run until stop is called.
+        The runs are started one after another from this loop, so they never overlap. A run
+        which fails with an unexpected error is logged and the next run keeps the interval.
+        :return: None
+        """
+        while not self.stop_event.is_set():
+            if self.stop_event.wait(max(self.next_run - time.monotonic(), 0)):
+                return
+            try:
+                run_result = self.run_once()
+            except Exception:  # pylint: disable=broad-exception-caught
+                print("Lauf mit unerwartetem Fehler abgebrochen, nächster Lauf folgt.")
+                traceback.print_exc()
+            else:
+                self.interval = self.next_interval(run_result)
+                print(
+                    f"Lauf beendet mit {run_result.get('messages', 0)} Nachrichten, "
+                    f"nächster Lauf in {self.interval:.0f}s."
+                )
+            self.next_run = time.monotonic() + self.interval
+
+    def stop(self) -> None:
+        """
+        Wake up the scheduler and end run_forever.
+        :return: None
+        """
+        self.stop_event.set()
+
+
+def read_positive_number(
+    environment_data: dict, name: str, default: str, number_type: type = int
+) -> None:
+    """
+    Read an optional env variable with a positive number, e.g. an interval of the scheduler,
+    into the environment data.
+    :param environment_data: Dictionary with app information
+    :param name: Name of the env variable
+    :param default: Default value if the variable is not defined
+    :param number_type: int or float
+    :return: None
+    """
+    try:
+        environment_data[name] = number_type(os.getenv(name, default))
+        if environment_data[name] <= 0:
+            raise ValueError
+    except ValueError:
+        environment_data["all_verified"] &= False
+        print(f"Env variable >{name}< must be a positive number.")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tags and marked terms of the comments and a multi-pattern matcher for tweet texts. Comments
+consist of short tags like "hetze bodyshaming", additionally reporters mark the problematic
+word of a tweet as ?WORT?. All marked terms are compiled into one Aho-Corasick automaton, which
+finds every term in a text in a single pass over the text, no matter how many terms are known.
+"""
+import re
+from collections import Counter, deque
+from collections.abc import Iterable, Iterator
+
+MARKED_TERM_PATTERN = re.compile(r"\?(\w[\w-]*)\?")
+TAG_PATTERN = re.compile(r"\w[\w-]*")
+SEARCH_TOKEN_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+MAX_TERM_LENGTH = 100
+
+
+def extract_marked_terms(comment: str) -> list:
+    """
+    Extract all terms marked as ?WORT? from a comment.
+    :param comment: Comment of the reporter
+    :return: List with the lowercase terms without duplicates, in the order of the comment
+    """
+    terms = []
+    for match in MARKED_TERM_PATTERN.finditer(comment or ""):
+        term = match.group(1).lower()[:MAX_TERM_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def tokenize_comment(comment: str) -> list:
+    """
+    Split a comment into tags. Marked terms are not tags, they are extracted separately.
+    :param comment: Comment of the reporter, e.g. "hetze bodyshaming ?wort?"
+    :return: List with the lowercase tags without duplicates, in the order of the comment
+    """
+    tags = []
+    for tag in TAG_PATTERN.findall(MARKED_TERM_PATTERN.sub(" ", comment or "").lower()):
+        tag = tag[:MAX_TERM_LENGTH]
+        if tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def parse_search_query(query: str) -> list:
+    """
+    Split a search query into phrases. Text in double quotes is one phrase, every other word is
+    a phrase of its own and a trailing * marks it as prefix. Only word characters are kept, so
+    the phrases can be passed safely to every full-text syntax.
+    :param query: Search query, e.g. "hetze gegen" idiot*
+    :return: List of tuples with the words of the phrase and the prefix flag
+    """
+    phrases = []
+    for quoted, word in SEARCH_TOKEN_PATTERN.findall(query or ""):
+        words = tuple(re.findall(r"\w+", (quoted or word).lower()))
+        if words:
+            phrases.append((words, not quoted and word.endswith("*")))
+    return phrases
+
+
+def _is_word_character(character: str) -> bool:
+    return character.isalnum() or character == "_"
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over lowercase terms. The states are stored as lists, the goto
+    function of every state is a dictionary from character to next state.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for term in terms:
+            self._add(term.lower())
+        self._build_fail_links()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _add(self, term: str) -> None:
+        if not term or term in self.terms:
+            return
+        state = 0
+        for character in term:
+            if character not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[state][character] = len(self.goto) - 1
+            state = self.goto[state][character]
+        self.output[state] += (len(self.terms),)
+        self.terms.append(term)
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(character, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def iter_matches(self, text: str, whole_words: bool = True) -> Iterator[tuple]:
+        """
+        Find all occurrences of the terms in a text.
+        :param text: Text to scan, it is compared in lowercase
+        :param whole_words: Skip occurrences which are part of a longer word
+        :return: Generator of tuples with start position and term
+        """
+        text = text.lower()
+        state = 0
+        for position, character in enumerate(text):
+            while state and character not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(character, 0)
+            for term_index in self.output[state]:
+                term = self.terms[term_index]
+                start = position - len(term) + 1
+                if whole_words and (
+                    (start > 0 and _is_word_character(text[start - 1]))
+                    or (position + 1 < len(text) and _is_word_character(text[position + 1]))
+                ):
+                    continue
+                yield start, term
+
+    def count_terms(self, text: str, whole_words: bool = True) -> Counter:
+        """
+        Count how often every term occurs in a text.
+        :param text: Text to scan
+        :param whole_words: Skip occurrences which are part of a longer word
+        :return: Counter term to number of occurrences
+        """
+        return Counter(term for _, term in self.iter_matches(text, whole_words))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Durable local work queue between fetching direct messages and writing them to the database. The
+queue is a SQLite file in WAL mode, so fetched messages survive a crash or a database outage.
+An entry moves from pending to leased while a writer works on it, to stored after the database
+commit and is removed once the direct message is deleted.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+LEASED = "leased"
+STORED = "stored"
+
+
+class WorkQueue:
+    """
+    Queue of parsed direct messages, identified by the message id. Enqueuing the same message
+    twice keeps the first entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "message_id TEXT PRIMARY KEY, "
+                "payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "enqueued_at REAL NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_messages_status_enqueued_at "
+                "ON messages (status, enqueued_at)"
+            )
+
+    def _set_status(self, message_ids: list, status: str, attempt: bool = False) -> None:
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "UPDATE messages SET status = ?, updated_at = ?, attempts = attempts + ? "
+                "WHERE message_id = ?",
+                [(status, time.time(), int(attempt), message_id) for message_id in message_ids],
+            )
+
+    def enqueue(self, entries: list, status: str = PENDING) -> None:
+        """
+        Store parsed messages durable on disk.
+        :param entries: List with dictionaries, each with at least a message_id
+        :param status: PENDING for messages to write, STORED for messages which only have to
+        be deleted
+        :return: None
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO messages "
+                "(message_id, payload, status, enqueued_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (str(entry["message_id"]), json.dumps(entry), status, now, now)
+                    for entry in entries
+                ],
+            )
+
+    def lease(self, limit: int) -> list:
+        """
+        Take the oldest pending entries for a writer.
+        :param limit: Maximum number of entries
+        :return: List with the parsed messages
+        """
+        with self.lock, self.connection:
+            rows = self.connection.execute(
+                "SELECT message_id, payload FROM messages WHERE status = ? "
+                "ORDER BY enqueued_at LIMIT ?",
+                (PENDING, limit),
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE messages SET status = ?, updated_at = ? WHERE message_id = ?",
+                [(LEASED, time.time(), message_id) for message_id, _ in rows],
+            )
+        return [json.loads(payload) for _, payload in rows]
+
+    def acknowledge(self, message_ids: list) -> None:
+        """
+        Mark entries as committed to the database, their direct messages can be deleted.
+        :param message_ids: IDs of the committed messages
+        :return: None
+        """
+        self._set_status([str(message_id) for message_id in message_ids], STORED)
+
+    def release(self, message_ids: list) -> None:
+        """
+        Give leased entries back after a failed write, they are written again later.
+        :param message_ids: IDs of the messages
+        :return: None
+        """
+        self._set_status([str(message_id) for message_id in message_ids], PENDING, True)
+
+    def stored(self, limit: int) -> list:
+        """
+        Return committed entries whose direct messages are not deleted yet.
+        :param limit: Maximum number of entries
+        :return: List with message ids
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT message_id FROM messages WHERE status = ? "
+                "ORDER BY enqueued_at LIMIT ?",
+                (STORED, limit),
+            ).fetchall()
+        return [message_id for message_id, in rows]
+
+    def remove(self, message_ids: list) -> None:
+        """
+        Remove entries after their direct messages are deleted.
+        :param message_ids: IDs of the messages
+        :return: None
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM messages WHERE message_id = ?",
+                [(str(message_id),) for message_id in message_ids],
+            )
+
+    def recover(self) -> None:
+        """
+        Put entries back to pending which were leased by a writer of a crashed run.
+        :return: None
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE messages SET status = ? WHERE status = ?", (PENDING, LEASED)
+            )
+
+    def count(self, status: str) -> int:
+        """
+        Number of entries with the status.
+        :param status: PENDING, LEASED or STORED
+        :return: Number of entries
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM messages WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Close the connection to the queue file.
+        :return: None
+        """
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Temporary SQLite database for the tests which need the db package
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from source import db
+
+
+def open_temporary_database(file_name: str) -> tuple:
+    """
+    Point the db package to a new SQLite file in a temporary directory and create the tables.
+    :param file_name: Name of the database file
+    :return: Tuple with the temporary directory and the previous connector
+    """
+    directory = tempfile.mkdtemp()
+    connector = db.CONNECTOR
+    db.CONNECTOR = "sqlite:///" + os.path.join(directory, file_name)
+    db.reset_identity_cache()
+    db.KNOWN_TWEET_IDS.clear()
+    db.init()
+    return directory, connector
+
+
+def close_temporary_database(directory: str, connector: str) -> None:
+    """
+    Close the temporary database, restore the previous connector and remove the directory.
+    :param directory: Temporary directory of open_temporary_database
+    :param connector: Previous connector of open_temporary_database
+    :return: None
+    """
+    db.dispose_engine(db.CONNECTOR)
+    db.CONNECTOR = connector
+    db.reset_identity_cache()
+    db.KNOWN_TWEET_IDS.clear()
+    shutil.rmtree(directory)
+
+
+class TemporaryDatabaseTest(unittest.TestCase):
+    """
+    Base class for test classes whose tests share one temporary SQLite database
+    """
+    database_name = "test.db"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory, cls.connector = open_temporary_database(cls.database_name)
+
+    @classmethod
+    def tearDownClass(cls):
+        close_temporary_database(cls.directory, cls.connector)
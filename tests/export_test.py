@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the export files in export.py
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from source.export import JsonlWriter, read_exported_tweets
+
+
+class JsonlExportTest(unittest.TestCase):
+    """
+    Unittest class for testing the JSONL export in export.py
+    """
+    def test_je_00_write_and_read_files(self):
+        """
+        Positive test with tweets in two files which are read back in export order
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            for part, tweet_id in enumerate((1, 2)):
+                writer = JsonlWriter(os.path.join(directory, f"tweets_{part:04d}.jsonl.gz"))
+                writer.write({"tweet_id": tweet_id, "comments": ["nlp", "ä"],
+                              "input_timestamp": datetime(2022, 5, 1, 12, 0)})
+                writer.close()
+            tweets = list(read_exported_tweets(directory))
+        self.assertEqual([tweet["tweet_id"] for tweet in tweets], [1, 2],
+                         "Tweets of both files in order expected.")
+        self.assertEqual(tweets[0]["input_timestamp"], "2022-05-01T12:00:00",
+                         "Timestamp as ISO string expected.")
+        self.assertEqual(tweets[0]["comments"], ["nlp", "ä"], "Comments expected.")
+
+    def test_je_01_skip_incomplete_files(self):
+        """
+        Negative test with a file which is still written under its temporary name
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            writer = JsonlWriter(os.path.join(directory, "tweets_0000.jsonl.gz.tmp"))
+            writer.write({"tweet_id": 1})
+            writer.close()
+            self.assertEqual(list(read_exported_tweets(directory)), [],
+                             "No tweets of incomplete files expected.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [JsonlExportTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
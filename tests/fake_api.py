@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test double of the part of tweepy.API which is used by the message handler
+"""
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+import tweepy
+
+
+class FakeResponse:  # pylint: disable=too-few-public-methods
+    """Minimal response for the tweepy exceptions"""
+
+    def __init__(self, status_code: int = 404):
+        self.status_code = status_code
+        self.reason = "Not Found"
+        self.headers = {}
+
+    def json(self) -> dict:
+        """Error payload like the twitter api sends it"""
+        return {"errors": [{"code": self.status_code, "message": self.reason}]}
+
+
+def direct_message(message_id: int, text: str, expanded_url: str) -> SimpleNamespace:
+    """
+    Direct message like tweepy returns it.
+    :param message_id: ID of the message, also used as timestamp in milliseconds
+    :param text: Text of the message
+    :param expanded_url: Expanded url of the only url entity
+    :return: Direct message object
+    """
+    return SimpleNamespace(
+        id=str(message_id),
+        created_timestamp=str(message_id),
+        message_create={
+            "sender_id": "4711",
+            "message_data": {
+                "text": text,
+                "entities": {"urls": [{"url": "https://t.co/x", "expanded_url": expanded_url}]},
+            },
+        },
+    )
+
+
+def user(user_id: int, screen_name: str, name: str = "Name") -> SimpleNamespace:
+    """
+    Twitter user like tweepy returns it.
+    :param user_id: Twitter user id
+    :param screen_name: Screen name of the user
+    :param name: Display name of the user
+    :return: User object
+    """
+    return SimpleNamespace(id=user_id, name=name, screen_name=screen_name)
+
+
+def status(tweet_id: int, author: SimpleNamespace, text: str = "Text") -> SimpleNamespace:
+    """
+    Tweet like tweepy returns it.
+    :param tweet_id: ID of the tweet
+    :param author: User object of the author
+    :param text: Text of the tweet
+    :return: Status object
+    """
+    return SimpleNamespace(
+        id=tweet_id, text=text, created_at=datetime(2022, 5, 1, 12, 0), user=author
+    )
+
+
+class FakeAPI:
+    """
+    Fake of tweepy.API with fixed direct messages, tweets and users. All calls are recorded
+    with their arguments in calls.
+    """
+
+    def __init__(self, messages: list = (), statuses: list = (), users: list = ()):
+        self.messages = list(messages)
+        self.statuses = {item.id: item for item in statuses}
+        self.users = {item.screen_name.lower(): item for item in users}
+        self.deleted_messages = set()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _record(self, endpoint: str, argument=None) -> None:
+        with self.lock:
+            self.calls.append((endpoint, argument))
+
+    def calls_of(self, endpoint: str) -> list:
+        """
+        Arguments of all calls of an endpoint.
+        :param endpoint: Name of the api method
+        :return: List with the arguments in call order
+        """
+        with self.lock:
+            return [argument for name, argument in self.calls if name == endpoint]
+
+    def verify_credentials(self, **_) -> SimpleNamespace:
+        """Always valid credentials"""
+        self._record("verify_credentials")
+        return user(4711, "TTueftler")
+
+    def get_direct_messages(self, *, count: int = 20, cursor=None, **kwargs):
+        """Messages in the given order, the cursor is the index of the next message"""
+        self._record("get_direct_messages", cursor)
+        start = 0 if cursor in (None, -1) else int(cursor)
+        with self.lock:
+            remaining = [
+                message for message in self.messages
+                if int(message.id) not in self.deleted_messages
+            ]
+        page = remaining[start:start + count]
+        next_cursor = str(start + count) if start + count < len(remaining) else -1
+        if kwargs.get("return_cursors") or kwargs.get("return_cursor"):
+            return page, next_cursor
+        return page
+
+    get_direct_messages.pagination_mode = "dm_cursor"
+
+    def lookup_statuses(self, tweet_ids: list, **_) -> list:
+        """Known tweets of the ids"""
+        self._record("lookup_statuses", list(tweet_ids))
+        return [self.statuses[int(tweet_id)] for tweet_id in tweet_ids
+                if int(tweet_id) in self.statuses]
+
+    def get_status(self, tweet_id, **_) -> SimpleNamespace:
+        """Known tweet or NotFound"""
+        self._record("get_status", tweet_id)
+        if int(tweet_id) not in self.statuses:
+            raise tweepy.NotFound(FakeResponse())
+        return self.statuses[int(tweet_id)]
+
+    def lookup_users(self, *, screen_name: list, **_) -> list:
+        """Known users of the screen names, NotFound if none of them is known"""
+        self._record("lookup_users", list(screen_name))
+        found = [self.users[name.lower()] for name in screen_name if name.lower() in self.users]
+        if not found:
+            raise tweepy.NotFound(FakeResponse())
+        return found
+
+    def delete_direct_message(self, message_id) -> None:
+        """Remove the message from later pages"""
+        self._record("delete_direct_message", int(message_id))
+        with self.lock:
+            self.deleted_messages.add(int(message_id))
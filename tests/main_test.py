@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the tweet analysis in main.py
+"""
+import unittest
+from unittest import mock
+from source.main import analyze_tweet, analyze_chunk, check_and_verify_env_variables
+
+
+class AnalyzeTweet(unittest.TestCase):
+    """
+    Unittest class for testing the function analyze_tweet in main.py
+    """
+    def test_at_00_count_tokens(self):
+        """
+        Positive test with words, hashtag, mention and url in one tweet
+        """
+        result = analyze_tweet(7, "Analyse der Analyse #NLP mit @user https://t.co/abc")
+        self.assertEqual(result["tweet_id"], 7, "Primary key of the tweet expected.")
+        self.assertEqual(result["word_count"], 4, "Four words without hashtag, mention, url.")
+        self.assertEqual((result["hashtag_count"], result["mention_count"],
+                          result["url_count"]), (1, 1, 1), "One of each expected.")
+        self.assertEqual(result["keywords"].split()[0], "analyse",
+                         "Most frequent word as first keyword.")
+
+    def test_at_01_empty_text(self):
+        """
+        Negative test with a tweet without text
+        """
+        result = analyze_tweet(1, "")
+        self.assertEqual(result["word_count"], 0, "No words expected.")
+        self.assertEqual(result["keywords"], "", "No keywords expected.")
+
+    def test_at_02_analyze_chunk(self):
+        """
+        Positive test with a chunk of tweets in the order of the input
+        """
+        results = analyze_chunk([(1, "erster Tweet"), (2, "zweiter Tweet")])
+        self.assertEqual([result["tweet_id"] for result in results], [1, 2],
+                         "Results in the order of the tweets expected.")
+
+
+class CheckEnvVariablesTest(unittest.TestCase):
+    """
+    Unittest class for testing the function check_and_verify_env_variables in main.py
+    """
+    def test_ce_00_defaults(self):
+        """
+        Positive test without env variables, the defaults are used
+        """
+        with mock.patch.dict("os.environ", {}, clear=True):
+            env_data = check_and_verify_env_variables()
+        self.assertTrue(env_data["all_verified"], "Defaults are valid.")
+        self.assertEqual((env_data["analysis_min_interval"], env_data["analysis_max_interval"]),
+                         (300.0, 3600.0), "Default intervals expected.")
+
+    def test_ce_01_invalid_values(self):
+        """
+        Negative test with a worker count which is no number and swapped intervals
+        """
+        for variables in ({"analysis_workers": "viele"}, {"analysis_workers": "0"},
+                          {"analysis_min_interval": "600", "analysis_max_interval": "60"}):
+            with mock.patch.dict("os.environ", variables, clear=True):
+                self.assertFalse(check_and_verify_env_variables()["all_verified"],
+                                 f"Invalid env variables {variables}.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [AnalyzeTweet, CheckEnvVariablesTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
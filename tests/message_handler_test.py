@@ -3,8 +3,18 @@
 """
 File for testing the message handling functions in message_handler.py
 """
+import os
+import shutil
+import tempfile
+import time
 import unittest
 from source.message_handler import analyze_message, decompose_tweet_url, extract_expand_url
+from source.message_handler import COMMANDS, ParsedMessage, decompose_user_url
+from source import message_handler
+from source.work_queue import WorkQueue
+from source import db
+from tests.database_fixture import TemporaryDatabaseTest
+from tests.fake_api import FakeAPI, direct_message, status, user
 
 
 class AnalyzeMessageTest(unittest.TestCase):
@@ -223,11 +233,339 @@ class ExtractExpandUrl(unittest.TestCase):
                          "Dictionary has changed and list is not available.")
 
 
+class CommandRouterTest(unittest.TestCase):
+    """
+    Unittest class for testing the command dispatcher COMMANDS in message_handler.py
+    """
+    def test_cr_00_tweet_command(self):
+        """
+        Positive test with the tweet command
+        """
+        self.assertEqual(COMMANDS.parse("#tweet hetze https://t.co/0815"),
+                         ParsedMessage("tweet", "hetze", "https://t.co/0815"),
+                         "Tweet command with message and url expected.")
+
+    def test_cr_01_user_command(self):
+        """
+        Positive test with the user command without hash sign
+        """
+        self.assertEqual(COMMANDS.parse("user account https://t.co/0815"),
+                         ParsedMessage("user", "account", "https://t.co/0815"),
+                         "User command with message and url expected.")
+
+    def test_cr_02_unknown_command(self):
+        """
+        Negative test with a command which is not registered
+        """
+        self.assertIsNone(COMMANDS.parse("#foo hetze https://t.co/0815"),
+                          "No match expected because command is unknown.")
+
+
+class DecomposeUserUrl(unittest.TestCase):
+    """
+    Unittest class for testing the function decompose_user_url in message_handler.py
+    """
+    def test_duu_00_correct_request(self):
+        """
+        Positive test with correct profile url
+        """
+        self.assertEqual(decompose_user_url("https://twitter.com/user0815"),
+                         {"found_match": True, "twitter_user_name": "user0815"},
+                         "Match found expected with user name.")
+
+    def test_duu_01_tweet_url(self):
+        """
+        Negative test with a tweet url instead of a profile url
+        """
+        self.assertEqual(decompose_user_url("https://twitter.com/user0815/status/0815"),
+                         {"found_match": False, "twitter_user_name": None},
+                         "No match expected because url points to a tweet.")
+
+
+class TwitterMessageTest(unittest.TestCase):
+    """
+    Unittest class for testing the compact record TwitterMessage in message_handler.py
+    """
+    def test_tm_00_from_direct_message(self):
+        """
+        Positive test with a direct message which is reduced to the needed fields
+        """
+        direct = direct_message(1650000000000, "#bot hetze https://t.co/x",
+                                "https://twitter.com/user0815/status/4711")
+        message = message_handler.TwitterMessage.from_direct_message(
+            direct, COMMANDS.parse("#bot hetze https://t.co/x"))
+        self.assertEqual(message, message_handler.TwitterMessage(
+            message_id=1650000000000, message_timestamp=1650000000000, sender_id=4711,
+            command="bot", comment="hetze",
+            expand_url="https://twitter.com/user0815/status/4711", tweet_id=4711,
+            twitter_user_name="user0815"), "Only the parsed fields expected.")
+        self.assertFalse(hasattr(message, "__dict__"), "Record without instance dictionary.")
+
+    def test_tm_01_no_tweet_url(self):
+        """
+        Negative test with a direct message whose url is no tweet url
+        """
+        direct = direct_message(1, "#user account https://t.co/x", "https://twitter.com/user0815")
+        message = message_handler.TwitterMessage.from_direct_message(
+            direct, COMMANDS.parse("#user account https://t.co/x"))
+        self.assertEqual((message.tweet_id, message.twitter_user_name), (None, None),
+                         "No tweet id without tweet url.")
+
+
+class GetNewDirectMessagesTest(unittest.TestCase):
+    """
+    Unittest class for testing the function get_new_direct_messages in message_handler.py
+    """
+    def setUp(self):
+        self.max_pages = message_handler.MAX_PAGES
+        message_handler.MAX_PAGES = 2
+
+    def tearDown(self):
+        message_handler.MAX_PAGES = self.max_pages
+
+    def _fetch(self, message_count: int) -> tuple:
+        checkpoint = {"last_message_id": None, "last_message_timestamp": None}
+        api = FakeAPI(direct_message(message_id, "#bot hetze https://t.co/x",
+                                     "https://twitter.com/user/status/1")
+                      for message_id in range(message_count, 0, -1))
+        messages = list(message_handler.get_new_direct_messages(api, checkpoint))
+        return messages, checkpoint
+
+    def test_gndm_00_all_pages_read(self):
+        """
+        Positive test with a backlog below the page limit
+        """
+        messages, checkpoint = self._fetch(message_handler.MAX_TWEETS_PER_PAGE + 10)
+        self.assertEqual(len(messages), message_handler.MAX_TWEETS_PER_PAGE + 10,
+                         "All messages expected.")
+        self.assertTrue(checkpoint["complete"], "Checkpoint may move.")
+
+    def test_gndm_01_page_limit_reached(self):
+        """
+        Negative test with a backlog above the page limit
+        """
+        messages, checkpoint = self._fetch(3 * message_handler.MAX_TWEETS_PER_PAGE)
+        self.assertEqual(len(messages), 2 * message_handler.MAX_TWEETS_PER_PAGE,
+                         "Only the messages of the first two pages expected.")
+        self.assertFalse(checkpoint["complete"], "Checkpoint must not move.")
+
+
+class RemainingTimeTest(unittest.TestCase):
+    """
+    Unittest class for testing the function remaining_time in message_handler.py
+    """
+    def test_rt_00_wait_capped(self):
+        """
+        Positive test with waits which are capped at the deadline
+        """
+        self.assertEqual(message_handler.remaining_time(None, 30), 30, "No deadline, no cap.")
+        self.assertLessEqual(message_handler.remaining_time(time.monotonic() + 5, 30), 5,
+                             "Wait capped at the deadline.")
+        self.assertEqual(message_handler.remaining_time(time.monotonic() - 5, 30), 0,
+                         "No wait after the deadline.")
+
+
+class GetTweetStatusesTest(unittest.TestCase):
+    """
+    Unittest class for testing the function get_tweet_statuses in message_handler.py
+    """
+    def test_gts_00_chunked_lookup(self):
+        """
+        Positive test with more tweets than one lookup request can hydrate
+        """
+        author = user(1, "user0815")
+        tweet_ids = list(range(1, 251))
+        api = FakeAPI(statuses=[status(tweet_id, author) for tweet_id in tweet_ids[:-1]])
+        tweet_statuses = message_handler.get_tweet_statuses(api, tweet_ids + tweet_ids[:10])
+        self.assertEqual([len(ids) for ids in api.calls_of("lookup_statuses")], [100, 100, 50],
+                         "One lookup per 100 unique tweet ids expected.")
+        self.assertEqual(api.calls_of("get_status"), [], "No single tweet requests expected.")
+        self.assertEqual(len(tweet_statuses), 249, "All visible tweets expected.")
+        self.assertNotIn(250, tweet_statuses, "Deleted tweet must be missing.")
+        self.assertEqual(tweet_statuses[1]["author_user_screen_name"], "user0815",
+                         "Author information expected.")
+
+
+class RunPipelineTest(TemporaryDatabaseTest):
+    """
+    Unittest class for testing the function run_pipeline in message_handler.py
+    """
+    database_name = "pipeline.db"
+
+    def test_rp_00_unknown_url_rejected(self):
+        """
+        Negative test with a matched message whose url is no tweet url
+        """
+        message = message_handler.TwitterMessage(
+            message_id=4711, message_timestamp=0, sender_id=1, command="bot",
+            comment="hetze", expand_url="https://example.com", tweet_id=None,
+            twitter_user_name=None)
+        api = FakeAPI()
+        with tempfile.TemporaryDirectory() as directory:
+            queue = WorkQueue(os.path.join(directory, "queue.db"))
+            message_count, fetch_complete = message_handler.run_pipeline(api, [message], queue)
+            self.assertEqual(queue.count("stored"), 0, "Nothing left in the queue.")
+            queue.close()
+        self.assertEqual((message_count, fetch_complete), (0, True), "No entry to store.")
+        self.assertEqual(api.deleted_messages, {4711}, "Direct message deleted.")
+        with db.SQLAlchemyConnectionManager() as conn:
+            rejected = conn.session.query(db.RejectedMessage).one()
+            self.assertEqual(
+                (rejected.message_id, rejected.url, rejected.comment, rejected.reason),
+                (4711, "https://example.com", "hetze",
+                 message_handler.REJECTED_URL_NOT_RECOGNIZED),
+                "Content of the deleted message kept as rejected message.")
+
+    def _run_user_messages(self, api: FakeAPI, screen_names: list, first_id: int) -> dict:
+        messages = [
+            message_handler.TwitterMessage(
+                message_id=message_id, message_timestamp=0, sender_id=1, command="user",
+                comment="hetze", expand_url="https://twitter.com/" + screen_name,
+                tweet_id=None, twitter_user_name=None)
+            for message_id, screen_name in enumerate(screen_names, first_id)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            queue = WorkQueue(os.path.join(directory, "queue.db"))
+            message_handler.run_pipeline(api, messages, queue)
+            counts = {status_name: queue.count(status_name)
+                      for status_name in ("pending", "leased", "stored")}
+            queue.close()
+        return counts
+
+    def _rejected_messages(self) -> dict:
+        with db.SQLAlchemyConnectionManager() as conn:
+            return {rejected.message_id: (rejected.url, rejected.reason)
+                    for rejected in conn.session.query(db.RejectedMessage)}
+
+    def test_rp_01_all_users_missing(self):
+        """
+        Negative test with user messages whose users do not exist anymore
+        """
+        api = FakeAPI()
+        counts = self._run_user_messages(api, ["gone0815", "gone4711"], 100)
+        self.assertEqual(counts, {"pending": 0, "leased": 0, "stored": 0},
+                         "No entry may stay in the queue.")
+        self.assertEqual(api.deleted_messages, {100, 101}, "Direct messages deleted.")
+        rejected = self._rejected_messages()
+        self.assertEqual(rejected[100], ("https://twitter.com/gone0815",
+                                         message_handler.REJECTED_USER_NOT_FOUND),
+                         "Missing user kept as rejected message.")
+        self.assertIn(101, rejected, "Missing user kept as rejected message.")
+
+    def test_rp_02_some_users_missing(self):
+        """
+        Positive test with user messages of which only some users exist
+        """
+        api = FakeAPI(users=[user(815, "Found0815")])
+        counts = self._run_user_messages(api, ["found0815", "gone0816"], 200)
+        self.assertEqual(counts, {"pending": 0, "leased": 0, "stored": 0},
+                         "No entry may stay in the queue.")
+        self.assertEqual(api.deleted_messages, {200, 201}, "Direct messages deleted.")
+        self.assertEqual(self._rejected_messages()[201],
+                         ("https://twitter.com/gone0816", message_handler.REJECTED_USER_NOT_FOUND),
+                         "Missing user kept as rejected message.")
+        self.assertNotIn(200, self._rejected_messages(), "Found user is no rejected message.")
+        self.assertEqual([row[2] for row in db.get_user_name_history(815, True).rows],
+                         ["Found0815"], "Found user stored.")
+
+    def test_rp_03_known_deleted_tweet(self):
+        """
+        Negative test with messages about a deleted tweet in one batch and in a later batch,
+        only the first comment is stored with the deleted tweet
+        """
+        entries = [
+            {"message_id": message_id, "command": "bot", "comment": comment,
+             "expand_url": "https://twitter.com/gone/status/9999", "tweet_id": 9999,
+             "twitter_user_name": "gone"}
+            for message_id, comment in ((300, "hetze"), (301, "satire"), (302, "bodyshaming"))
+        ]
+        api = FakeAPI()
+        message_handler.store_tweet_entries(api, entries[:2])
+        message_handler.store_tweet_entries(api, entries[2:])
+        with db.SQLAlchemyConnectionManager() as conn:
+            self.assertEqual(conn.session.query(db.DeletedTweet.comment).one(), ("hetze",),
+                             "First comment stored with the deleted tweet.")
+        rejected = self._rejected_messages()
+        for message_id in (301, 302):
+            self.assertEqual(rejected[message_id][1], message_handler.REJECTED_TWEET_DELETED,
+                             "Later comment kept as rejected message.")
+        self.assertNotIn(300, rejected, "Stored deleted tweet is no rejected message.")
+
+
+def tweet_message(message_id: int, tweet_id: int):
+    """
+    Direct message with a tweet url like a reporter sends it
+    """
+    return direct_message(message_id, "bot hetze https://t.co/x",
+                          f"https://twitter.com/user/status/{tweet_id}")
+
+
+class HandleMessagesTest(TemporaryDatabaseTest):
+    """
+    Unittest class for testing the function handle_messages in message_handler.py
+    """
+    database_name = "handler.db"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue_path = os.path.join(self.directory, "queue.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _stored_tweet_ids(self) -> set:
+        with db.SQLAlchemyConnectionManager() as conn:
+            return {tweet_id for (tweet_id,) in conn.session.query(db.Tweet.tweet_id)}
+
+    def test_hm_00_streamed_in_batches(self):
+        """
+        Positive test with more messages than one lookup, streamed in batches to the database
+        """
+        message_count = message_handler.MAX_TWEETS_PER_LOOKUP + 20
+        author = user(815, "Author")
+        api = FakeAPI(
+            messages=[tweet_message(1000 + number, number)
+                      for number in range(message_count, 0, -1)],
+            statuses=[status(number, author) for number in range(1, message_count + 1)])
+        result = message_handler.handle_messages(api, 2, self.queue_path)
+        self.assertEqual(result["messages"], message_count, "All messages enqueued.")
+        self.assertEqual(self._stored_tweet_ids(), set(range(1, message_count + 1)),
+                         "All tweets stored.")
+        lookups = api.calls_of("lookup_statuses")
+        self.assertGreater(len(lookups), 1, "More than one batch expected.")
+        self.assertTrue(all(len(tweet_ids) <= message_handler.MAX_TWEETS_PER_LOOKUP
+                            for tweet_ids in lookups), "Tweets hydrated in batches.")
+        self.assertEqual(len(api.deleted_messages), message_count, "All messages deleted.")
+
+    def test_hm_01_checkpoint_across_runs(self):
+        """
+        Positive test with a second run in a new process, only messages newer than the
+        checkpoint of the first run are fetched
+        """
+        author = user(816, "Reporter")
+        first_api = FakeAPI(messages=[tweet_message(2001, 501)], statuses=[status(501, author)])
+        message_handler.handle_messages(first_api, 1, self.queue_path)
+        self.assertEqual(db.get_checkpoint(message_handler.CHECKPOINT_NAME)["last_message_id"],
+                         2001, "Checkpoint of the first run stored.")
+        db.dispose_engine()
+        db.KNOWN_TWEET_IDS.clear()
+        second_api = FakeAPI(messages=[tweet_message(2002, 502), tweet_message(2001, 501)],
+                             statuses=[status(501, author), status(502, author)])
+        result = message_handler.handle_messages(second_api, 1, self.queue_path)
+        self.assertEqual(result["messages"], 1, "Only the new message enqueued.")
+        self.assertEqual(second_api.deleted_messages, {2002}, "Only the new message handled.")
+        self.assertEqual(db.get_checkpoint(message_handler.CHECKPOINT_NAME)["last_message_id"],
+                         2002, "Checkpoint moved to the newest message.")
+
+
 def run_some_tests():
     """
     Run function to collect all needed test in a suit and runs
     """
-    test_classes_to_run = [AnalyzeMessageTest, DecomposeTweetUrl, ExtractExpandUrl]
+    test_classes_to_run = [AnalyzeMessageTest, DecomposeTweetUrl, ExtractExpandUrl,
+                           CommandRouterTest, DecomposeUserUrl, TwitterMessageTest,
+                           GetNewDirectMessagesTest, RemainingTimeTest, GetTweetStatusesTest,
+                           RunPipelineTest, HandleMessagesTest]
 
     loader = unittest.TestLoader()
 
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the metrics registry in metrics.py
+"""
+import unittest
+import sqlalchemy
+from source.metrics import METRICS, MetricsRegistry, instrument_engine
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    """
+    Unittest class for testing the class MetricsRegistry in metrics.py
+    """
+    def test_mr_00_counter_with_labels(self):
+        """
+        Positive test with counters which are separated by their labels
+        """
+        registry = MetricsRegistry()
+        registry.inc("calls_total", endpoint="a")
+        registry.inc("calls_total", 2, endpoint="a")
+        registry.inc("calls_total", endpoint="b")
+        self.assertIn('calls_total{endpoint="a"} 3', registry.render_prometheus(),
+                      "Summed counter of endpoint a expected.")
+        self.assertIn('calls_total{endpoint="b"} 1', registry.render_prometheus(),
+                      "Separate counter of endpoint b expected.")
+
+    def test_mr_01_histogram_buckets(self):
+        """
+        Positive test with cumulative buckets, sum and count of a histogram
+        """
+        registry = MetricsRegistry()
+        registry.observe("stage_seconds", 0.002, stage="fetch")
+        registry.observe("stage_seconds", 2.0, stage="fetch")
+        text = registry.render_prometheus()
+        self.assertIn('stage_seconds_bucket{stage="fetch",le="0.005"} 1', text,
+                      "Only the short duration in the small bucket.")
+        self.assertIn('stage_seconds_bucket{stage="fetch",le="+Inf"} 2', text,
+                      "Both durations in the last bucket.")
+        self.assertIn('stage_seconds_count{stage="fetch"} 2', text, "Count of two expected.")
+
+    def test_mr_02_timer_and_snapshot(self):
+        """
+        Positive test with a timer which is part of the JSON snapshot
+        """
+        registry = MetricsRegistry()
+        with registry.timer("stage_seconds", stage="delete"):
+            pass
+        histogram = registry.snapshot()["histograms"][0]
+        self.assertEqual(histogram["labels"], {"stage": "delete"}, "Labels of the timer.")
+        self.assertEqual(histogram["count"], 1, "One measurement expected.")
+
+
+class InstrumentEngineTest(unittest.TestCase):
+    """
+    Unittest class for testing the function instrument_engine in metrics.py
+    """
+    def test_ie_00_queries_counted_once(self):
+        """
+        Positive test with an engine which is instrumented twice
+        """
+        engine = sqlalchemy.create_engine("sqlite://")
+        instrument_engine(engine)
+        instrument_engine(engine)
+        METRICS.clear()
+        with engine.connect() as connection:
+            connection.execute(sqlalchemy.text("SELECT 1"))
+        self.assertIn("twitterbot_sql_queries_total 1", METRICS.render_prometheus(),
+                      "One counted query expected.")
+
+    def test_ie_01_failed_query(self):
+        """
+        Negative test with a failing statement followed by a successful one
+        """
+        engine = sqlalchemy.create_engine("sqlite://")
+        instrument_engine(engine)
+        METRICS.clear()
+        with engine.connect() as connection:
+            with self.assertRaises(sqlalchemy.exc.OperationalError):
+                connection.execute(sqlalchemy.text("SELECT * FROM missing"))
+            connection.execute(sqlalchemy.text("SELECT 1"))
+        text = METRICS.render_prometheus()
+        self.assertIn("twitterbot_sql_errors_total 1", text, "Failed query counted.")
+        self.assertIn("twitterbot_sql_query_seconds_count 1", text,
+                      "Only the successful query measured.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [MetricsRegistryTest, InstrumentEngineTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the SQL capture of the profiling mode in profiling.py
+"""
+import unittest
+from source.profiling import SQLCapture
+
+
+class SQLCaptureTest(unittest.TestCase):
+    """
+    Unittest class for testing the class SQLCapture in profiling.py
+    """
+    def test_sc_00_detect_n_plus_one(self):
+        """
+        Positive test with a statement which is repeated in a row
+        """
+        capture = SQLCapture(None)
+        capture.statements = [("SELECT tweet", 0.01)] * 12 + [("INSERT tweet", 0.02)]
+        self.assertEqual(capture.n_plus_one_candidates(threshold=10), [("SELECT tweet", 12)],
+                         "Repeated select expected as candidate.")
+
+    def test_sc_01_no_n_plus_one_for_alternating_statements(self):
+        """
+        Negative test with statements which are not repeated in a row
+        """
+        capture = SQLCapture(None)
+        capture.statements = [("SELECT tweet", 0.01), ("INSERT tweet", 0.02)] * 10
+        self.assertEqual(capture.n_plus_one_candidates(threshold=10), [],
+                         "No candidate expected.")
+
+    def test_sc_02_summary_sorted_by_total_time(self):
+        """
+        Positive test with statements grouped and sorted by their total time
+        """
+        capture = SQLCapture(None)
+        capture.statements = [("SELECT tweet", 0.5), ("INSERT tweet", 0.2),
+                              ("INSERT tweet", 0.4)]
+        summary = capture.summary()
+        self.assertEqual(summary[0][:2], ("INSERT tweet", 2), "Insert with most time first.")
+        self.assertAlmostEqual(summary[0][2], 0.6)
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [SQLCaptureTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
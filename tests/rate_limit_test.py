@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the client side rate limiting in rate_limit.py
+"""
+import time
+import unittest
+from source.rate_limit import RateLimitDeadlineError, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    """
+    Unittest class for testing the class TokenBucket in rate_limit.py
+    """
+    def test_tb_00_take_available_tokens(self):
+        """
+        Positive test with tokens available in a full bucket
+        """
+        bucket = TokenBucket(2)
+        self.assertEqual(bucket.try_acquire(), 0.0, "First token available.")
+        self.assertEqual(bucket.try_acquire(), 0.0, "Second token available.")
+        self.assertGreater(bucket.try_acquire(), 0.0, "Bucket is empty after two tokens.")
+
+    def test_tb_01_sync_exhausted(self):
+        """
+        Negative test with exhausted budget reported by the rate limit headers
+        """
+        bucket = TokenBucket(15)
+        bucket.sync(15, 0, time.time() + 60)
+        wait_time = bucket.try_acquire()
+        self.assertGreater(wait_time, 50, "Wait until reset of the window expected.")
+        self.assertLessEqual(wait_time, 60, "Wait not longer than the reset time.")
+
+    def test_tb_02_sync_after_reset(self):
+        """
+        Positive test with a reset time in the past refills the bucket
+        """
+        bucket = TokenBucket(15)
+        bucket.sync(15, 0, time.time() - 1)
+        self.assertEqual(bucket.try_acquire(), 0.0, "Token available after reset.")
+        self.assertEqual(bucket.remaining, 14, "Full budget minus one token expected.")
+
+    def test_tb_03_wait_beyond_deadline(self):
+        """
+        Negative test with a reset time after the deadline of the run
+        """
+        bucket = TokenBucket(15)
+        bucket.sync(15, 0, time.time() + 900)
+        started = time.monotonic()
+        with self.assertRaises(RateLimitDeadlineError):
+            bucket.acquire(deadline=started + 1)
+        self.assertLess(time.monotonic() - started, 1, "No wait for the reset expected.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [TokenBucketTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
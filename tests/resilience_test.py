@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the retry and circuit breaker functions in resilience.py
+"""
+import unittest
+from source.resilience import CircuitBreaker, CircuitOpenError, retry_call
+
+
+class RetryCallTest(unittest.TestCase):
+    """
+    Unittest class for testing the function retry_call in resilience.py
+    """
+    def test_rc_00_success_after_transient_errors(self):
+        """
+        Positive test with two transient errors before a successful call
+        """
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ConnectionError("transient")
+            return "ok"
+
+        self.assertEqual(retry_call(flaky, retry_on=(ConnectionError,), base_delay=0),
+                         "ok",
+                         "Result of the third call expected.")
+        self.assertEqual(len(calls), 3, "Three calls expected.")
+
+    def test_rc_01_no_retry_on_other_errors(self):
+        """
+        Negative test with an error which is not transient
+        """
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise ValueError("permanent")
+
+        with self.assertRaises(ValueError):
+            retry_call(broken, retry_on=(ConnectionError,), base_delay=0)
+        self.assertEqual(len(calls), 1, "Only one call expected.")
+
+    def test_rc_02_give_up_after_attempts(self):
+        """
+        Negative test with a dependency which fails every time
+        """
+        calls = []
+
+        def down():
+            calls.append(1)
+            raise ConnectionError("down")
+
+        with self.assertRaises(ConnectionError):
+            retry_call(down, retry_on=(ConnectionError,), attempts=3, base_delay=0)
+        self.assertEqual(len(calls), 3, "Three calls expected.")
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """
+    Unittest class for testing the class CircuitBreaker in resilience.py
+    """
+    def test_cb_00_open_after_threshold(self):
+        """
+        Negative test with an open circuit which refuses calls without calling the dependency
+        """
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+        calls = []
+
+        def down():
+            calls.append(1)
+            raise ConnectionError("down")
+
+        with self.assertRaises(CircuitOpenError):
+            retry_call(down, retry_on=(ConnectionError,), attempts=5, base_delay=0,
+                       breaker=breaker)
+        self.assertEqual(len(calls), 2, "No calls after the circuit opened.")
+        self.assertGreater(breaker.retry_after(), 0, "Circuit stays open.")
+
+    def test_cb_01_close_after_successful_trial(self):
+        """
+        Positive test with a successful trial call after the reset timeout
+        """
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(retry_call(lambda: "ok", breaker=breaker), "ok",
+                         "Trial call allowed after the reset timeout.")
+        self.assertEqual(breaker.state, "closed", "Circuit closed after the trial.")
+
+    def test_cb_02_single_trial_when_half_open(self):
+        """
+        Negative test with a second call while the trial is running
+        """
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow(), "First trial call allowed.")
+        self.assertFalse(breaker.allow(), "Second call refused while half open.")
+
+    def test_cb_03_trial_released_on_other_error(self):
+        """
+        Negative test with a trial call which raises an error that is not transient
+        """
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        def broken():
+            raise ValueError("permanent")
+
+        with self.assertRaises(ValueError):
+            retry_call(broken, retry_on=(ConnectionError,), breaker=breaker)
+        self.assertEqual(breaker.state, "open", "Circuit not stuck in half open.")
+        self.assertEqual(retry_call(lambda: "ok", breaker=breaker), "ok",
+                         "Next trial call allowed.")
+        self.assertEqual(breaker.state, "closed", "Circuit closed after the next trial.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [RetryCallTest, CircuitBreakerTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the adaptive scheduler in scheduler.py
+"""
+import contextlib
+import io
+import unittest
+from source.scheduler import AdaptiveScheduler
+
+
+class NextIntervalTest(unittest.TestCase):
+    """
+    Unittest class for testing the function next_interval in scheduler.py
+    """
+    def setUp(self):
+        self.scheduler = AdaptiveScheduler(lambda deadline: {}, 60, 3600, 300)
+        self.scheduler.interval = 600
+
+    def test_ni_00_busy_run(self):
+        """
+        Positive test with many messages shortens the interval
+        """
+        self.assertEqual(self.scheduler.next_interval({"messages": 100}), 300,
+                         "Half interval expected after a busy run.")
+
+    def test_ni_01_empty_run(self):
+        """
+        Positive test with no messages stretches the interval
+        """
+        self.assertEqual(self.scheduler.next_interval({"messages": 0}), 900,
+                         "Longer interval expected after an empty run.")
+
+    def test_ni_02_low_budget(self):
+        """
+        Negative test with an almost exhausted rate limit budget
+        """
+        self.assertEqual(
+            self.scheduler.next_interval({"messages": 100, "rate_limit_remaining": 0.1}),
+            1800,
+            "At least half of the maximum interval expected with low budget.")
+
+    def test_ni_03_limits(self):
+        """
+        Positive test with the interval staying between minimum and maximum
+        """
+        self.scheduler.interval = 60
+        self.assertEqual(self.scheduler.next_interval({"messages": 100}), 60,
+                         "Interval not below the minimum.")
+        self.scheduler.interval = 3600
+        self.assertEqual(self.scheduler.next_interval({"messages": 0}), 3600,
+                         "Interval not above the maximum.")
+
+
+class RunForeverTest(unittest.TestCase):
+    """
+    Unittest class for testing the function run_forever in scheduler.py
+    """
+    def test_rf_00_error_does_not_stop(self):
+        """
+        Negative test with a run which fails with an unexpected error
+        """
+        results = iter([RuntimeError("kaputt"), {"messages": 1}])
+
+        def job(deadline):
+            self.assertGreater(deadline, 0, "Deadline expected.")
+            result = next(results, None)
+            if result is None:
+                scheduler.stop()
+                return {}
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        scheduler = AdaptiveScheduler(job, 0.001, 0.001, 300)
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            scheduler.run_forever()
+        self.assertIsNone(next(results, None), "Runs after the failed run expected.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [NextIntervalTest, RunForeverTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the marked terms and the term automaton in terms.py
+"""
+import unittest
+from source.terms import AhoCorasick, extract_marked_terms, parse_search_query
+from source.terms import tokenize_comment
+
+
+class ExtractMarkedTerms(unittest.TestCase):
+    """
+    Unittest class for testing the function extract_marked_terms in terms.py
+    """
+    def test_emt_00_marked_terms(self):
+        """
+        Positive test with two marked terms and a repetition in other case
+        """
+        self.assertEqual(extract_marked_terms("Das ?Wort? ist ?böse?, ?wort? sowieso"),
+                         ["wort", "böse"], "Lowercase terms without duplicates expected.")
+
+    def test_emt_01_no_marked_terms(self):
+        """
+        Negative test with question marks which do not mark a word
+        """
+        self.assertEqual(extract_marked_terms("Warum? ? Weil ?? so"), [],
+                         "No terms expected.")
+        self.assertEqual(extract_marked_terms(None), [], "No terms for missing comment.")
+
+
+class TokenizeComment(unittest.TestCase):
+    """
+    Unittest class for testing the function tokenize_comment in terms.py
+    """
+    def test_tc_00_tags_without_marked_terms(self):
+        """
+        Positive test with tags, a repetition and a marked term
+        """
+        self.assertEqual(tokenize_comment("Hetze bodyshaming ?wort? hetze"),
+                         ["hetze", "bodyshaming"], "Tags without the marked term expected.")
+
+    def test_tc_01_empty_comment(self):
+        """
+        Negative test with a comment without words
+        """
+        self.assertEqual(tokenize_comment(" ?! "), [], "No tags expected.")
+
+
+class ParseSearchQuery(unittest.TestCase):
+    """
+    Unittest class for testing the function parse_search_query in terms.py
+    """
+    def test_psq_00_phrase_and_prefix(self):
+        """
+        Positive test with a phrase, a prefix and a word with special characters
+        """
+        self.assertEqual(parse_search_query('"Hetze gegen" idiot* foo-bar'),
+                         [(("hetze", "gegen"), False), (("idiot",), True),
+                          (("foo", "bar"), False)],
+                         "Phrases in lowercase expected.")
+
+    def test_psq_01_no_words(self):
+        """
+        Negative test with a query without word characters
+        """
+        self.assertEqual(parse_search_query('"" * -'), [], "No phrases expected.")
+
+
+class AhoCorasickTest(unittest.TestCase):
+    """
+    Unittest class for testing the class AhoCorasick in terms.py
+    """
+    def test_ac_00_overlapping_terms(self):
+        """
+        Positive test with overlapping terms found in one pass
+        """
+        automaton = AhoCorasick(["he", "she", "hers"])
+        self.assertEqual(sorted(automaton.iter_matches("ushers", whole_words=False)),
+                         [(1, "she"), (2, "he"), (2, "hers")], "All three terms expected.")
+
+    def test_ac_01_whole_words_and_case(self):
+        """
+        Positive test with whole words in mixed case
+        """
+        automaton = AhoCorasick(["idiot"])
+        self.assertEqual(automaton.count_terms("Du IDIOT, so idiotisch! idiot."),
+                         {"idiot": 2}, "Only whole words expected.")
+
+    def test_ac_02_no_terms(self):
+        """
+        Negative test with an empty automaton
+        """
+        automaton = AhoCorasick([])
+        self.assertEqual(len(automaton), 0, "No terms expected.")
+        self.assertEqual(list(automaton.iter_matches("Text")), [], "No matches expected.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [ExtractMarkedTerms, TokenizeComment, ParseSearchQuery,
+                           AhoCorasickTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File for testing the durable work queue in work_queue.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from source.work_queue import LEASED, PENDING, STORED, WorkQueue
+
+
+def entry(message_id: int) -> dict:
+    """
+    Work queue entry like it is built by the message handler
+    """
+    return {"message_id": message_id, "command": "bot", "comment": "hetze",
+            "expand_url": f"https://twitter.com/user/status/{message_id}",
+            "tweet_id": message_id, "twitter_user_name": "user"}
+
+
+class WorkQueueTest(unittest.TestCase):
+    """
+    Unittest class for testing the class WorkQueue in work_queue.py
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "queue.db")
+        self.queue = WorkQueue(self.path)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.directory)
+
+    def _counts(self) -> tuple:
+        return tuple(self.queue.count(status) for status in (PENDING, LEASED, STORED))
+
+    def test_wq_00_transitions(self):
+        """
+        Positive test with an entry from pending over leased and stored until it is removed
+        """
+        self.queue.enqueue([entry(1), entry(2)])
+        self.assertEqual(self._counts(), (2, 0, 0), "Two pending entries expected.")
+        self.assertEqual(self.queue.lease(1), [entry(1)], "Oldest entry leased first.")
+        self.assertEqual(self._counts(), (1, 1, 0), "One leased entry expected.")
+        self.queue.acknowledge([1])
+        self.assertEqual(self._counts(), (1, 0, 1), "One stored entry expected.")
+        self.assertEqual(self.queue.stored(10), ["1"], "Stored entry to delete expected.")
+        self.queue.remove([1])
+        self.assertEqual(self._counts(), (1, 0, 0), "Only the second entry left.")
+
+    def test_wq_01_release_after_failed_write(self):
+        """
+        Negative test with a write which failed and is tried again
+        """
+        self.queue.enqueue([entry(1)])
+        self.queue.release([message["message_id"] for message in self.queue.lease(10)])
+        self.assertEqual(self._counts(), (1, 0, 0), "Entry pending again.")
+        self.assertEqual(self.queue.lease(10), [entry(1)], "Entry leased again.")
+
+    def test_wq_02_recover_after_crash(self):
+        """
+        Negative test with a run which crashed while entries were leased and stored
+        """
+        self.queue.enqueue([entry(1), entry(2), entry(3)])
+        self.queue.lease(2)
+        self.queue.acknowledge([2])
+        self.queue.close()
+        self.queue = WorkQueue(self.path)
+        self.assertEqual(self._counts(), (1, 1, 1), "State survives the crash.")
+        self.queue.recover()
+        self.assertEqual(self._counts(), (2, 0, 1), "Leased entry pending again.")
+        self.assertEqual(self.queue.stored(10), ["2"], "Stored entry is not written again.")
+        self.assertEqual(self.queue.lease(10), [entry(1), entry(3)],
+                         "Recovered entry leased in the original order.")
+
+    def test_wq_03_idempotent_replay(self):
+        """
+        Negative test with messages which are fetched again before they are deleted
+        """
+        self.queue.enqueue([entry(1), entry(2)])
+        self.queue.acknowledge([message["message_id"] for message in self.queue.lease(1)])
+        self.queue.enqueue([entry(1), entry(2) | {"comment": "anders"}])
+        self.queue.enqueue([{"message_id": 1}], STORED)
+        self.assertEqual(self._counts(), (1, 0, 1), "No entry added twice.")
+        self.assertEqual(self.queue.lease(10), [entry(2)], "First entry of a message kept.")
+
+
+def run_some_tests():
+    """
+    Run function to collect all needed test in a suit and runs
+    """
+    test_classes_to_run = [WorkQueueTest]
+
+    loader = unittest.TestLoader()
+
+    suites_list = []
+    for test_class in test_classes_to_run:
+        suite = loader.loadTestsFromTestCase(test_class)
+        suites_list.append(suite)
+
+    big_suite = unittest.TestSuite(suites_list)
+
+    runner = unittest.TextTestRunner()
+    _ = runner.run(big_suite)
+
+
+if __name__ == '__main__':
+    run_some_tests()